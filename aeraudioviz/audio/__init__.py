@@ -1,3 +1,5 @@
 from aeraudioviz.audio.audio import Audio
 from aeraudioviz.audio.audio_features import AudioFeatures
 from aeraudioviz.audio import feature_utils
+from aeraudioviz.audio.feature_store import FeatureStore
+from aeraudioviz.audio.online_features import OnlineAudioFeatures
@@ -1,23 +1,131 @@
+from functools import cached_property
+from typing import Iterator, Optional
+import warnings
+
 import librosa
 from matplotlib import pyplot as plt
 from moviepy.editor import AudioFileClip
+import numpy as np
+from scipy.io import wavfile
+import soundfile
+import soxr
 
 
 class Audio:
 
-    def __init__(self, audio_path, sample_rate=44100.):
+    def __init__(self, audio_path, sample_rate=44100., streaming: bool = False, block_size: int = 2 ** 18):
         """
         Constructor method to load th waveform using librosa
 
         :param audio_path: relative path to the audio file (.wav file)
         :param sample_rate: the sample rate of the audio file in Hertz
+        :param streaming: Boolean controlling whether the waveform is loaded into memory.
+        When True the file is read block by block, memory-mapped where possible, whenever the waveform is needed,
+        and is only resampled when its native sample rate differs from sample_rate. Accessing the audio attribute
+        still loads the whole waveform.
+        :param block_size: number of samples per block when reading the file in blocks
         :return:
         """
         self.audio_path = audio_path
         self.sample_rate = sample_rate
-        self.audio, _ = librosa.load(self.audio_path, sr=self.sample_rate)
-        self.duration = librosa.get_duration(y=self.audio, sr=self.sample_rate)
-        self.moveipy_audio_clip = AudioFileClip(self.audio_path)
+        self.streaming = streaming
+        self.block_size = block_size
+        if streaming:
+            info = soundfile.info(self.audio_path)
+            self.native_sample_rate = info.samplerate
+            self.n_samples = int(np.ceil(info.frames * self.sample_rate / self.native_sample_rate))
+        else:
+            self.native_sample_rate = None
+            self.n_samples = len(self.audio)
+        self.duration = self.n_samples / self.sample_rate
+
+    @cached_property
+    def audio(self) -> np.ndarray:
+        audio, _ = librosa.load(self.audio_path, sr=self.sample_rate)
+        return audio
+
+    @cached_property
+    def moveipy_audio_clip(self) -> AudioFileClip:
+        return AudioFileClip(self.audio_path)
+
+    def iter_blocks(self, block_size: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        Generator over the mono waveform at sample_rate in consecutive blocks. The blocks join up to the same samples
+        as the audio attribute.
+
+        :param block_size: number of samples per block, defaults to the block_size of the object
+        :return: iterator of float32 arrays
+        """
+        block_size = block_size if block_size is not None else self.block_size
+        if not self.streaming or 'audio' in self.__dict__:
+            for start in range(0, len(self.audio), block_size):
+                yield self.audio[start:start + block_size]
+            return
+        remaining = self.n_samples
+        for block in self._iter_resampled_blocks(block_size):
+            block = block[:remaining]
+            remaining -= len(block)
+            if len(block):
+                yield block
+        while remaining > 0:
+            yield np.zeros(min(remaining, block_size), dtype=np.float32)
+            remaining -= block_size
+
+    def iter_frame_blocks(
+            self, frame_length: int = 2048, hop_length: int = 512, frames_per_block: int = 512
+    ) -> Iterator[np.ndarray]:
+        """
+        Generator over overlapping blocks of the waveform for frame-wise analysis. The waveform is padded with
+        frame_length // 2 zeros at each end, as librosa does with center=True, so analysing each block with
+        center=False gives consecutive frames equal to those of an analysis of the whole waveform.
+
+        :param frame_length: length of the analysis frames in samples
+        :param hop_length: number of samples between analysis frames
+        :param frames_per_block: number of analysis frames per block, the last block may have fewer
+        :return: iterator of float32 arrays of (frames - 1) * hop_length + frame_length samples
+        """
+        padding = np.zeros(frame_length // 2, dtype=np.float32)
+        block_length = (frames_per_block - 1) * hop_length + frame_length
+        buffer = padding
+        for block in _chain_blocks(self.iter_blocks(), padding):
+            buffer = np.concatenate([buffer, block])
+            while len(buffer) >= block_length:
+                yield buffer[:block_length]
+                buffer = buffer[frames_per_block * hop_length:]
+        if len(buffer) >= frame_length:
+            n_frames = 1 + (len(buffer) - frame_length) // hop_length
+            yield buffer[:(n_frames - 1) * hop_length + frame_length]
+
+    def _iter_resampled_blocks(self, block_size: int) -> Iterator[np.ndarray]:
+        if self.native_sample_rate == self.sample_rate:
+            yield from self._iter_native_blocks(block_size)
+            return
+        resampler = soxr.ResampleStream(self.native_sample_rate, self.sample_rate, 1, dtype='float32', quality='HQ')
+        for block in self._iter_native_blocks(block_size):
+            yield resampler.resample_chunk(block)
+        yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+    def _iter_native_blocks(self, block_size: int) -> Iterator[np.ndarray]:
+        # mono float32 blocks at the native sample rate, scaled as soundfile and so librosa.load would scale them
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', wavfile.WavFileWarning)
+                _, samples = wavfile.read(self.audio_path, mmap=True)
+        except ValueError:
+            samples = None
+        if samples is None or samples.dtype not in _PCM_SCALES:
+            for block in soundfile.blocks(self.audio_path, blocksize=block_size, dtype='float32', always_2d=True):
+                yield block.mean(axis=1)
+            return
+        offset, scale = _PCM_SCALES[samples.dtype]
+        samples = samples.reshape(len(samples), -1)
+        for start in range(0, len(samples), block_size):
+            block = samples[start:start + block_size].astype(np.float32)
+            if offset:
+                block -= offset
+            if scale != 1.:
+                block /= scale
+            yield block.mean(axis=1)
 
     def plot_waveform(self, figsize: tuple = (12, 4)):
         """
@@ -28,3 +136,17 @@ class Audio:
         """
         plt.figure(figsize=figsize)
         return librosa.display.waveshow(self.audio, sr=self.sample_rate, color='blue')
+
+
+# offset and scale that convert the sample types of memory-mapped WAV files to floats in [-1, 1)
+_PCM_SCALES = {
+    np.dtype(np.uint8): (128., 128.),
+    np.dtype(np.int16): (0., 2. ** 15),
+    np.dtype(np.int32): (0., 2. ** 31),
+    np.dtype(np.float32): (0., 1.),
+}
+
+
+def _chain_blocks(blocks: Iterator[np.ndarray], last_block: np.ndarray) -> Iterator[np.ndarray]:
+    yield from blocks
+    yield last_block
@@ -1,46 +1,126 @@
+from functools import cached_property
+from typing import Optional, Sequence
+
 import librosa
 import numpy as np
 import pandas as pd
 
 from aeraudioviz.audio import Audio
+from aeraudioviz.audio.feature_store import FeatureStore
 from aeraudioviz.audio.feature_utils import normalise_features
 
 
+FEATURE_COLUMNS = ('Onset', 'Spectral Centroid', 'RMS', 'Spectral Centroid Rolling Mean', 'Beats With Decay')
+
+
 class AudioFeatures:
 
-    def __init__(self, audio_object: Audio):
+    def __init__(
+            self, audio_object: Audio, n_fft: int = 2048, hop_length: int = 512,
+            feature_store: Optional[FeatureStore] = None
+    ):
         """
+        Features are computed when first accessed. The onset envelope, spectral centroid and beat times are all
+        derived from a single STFT and mel spectrogram of the audio. For streaming Audio objects that have not loaded
+        their waveform the STFT, mel spectrogram and RMS are computed block by block in a single pass over the file.
 
         :param audio_object: object of type Audio
+        :param n_fft: length of the analysis frames in samples
+        :param hop_length: number of samples between analysis frames
+        :param feature_store: optional FeatureStore. Features and feature time series found in the store are loaded
+        rather than computed, and computed ones are saved to it.
         :return:
         """
         self.audio = audio_object
-        self.onset_envelope = self._get_onset_envelope()
-        self.onset_times = self._get_onset_times()
-        self.spectral_centroid = self._get_spectral_centroid()
-        self.rms_values = self._get_rms_values()
-        self.beat_times = self._get_beat_times()
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.feature_store = feature_store
+
+    @cached_property
+    def onset_envelope(self) -> np.ndarray:
+        return self._stored('onset_envelope', self._compute_onset_envelope)
+
+    @cached_property
+    def onset_times(self) -> np.ndarray:
+        n_frames = 1 + self.audio.n_samples // self.hop_length
+        return librosa.frames_to_time(np.arange(n_frames), sr=self.audio.sample_rate, hop_length=self.hop_length)
+
+    @cached_property
+    def beat_times(self) -> np.ndarray:
+        return self._stored('beat_times', self._compute_beat_times)
 
-    def _get_onset_envelope(self):
+    @cached_property
+    def spectral_centroid(self) -> np.ndarray:
+        return self._stored('spectral_centroid', lambda: self._spectral_features[1])
+
+    @cached_property
+    def rms_values(self) -> np.ndarray:
+        return self._stored('rms_values', self._compute_rms_values)
+
+    def _compute_onset_envelope(self) -> np.ndarray:
+        log_mel_spectrogram, _ = self._spectral_features
         return librosa.onset.onset_strength(
-            y=self.audio.audio, sr=self.audio.sample_rate
+            S=log_mel_spectrogram, sr=self.audio.sample_rate, n_fft=self.n_fft, hop_length=self.hop_length
         )
 
-    def _get_onset_times(self):
-        return librosa.times_like(self.onset_envelope, sr=self.audio.sample_rate)
-
-    def _get_beat_times(self):
+    def _compute_beat_times(self) -> np.ndarray:
+        # beat tracking uses the median over mel bands rather than the mean used for the Onset feature
+        log_mel_spectrogram, _ = self._spectral_features
+        beat_onset_envelope = librosa.onset.onset_strength(
+            S=log_mel_spectrogram, sr=self.audio.sample_rate, n_fft=self.n_fft, hop_length=self.hop_length,
+            aggregate=np.median
+        )
         return librosa.beat.beat_track(
-            y=self.audio.audio, sr=self.audio.sample_rate, units='time'
+            onset_envelope=beat_onset_envelope, sr=self.audio.sample_rate, hop_length=self.hop_length, units='time'
         )[1]
 
-    def _get_spectral_centroid(self):
-        return librosa.feature.spectral_centroid(
-            y=self.audio.audio, sr=self.audio.sample_rate
-        )[0]
+    def _compute_rms_values(self) -> np.ndarray:
+        if self._streaming:
+            _, _, rms_values = self._block_features
+            return rms_values
+        return librosa.feature.rms(y=self.audio.audio, frame_length=self.n_fft, hop_length=self.hop_length)[0]
 
-    def _get_rms_values(self):
-        return librosa.feature.rms(y=self.audio.audio)[0]
+    @cached_property
+    def _spectral_features(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._streaming:
+            mel_spectrogram, spectral_centroid, _ = self._block_features
+            return librosa.power_to_db(mel_spectrogram), spectral_centroid
+        # the STFT is only held while both features are derived from it
+        magnitude = np.abs(librosa.stft(self.audio.audio, n_fft=self.n_fft, hop_length=self.hop_length))
+        log_mel_spectrogram = librosa.power_to_db(
+            librosa.feature.melspectrogram(S=magnitude ** 2, sr=self.audio.sample_rate)
+        )
+        spectral_centroid = librosa.feature.spectral_centroid(S=magnitude, sr=self.audio.sample_rate)[0]
+        return log_mel_spectrogram, spectral_centroid
+
+    @cached_property
+    def _block_features(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # the mel power is kept rather than its dB values, since power_to_db clips relative to the global maximum
+        mel_blocks, centroid_blocks, rms_blocks = [], [], []
+        for block in self.audio.iter_frame_blocks(frame_length=self.n_fft, hop_length=self.hop_length):
+            magnitude = np.abs(librosa.stft(block, n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+            mel_blocks.append(librosa.feature.melspectrogram(S=magnitude ** 2, sr=self.audio.sample_rate))
+            centroid_blocks.append(librosa.feature.spectral_centroid(S=magnitude, sr=self.audio.sample_rate)[0])
+            frames = librosa.util.frame(block, frame_length=self.n_fft, hop_length=self.hop_length)
+            rms_blocks.append(np.sqrt(np.mean(np.abs(frames) ** 2, axis=0)))
+        return np.concatenate(mel_blocks, axis=1), np.concatenate(centroid_blocks), np.concatenate(rms_blocks)
+
+    @property
+    def _streaming(self) -> bool:
+        return self.audio.streaming and 'audio' not in self.audio.__dict__
+
+    def _store_key(self, **parameters) -> str:
+        return self.feature_store.key(
+            self.audio.audio_path, sample_rate=self.audio.sample_rate, n_fft=self.n_fft, hop_length=self.hop_length,
+            **parameters
+        )
+
+    def _stored(self, feature: str, compute) -> np.ndarray:
+        if self.feature_store is None:
+            return compute()
+        return self.feature_store.get_or_compute_arrays(
+            self._store_key(feature=feature), lambda: {'values': compute()}
+        )['values']
 
     def get_feature_time_series(
             self,
@@ -49,7 +129,9 @@ class AudioFeatures:
             spectral_centroid_rolling_mean_window: int = 48,
             beat_decay_frames: int = 5,
             beat_onset_threshold: float = .2,
-            normalise: bool = True
+            normalise: bool = True,
+            features: Optional[Sequence[str]] = None,
+            fps: Optional[float] = None
     ) -> pd.DataFrame:
         """
 
@@ -65,25 +147,82 @@ class AudioFeatures:
         below threshold
         :param normalise: Boolean to control if feature values are normalised.
         If True column-wise min-max normalisation is performed resulting in values in the range (0, 1)
+        :param features: the feature columns to include, from 'Onset', 'Spectral Centroid', 'RMS',
+        'Spectral Centroid Rolling Mean' and 'Beats With Decay'. Only the features needed for these columns are
+        computed. If None all columns are included.
+        :param fps: optional video frame rate. When given, resample and resample_freq are ignored and the time series
+        has exactly one row per video frame: row k is the mean of the analysis frames starting in [k / fps, (k + 1) /
+        fps) and there are ceil(duration * fps) rows. The frame rate is stored in the fps entry of DataFrame.attrs,
+        from where VideoGenerator takes it.
         :return: pandas.DataFrame with TimeDelta index and numeric feature columns
         """
+        parameters = {
+            'resample': resample, 'resample_freq': resample_freq,
+            'spectral_centroid_rolling_mean_window': spectral_centroid_rolling_mean_window,
+            'beat_decay_frames': beat_decay_frames, 'beat_onset_threshold': beat_onset_threshold,
+            'normalise': normalise, 'features': list(FEATURE_COLUMNS if features is None else features), 'fps': fps
+        }
+        if self.feature_store is None:
+            return self._feature_time_series(**parameters)
+        key = self._store_key(time_series=parameters)
+        df = self.feature_store.load_frame(key)
+        if df is None:
+            df = self._feature_time_series(**parameters)
+            self.feature_store.save_frame(key, df)
+        return df
+
+    def _feature_time_series(
+            self, resample, resample_freq, spectral_centroid_rolling_mean_window, beat_decay_frames,
+            beat_onset_threshold, normalise, features, fps
+    ) -> pd.DataFrame:
+        required = set(features)
+        if 'Spectral Centroid Rolling Mean' in required:
+            required.add('Spectral Centroid')
+        if 'Beats With Decay' in required:
+            required.add('Onset')
+        raw_features = {
+            'Onset': lambda: self.onset_envelope,
+            'Spectral Centroid': lambda: self.spectral_centroid,
+            'RMS': lambda: self.rms_values
+        }
         df = pd.DataFrame(
-            {'Onset': self.onset_envelope,
-             'Spectral Centroid': self.spectral_centroid,
-             'RMS': self.rms_values},
+            {column: get_values() for column, get_values in raw_features.items() if column in required},
             index=pd.to_timedelta(self.onset_times, unit='s')
         )
-        df['Spectral Centroid Rolling Mean'] = df['Spectral Centroid'].rolling(
-            spectral_centroid_rolling_mean_window
-        ).mean().bfill()
-        if resample:
+        if 'Spectral Centroid Rolling Mean' in required:
+            df['Spectral Centroid Rolling Mean'] = df['Spectral Centroid'].rolling(
+                spectral_centroid_rolling_mean_window
+            ).mean().bfill()
+        if fps is not None:
+            df = self._aggregate_to_frames(df, fps)
+        elif resample:
             df = df.resample(resample_freq).mean()
-        df['Beats With Decay'] = self._add_beat_time_series_column(df, decay_frames=beat_decay_frames)
-        df.loc[(normalise_features(df['Onset']).rolling(5).max() < beat_onset_threshold), 'Beats With Decay'] = 0.
+        if 'Beats With Decay' in required:
+            df['Beats With Decay'] = self._add_beat_time_series_column(df, decay_frames=beat_decay_frames)
+            df.loc[(normalise_features(df['Onset']).rolling(5).max() < beat_onset_threshold), 'Beats With Decay'] = 0.
+        df = df[features]
         if normalise:
             df = normalise_features(df)
+        if fps is not None:
+            df.attrs['fps'] = fps
         return df
 
+    def _aggregate_to_frames(self, df: pd.DataFrame, fps: float) -> pd.DataFrame:
+        # analysis frame i starts at sample i * hop_length, so the first analysis frame of each video frame is found
+        # exactly rather than by accumulating the rounding error of a period in whole milliseconds
+        n_frames = int(np.ceil(self.audio.n_samples * fps / self.audio.sample_rate))
+        starts = np.minimum(
+            np.ceil(np.arange(n_frames) * self.audio.sample_rate / (self.hop_length * fps)).astype(int), len(df)
+        )
+        counts = np.diff(starts, append=len(df))
+        values = df.to_numpy(dtype=np.float64)
+        sums = np.add.reduceat(values, np.minimum(starts, len(df) - 1), axis=0)
+        # with a hop longer than the frame period some frames hold no analysis frame and repeat the previous frame
+        filled = np.maximum.accumulate(np.where(counts > 0, np.arange(n_frames), 0))
+        values = sums[filled] / counts[filled, None]
+        index = pd.to_timedelta(np.round(np.arange(n_frames) * 1e9 / fps).astype(np.int64), unit='ns')
+        return pd.DataFrame(values, index=index, columns=df.columns)
+
     def _add_beat_time_series_column(self, df, decay_frames: int = 5):
         t = df.index.total_seconds()
         beat_indices = np.searchsorted(t, self.beat_times, side='left') + 1
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+class FeatureStore:
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        On-disk store of audio features saved as npz files. Entries are keyed by a hash of the content of the audio
+        file and of the parameters the features were computed with, so an entry is never returned for a file or
+        parameters that have changed. When the content of a file changes its old entries are deleted.
+
+        :param directory: directory holding the stored features, created if it does not exist
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.directory / 'index.json'
+        self._index = json.loads(self._index_path.read_text()) if self._index_path.exists() else {}
+
+    def content_hash(self, audio_path: Union[str, Path]) -> str:
+        """
+        Method to get the SHA-256 digest of an audio file. Digests are remembered against the size and modification
+        time of the file, so a file is only hashed again when it changes.
+
+        :param audio_path: path to the audio file
+        :return: hex digest
+        """
+        path = str(Path(audio_path).resolve())
+        stat = os.stat(path)
+        entry = self._index.get(path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['digest']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as audio_file:
+            for chunk in iter(lambda: audio_file.read(2 ** 20), b''):
+                digest.update(chunk)
+        if entry is not None and entry['digest'] != digest.hexdigest():
+            self._remove_entries(entry['digest'])
+        self._index[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest.hexdigest()}
+        _atomic_write(self._index_path, lambda file: file.write(json.dumps(self._index, indent=1).encode()))
+        return digest.hexdigest()
+
+    def key(self, audio_path: Union[str, Path], **parameters) -> str:
+        """
+        Method to get the key of the features of an audio file computed with parameters
+
+        :param audio_path: path to the audio file
+        :param parameters: JSON serialisable parameters the features depend on
+        :return: the key, prefixed with the content hash of the audio file
+        """
+        parameter_hash = hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode()).hexdigest()
+        return f'{self.content_hash(audio_path)}-{parameter_hash[:32]}'
+
+    def load_arrays(self, key: str) -> Optional[dict[str, np.ndarray]]:
+        path = self._entry_path(key)
+        if not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            return dict(arrays)
+
+    def save_arrays(self, key: str, **arrays: np.ndarray):
+        _atomic_write(self._entry_path(key), lambda file: np.savez(file, **arrays))
+
+    def load_frame(self, key: str) -> Optional[pd.DataFrame]:
+        arrays = self.load_arrays(key)
+        if arrays is None:
+            return None
+        df = pd.DataFrame(
+            arrays['values'], index=pd.to_timedelta(arrays['index'], unit='ns'), columns=arrays['columns'].tolist()
+        )
+        df.attrs.update(json.loads(str(arrays['attrs'])))
+        return df
+
+    def save_frame(self, key: str, df: pd.DataFrame):
+        # the time delta index is stored as integer nanoseconds, the column names as strings and attrs as JSON
+        self.save_arrays(
+            key, values=df.to_numpy(dtype=np.float64), index=df.index.asi8, columns=np.array(df.columns, dtype=str),
+            attrs=np.array(json.dumps(df.attrs))
+        )
+
+    def get_or_compute_arrays(self, key: str, compute: Callable[[], dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+        arrays = self.load_arrays(key)
+        if arrays is None:
+            arrays = compute()
+            self.save_arrays(key, **arrays)
+        return arrays
+
+    def clear(self):
+        self._remove_entries('')
+        self._index = {}
+        self._index_path.unlink(missing_ok=True)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f'{key}.npz'
+
+    def _remove_entries(self, digest: str):
+        for path in self.directory.glob(f'{digest}*.npz'):
+            path.unlink(missing_ok=True)
+
+
+def _atomic_write(path: Path, write: Callable):
+    # readers never see a partly written file, even when several processes share the store
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            write(file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
@@ -39,17 +39,164 @@ def add_sine_wave_column(
 
 
 def fade_out_between_times(df, column_name, start, end, factor=1.):
-    filt = (df.index.total_seconds() > start) & (df.index.total_seconds() < end)
-    df.loc[filt, column_name] *= (1. - (df.loc[filt, :].index.total_seconds() - start) / (end - start)) * factor
-    return df
+    return AutomationLane(column_name).fade_out(start, end, factor).apply(df)
 
 
 def fade_in_between_times(df, column_name, start, end, factor=1.):
-    filt = (df.index.total_seconds() >= start) & (df.index.total_seconds() < end)
-    df.loc[filt, column_name] *= (df.loc[filt, :].index.total_seconds() - start) / (end - start) * factor
-    return df
+    return AutomationLane(column_name).fade_in(start, end, factor).apply(df)
 
 
 def set_to_zero_between_times(df, column_name, start, end):
-    df.loc[(df.index.total_seconds() >= start) & (df.index.total_seconds() <= end), column_name] = 0.
+    return AutomationLane(column_name).set_to_zero(start, end).apply(df)
+
+
+class AutomationLane:
+
+    def __init__(self, column_name: str):
+        """
+        Collects time window edits of a feature column and applies them together. Every edit multiplies the column by
+        a gain curve over its window, so the edits are combined into one gain envelope that is computed on a single
+        seconds array, with each window found by binary search, and the column is multiplied by it once. Edits can be
+        chained, e.g. AutomationLane('RMS').fade_in(0, 2).fade_out(58, 60).apply(df).
+
+        :param column_name: the column of the feature DataFrame the edits apply to
+        """
+        self.column_name = column_name
+        self._segments = []
+
+    def __len__(self):
+        return len(self._segments)
+
+    def fade_in(self, start: float, end: float, factor: float = 1.) -> 'AutomationLane':
+        """
+        Method to fade the column in linearly from 0 at start to factor at end, for start <= t < end
+
+        :param start: start of the fade in seconds
+        :param end: end of the fade in seconds
+        :param factor: gain reached at the end of the fade
+        :return: the AutomationLane
+        """
+        return self._add(start, end, True, False, _fade_in_curve, factor)
+
+    def fade_out(self, start: float, end: float, factor: float = 1.) -> 'AutomationLane':
+        """
+        Method to fade the column out linearly from factor at start to 0 at end, for start < t < end
+
+        :param start: start of the fade in seconds
+        :param end: end of the fade in seconds
+        :param factor: gain at the start of the fade
+        :return: the AutomationLane
+        """
+        return self._add(start, end, False, False, _fade_out_curve, factor)
+
+    def set_to_zero(self, start: float, end: float) -> 'AutomationLane':
+        """
+        Method to set the column to zero for start <= t <= end
+
+        :return: the AutomationLane
+        """
+        return self._add(start, end, True, True, _zero_curve)
+
+    def gain(self, start: float, end: float, factor: float) -> 'AutomationLane':
+        """
+        Method to multiply the column by a constant factor for start <= t < end
+
+        :return: the AutomationLane
+        """
+        return self._add(start, end, True, False, _gain_curve, factor)
+
+    def lfo(self, start: float, end: float, frequency_Hz: float = 1., depth: float = 1.) -> 'AutomationLane':
+        """
+        Method to modulate the column with a sine wave for start <= t < end. The wave has the phase of
+        add_sine_wave_column, and is scaled to the range (1 - depth, 1).
+
+        :param start: start of the modulation in seconds
+        :param end: end of the modulation in seconds
+        :param frequency_Hz: the frequency of the LFO in Hertz
+        :param depth: depth of the modulation, 1 modulates between 0 and 1 and 0 leaves the column as it is
+        :return: the AutomationLane
+        """
+        return self._add(start, end, True, False, _lfo_curve, frequency_Hz, depth)
+
+    def envelope(self, seconds: np.ndarray) -> np.ndarray:
+        """
+        Method to get the combined gain of the edits
+
+        :param seconds: increasing array of frame times in seconds
+        :return: float64 array of the gain at each time
+        """
+        gain = np.ones(len(seconds))
+        # segments are applied in time order, so the result does not depend on the order they were added in
+        for start, end, closed_start, closed_end, curve, parameters in sorted(self._segments, key=_segment_order):
+            first = np.searchsorted(seconds, start, side='left' if closed_start else 'right')
+            last = np.searchsorted(seconds, end, side='right' if closed_end else 'left')
+            if first < last:
+                gain[first:last] *= curve(seconds[first:last], start, end, *parameters)
+        return gain
+
+    def apply(self, df: pd.DataFrame, seconds: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Method to apply the edits to the column in place
+
+        :param df: pandas.DataFrame with a TimeDelta index
+        :param seconds: optional precomputed seconds of the index, see apply_automation
+        :return: the pandas.DataFrame
+        """
+        if seconds is None:
+            seconds = df.index.total_seconds().to_numpy()
+        order = None
+        if len(seconds) > 1 and np.any(np.diff(seconds) < 0):
+            order = np.argsort(seconds, kind='stable')
+            seconds = seconds[order]
+        gain = self.envelope(seconds)
+        if order is not None:
+            gain[order] = gain.copy()
+        values = df[self.column_name].to_numpy(dtype=np.float64) * gain
+        # zeroed frames stay zero even where the column is not finite
+        values[gain == 0.] = 0.
+        df[self.column_name] = values
+        return df
+
+    def _add(self, start, end, closed_start, closed_end, curve, *parameters) -> 'AutomationLane':
+        self._segments.append((float(start), float(end), closed_start, closed_end, curve, parameters))
+        return self
+
+
+def apply_automation(df: pd.DataFrame, lanes: list[AutomationLane]) -> pd.DataFrame:
+    """
+    Function to apply several AutomationLanes to a feature DataFrame, converting its index to seconds once
+
+    :param df: pandas.DataFrame with a TimeDelta index
+    :param lanes: the AutomationLanes, in any order
+    :return: the pandas.DataFrame with the edited columns
+    """
+    seconds = df.index.total_seconds().to_numpy()
+    for lane in lanes:
+        lane.apply(df, seconds=seconds)
     return df
+
+
+def _segment_order(segment):
+    return segment[:2]
+
+
+def _fade_in_curve(seconds, start, end, factor):
+    return (seconds - start) / (end - start) * factor
+
+
+def _fade_out_curve(seconds, start, end, factor):
+    return (1. - (seconds - start) / (end - start)) * factor
+
+
+def _zero_curve(seconds, start, end):
+    return 0.
+
+
+def _gain_curve(seconds, start, end, factor):
+    return factor
+
+
+def _lfo_curve(seconds, start, end, frequency_Hz, depth):
+    wavelength = 1. / frequency_Hz
+    wave = (np.sin(seconds % wavelength / wavelength * 2. * np.pi) + 1.) / 2.
+    return 1. - depth + depth * wave
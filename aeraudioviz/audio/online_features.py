@@ -0,0 +1,161 @@
+import math
+from typing import Sequence
+
+import librosa
+import numpy as np
+
+
+ONLINE_FEATURE_COLUMNS = ('Onset', 'Spectral Centroid', 'RMS')
+
+
+class OnlineAudioFeatures:
+
+    def __init__(
+            self,
+            sample_rate: float = 44100.,
+            fps: float = 24.,
+            n_fft: int = 2048,
+            hop_length: int = 512,
+            features: Sequence[str] = ONLINE_FEATURE_COLUMNS,
+            normalise: bool = True,
+            top_db: float = 80.
+    ):
+        """
+        Computes the Onset, Spectral Centroid and RMS features incrementally from blocks of audio as they arrive, for
+        live rendering. The analysis frames are those of AudioFeatures, centred on every hop_length-th sample, and
+        are averaged into video frames as AudioFeatures.get_feature_time_series(fps=...) does, so video frame k is
+        complete once the audio up to (k + 1) / fps seconds plus half an analysis frame has arrived. The onset
+        strength is delayed by n_fft // (2 * hop_length) analysis frames to align it as librosa does. It differs from
+        the offline feature only in that the log mel spectrogram is clipped at top_db below its running maximum
+        rather than below its global maximum.
+
+        :param sample_rate: sample rate of the audio blocks in Hertz
+        :param fps: frame rate of the video frames the features are averaged into
+        :param n_fft: length of the analysis frames in samples
+        :param hop_length: number of samples between analysis frames
+        :param features: the feature columns to compute, from 'Onset', 'Spectral Centroid' and 'RMS'
+        :param normalise: Boolean controlling whether each feature is min-max normalised with the minimum and maximum
+        seen so far, giving values in the range (0, 1)
+        :param top_db: dynamic range of the log mel spectrogram the onset strength is computed from
+        """
+        unknown_features = set(features) - set(ONLINE_FEATURE_COLUMNS)
+        if unknown_features:
+            raise ValueError(f'features that cannot be computed online: {unknown_features}')
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.features = list(features)
+        self.normalise = normalise
+        self.top_db = top_db
+        self._window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)[:, None]
+        self._mel_basis = librosa.filters.mel(sr=sample_rate, n_fft=n_fft)
+        self._frequencies = librosa.fft_frequencies(sr=sample_rate, n_fft=n_fft)
+        self._columns = [ONLINE_FEATURE_COLUMNS.index(feature) for feature in self.features]
+        self.minimum = np.full(len(self.features), np.inf)
+        self.maximum = np.full(len(self.features), -np.inf)
+        self.reset()
+
+    def reset(self):
+        # the waveform starts with n_fft // 2 zeros, as librosa pads it with center=True
+        self._samples = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self._previous_log_mel = None
+        self._delayed_onsets = np.zeros(self.n_fft // (2 * self.hop_length))
+        self._log_mel_maximum = -np.inf
+        self.n_samples = 0
+        self.n_analysis_frames = 0
+        self.n_frames = 0
+        self._frame_sum = np.zeros(len(self.features))
+        self._frame_count = 0
+        self._previous_values = np.zeros(len(self.features))
+        self.minimum[:] = np.inf
+        self.maximum[:] = -np.inf
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Method to add the next block of audio
+
+        :param block: mono float samples
+        :return: array of shape (video frames completed by the block, features) with the feature values of each
+        completed video frame, in the order of features
+        """
+        self._samples = np.concatenate([self._samples, np.asarray(block, dtype=np.float32)])
+        self.n_samples += len(block)
+        n_analysis_frames = 0
+        if len(self._samples) >= self.n_fft:
+            n_analysis_frames = 1 + (len(self._samples) - self.n_fft) // self.hop_length
+        if not n_analysis_frames:
+            return np.empty((0, len(self.features)))
+        frames = librosa.util.frame(
+            self._samples[:(n_analysis_frames - 1) * self.hop_length + self.n_fft], frame_length=self.n_fft,
+            hop_length=self.hop_length
+        )
+        values = self._analyse(frames)
+        self._samples = self._samples[n_analysis_frames * self.hop_length:]
+        return self._to_video_frames(values)
+
+    def flush(self) -> np.ndarray:
+        """
+        Method to end the audio, padding it with n_fft // 2 zeros as librosa does and completing the remaining video
+        frames, ceil(duration * fps) in total
+
+        :return: array of shape (video frames completed, features), see process
+        """
+        n_samples = self.n_samples
+        rows = [self.process(np.zeros(self.n_fft // 2, dtype=np.float32))]
+        self.n_samples = n_samples
+        n_frames = math.ceil(n_samples * self.fps / self.sample_rate)
+        while self._frame_count or self.n_frames < n_frames:
+            rows.append(self._complete_frame()[None])
+        return np.concatenate(rows)
+
+    def _analyse(self, frames: np.ndarray) -> np.ndarray:
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=0))
+        values = np.zeros((frames.shape[1], len(ONLINE_FEATURE_COLUMNS)))
+        if 'Onset' in self.features:
+            log_mel = 10. * np.log10(np.maximum(self._mel_basis @ magnitude ** 2, 1e-10))
+            self._log_mel_maximum = max(self._log_mel_maximum, float(log_mel.max()))
+            np.maximum(log_mel, self._log_mel_maximum - self.top_db, out=log_mel)
+            previous = log_mel[:, :1] if self._previous_log_mel is None else self._previous_log_mel
+            differences = np.diff(np.concatenate([previous, log_mel], axis=1), axis=1)
+            onsets = np.concatenate([self._delayed_onsets, np.maximum(differences, 0.).mean(axis=0)])
+            values[:, 0] = onsets[:frames.shape[1]]
+            self._delayed_onsets = onsets[frames.shape[1]:]
+            self._previous_log_mel = log_mel[:, -1:]
+        if 'Spectral Centroid' in self.features:
+            totals = magnitude.sum(axis=0)
+            values[:, 1] = np.divide(
+                self._frequencies @ magnitude, totals, out=np.zeros(len(totals)), where=totals > 0
+            )
+        if 'RMS' in self.features:
+            values[:, 2] = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=0))
+        return values[:, self._columns]
+
+    def _to_video_frames(self, values: np.ndarray) -> np.ndarray:
+        # analysis frame i belongs to video frame k when frame_start(k) <= i < frame_start(k + 1), as offline
+        rows = []
+        for row in values:
+            while self.n_analysis_frames >= self._frame_start(self.n_frames + 1):
+                rows.append(self._complete_frame())
+            self._frame_sum += row
+            self._frame_count += 1
+            self.n_analysis_frames += 1
+        return np.array(rows).reshape(len(rows), len(self.features))
+
+    def _frame_start(self, frame_index: int) -> int:
+        return math.ceil(frame_index * self.sample_rate / (self.hop_length * self.fps))
+
+    def _complete_frame(self) -> np.ndarray:
+        # a video frame without analysis frames repeats the previous frame
+        if self._frame_count:
+            self._previous_values = self._frame_sum / self._frame_count
+        self._frame_sum[:] = 0.
+        self._frame_count = 0
+        self.n_frames += 1
+        values = self._previous_values
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+        if not self.normalise:
+            return values.copy()
+        value_range = self.maximum - self.minimum
+        return np.divide(values - self.minimum, value_range, out=np.zeros(len(values)), where=value_range > 0)
@@ -1,2 +1,7 @@
 from aeraudioviz.image.image_modifier import ImageModifiers
 from aeraudioviz.image.image import BaseImage
+from aeraudioviz.image.frame_source import FrameSource, ImageSequence, VideoFrames
+from aeraudioviz.image.animated_base import AnimatedBase, BaseFrames
+from aeraudioviz.image.blur_pyramid import BlurPyramid
+from aeraudioviz.image.noise import NoiseBank
+from aeraudioviz.image import lut
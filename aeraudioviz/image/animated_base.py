@@ -0,0 +1,121 @@
+import copy
+import math
+from typing import Optional
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from aeraudioviz.image.frame_source import FrameSource
+
+
+class AnimatedBase:
+
+    def __init__(
+            self,
+            source: FrameSource,
+            column: Optional[str] = None,
+            crossfade: bool = True,
+            source_fps: Optional[float] = None
+    ):
+        """
+        A base made of several frames, e.g. an ImageSequence or VideoFrames, used in place of a BaseImage. Each video
+        frame is rendered from a position in the source: the value of column, in the range (0, 1), scaled to the
+        source frames, or when column is None the time of the video frame played at source_fps, looping. Between two
+        source frames the base is their cross-fade, or the nearest frame when crossfade is False. The source frames are
+        decoded when first used, see FrameSource, so a source of many large images is never held in memory at once.
+
+        :param source: the FrameSource of the base frames
+        :param column: optional feature column selecting the source frame
+        :param crossfade: Boolean controlling whether the base is cross-faded between source frames
+        :param source_fps: source frames per second of video when column is None. Defaults to the frame rate of a
+        VideoFrames source and to one frame per second otherwise.
+        """
+        self.source = source
+        self.column = column
+        self.crossfade = crossfade
+        self.source_fps = source_fps if source_fps is not None else getattr(source, 'fps', None) or 1.
+
+    def __len__(self):
+        return len(self.source)
+
+    @property
+    def rgb_image(self) -> np.ndarray:
+        # the first frame, which gives the shape and dtype of every frame
+        return self.source.frame(0)
+
+    @property
+    def cache_key(self) -> str:
+        return f'{self.source.cache_key}:{self.crossfade}'
+
+    def resized(self, size: tuple[int, int]) -> 'AnimatedBase':
+        """
+        Method to get a copy of the base at another size, see FrameSource.resized
+
+        :param size: (width, height) of the copy
+        :return: AnimatedBase object
+        """
+        resized_base = copy.copy(self)
+        resized_base.source = self.source.resized(size)
+        return resized_base
+
+    def positions(self, feature_time_series: pd.DataFrame, fps: float) -> np.ndarray:
+        """
+        Method to get the source position of every video frame
+
+        :param feature_time_series: pandas.DataFrame with one row per frame, normalised if column is used
+        :param fps: frame rate of the video
+        :return: float array of positions in the range [0, len(source)), one per row of feature_time_series
+        """
+        if self.column is not None:
+            values = feature_time_series[self.column].to_numpy(dtype=np.float64)
+            return np.clip(values, 0., 1.) * (len(self) - 1)
+        return (np.arange(len(feature_time_series)) * self.source_fps / fps) % len(self)
+
+    def rgb_image_at(self, position: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Method to get the base at a source position
+
+        :param position: position in the source, see positions
+        :param out: optional array a cross-fade is written to
+        :return: RGB uint8 array, read only when it is a source frame
+        """
+        index = math.floor(position)
+        fraction = position - index
+        if not self.crossfade or fraction == 0.:
+            return self.source.frame(round(position) % len(self))
+        return cv2.addWeighted(
+            self.source.frame(index), 1. - fraction, self.source.frame((index + 1) % len(self)), fraction, 0., dst=out
+        )
+
+
+class BaseFrames:
+
+    def __init__(self, base: AnimatedBase, positions: np.ndarray):
+        """
+        The base of each frame of a render, which is picklable so worker processes can build their own. The source
+        caches are not pickled, so each process decodes frames itself or shares the on disk cache of the source.
+
+        :param base: the AnimatedBase
+        :param positions: the source position of every frame, see AnimatedBase.positions
+        """
+        self.base = base
+        self.positions = positions
+        self._buffer = None
+
+    def __call__(self, frame_index: int) -> np.ndarray:
+        """
+        Method to get the base of a frame. A cross-fade is written to the same array for every frame, so it must not
+        be kept after the next call.
+
+        :param frame_index: the index of the frame
+        :return: RGB uint8 array
+        """
+        if self._buffer is None:
+            self._buffer = np.empty_like(self.base.rgb_image)
+        return self.base.rgb_image_at(self.positions[frame_index], out=self._buffer)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        return state
@@ -0,0 +1,64 @@
+import bisect
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from aeraudioviz.image.image_modifier import _copy_to, _round_to_nearest_odd_int
+
+
+class BlurPyramid:
+
+    def __init__(self, image, blur_function, min_kernel_size: int, max_kernel_size: int, max_levels: int = 16):
+        """
+        Blurred copies of an image at a ladder of kernel sizes, so a blur of that image becomes a lookup. When the
+        range holds no more than max_levels odd kernel sizes every size is precomputed and lookups are exact. Otherwise
+        the levels are spaced geometrically and sizes in between are interpolated from the two nearest levels.
+
+        :param image: the image to blur
+        :param blur_function: ImageModifiers.apply_gaussian_blur or ImageModifiers.apply_median_blur
+        :param min_kernel_size: the smallest kernel size that will be looked up
+        :param max_kernel_size: the largest kernel size that will be looked up
+        :param max_levels: maximum number of blurred copies to hold
+        """
+        self.image = image
+        self.blur_function = blur_function
+        min_kernel_size, max_kernel_size = (
+            _effective_kernel_size(min(min_kernel_size, max_kernel_size)),
+            _effective_kernel_size(max(min_kernel_size, max_kernel_size))
+        )
+        if (max_kernel_size - min_kernel_size) // 2 + 1 <= max_levels:
+            self.kernel_sizes = list(range(min_kernel_size, max_kernel_size + 1, 2))
+        else:
+            self.kernel_sizes = sorted({
+                _effective_kernel_size(kernel_size)
+                for kernel_size in np.geomspace(min_kernel_size, max_kernel_size, max_levels)
+            } | {max_kernel_size})
+        self.levels = [blur_function(image, kernel_size=kernel_size) for kernel_size in self.kernel_sizes]
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+    def lookup(self, kernel_size: float = 51, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Method to get the image blurred with kernel_size
+
+        :param kernel_size: the kernel size as passed to the blur function
+        :param out: optional array of the image's shape and dtype the blurred image is written to
+        :return: out, or a new array with the blurred image when out is None
+        """
+        effective_kernel_size = _effective_kernel_size(kernel_size)
+        position = bisect.bisect_left(self.kernel_sizes, effective_kernel_size)
+        if position == len(self.kernel_sizes):
+            return _copy_to(self.levels[-1], out)
+        if self.kernel_sizes[position] == effective_kernel_size or position == 0:
+            return _copy_to(self.levels[position], out)
+        lower, upper = self.kernel_sizes[position - 1], self.kernel_sizes[position]
+        weight = float(np.clip((kernel_size - lower) / (upper - lower), 0., 1.))
+        return cv2.addWeighted(self.levels[position - 1], 1. - weight, self.levels[position], weight, 0, dst=out)
+
+
+def _effective_kernel_size(kernel_size: float) -> int:
+    # the blur modifiers round to an odd size and a size of 0 leaves the image as it is, the same as a size of 1
+    return _round_to_nearest_odd_int(max(kernel_size, 1))
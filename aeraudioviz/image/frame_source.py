@@ -0,0 +1,225 @@
+import abc
+from collections import OrderedDict
+import copy
+import glob
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+from typing import Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+
+class FrameSource(abc.ABC):
+
+    def __init__(self, size: tuple[int, int] = (1080, 1080), cache_dir: Optional[str] = None, max_ram_frames: int = 8):
+        """
+        Frames decoded on demand, e.g. the images of an ImageSequence or the frames of a VideoFrames file. Each frame
+        is decoded and resized once: with cache_dir it is then kept in a memory mapped file of all the resized frames,
+        which later runs and other processes reuse, and the max_ram_frames most recently used frames are kept in
+        memory. Subclasses implement __len__, _decode and _source_description.
+
+        :param size: (width, height) the frames are resized to
+        :param cache_dir: optional directory of the memory mapped frame caches, named by a hash of the source files,
+        their modification times and size
+        :param max_ram_frames: maximum number of frames held in memory
+        """
+        self.size = tuple(size)
+        self.cache_dir = cache_dir
+        self.max_ram_frames = max_ram_frames
+        self._frames = OrderedDict()
+        self._disk_frames = None
+        self._decoded = None
+
+    @abc.abstractmethod
+    def __len__(self):
+        pass
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self.size[1], self.size[0], 3
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        Method to get a frame, marking it as recently used
+
+        :param index: the index of the frame
+        :return: read only RGB uint8 array of shape (height, width, 3)
+        """
+        frame = self._frames.get(index)
+        if frame is not None:
+            self._frames.move_to_end(index)
+            return frame
+        frame = self._load(index)
+        frame.flags.writeable = False
+        self._frames[index] = frame
+        while len(self._frames) > self.max_ram_frames:
+            self._frames.popitem(last=False)
+        return frame
+
+    def resized(self, size: tuple[int, int]) -> 'FrameSource':
+        """
+        Method to get the same frames at another size, with its own caches
+
+        :param size: (width, height) of the frames
+        :return: FrameSource object of the same class
+        """
+        resized_source = copy.copy(self)
+        resized_source.size = tuple(size)
+        resized_source._frames = OrderedDict()
+        resized_source._disk_frames = None
+        resized_source._decoded = None
+        return resized_source
+
+    @property
+    def cache_key(self) -> str:
+        description = f'{type(self).__name__}{self.size}{self._source_description()}'
+        return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+    def __getstate__(self):
+        # memory maps, open decoders and frames in memory are not sent to other processes
+        state = self.__dict__.copy()
+        state['_frames'] = OrderedDict()
+        state['_disk_frames'] = None
+        state['_decoded'] = None
+        return state
+
+    def _load(self, index: int) -> np.ndarray:
+        if self.cache_dir is not None:
+            self._open_disk_cache()
+            if self._decoded[index]:
+                return np.array(self._disk_frames[index])
+        frame = cv2.cvtColor(
+            cv2.resize(self._decode(index), self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB
+        )
+        if self.cache_dir is not None:
+            # the flag is set after the frame is written, so a process reading the cache never sees a partial frame
+            self._disk_frames[index] = frame
+            self._decoded[index] = 1
+        return frame
+
+    def _open_disk_cache(self):
+        if self._disk_frames is not None:
+            return
+        directory = Path(self.cache_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        frames_path = directory / f'{self.cache_key}.frames.npy'
+        decoded_path = directory / f'{self.cache_key}.decoded.npy'
+        if not decoded_path.exists():
+            _create_npy(frames_path, (len(self), *self.shape))
+            _create_npy(decoded_path, (len(self),))
+        self._disk_frames = np.lib.format.open_memmap(frames_path, mode='r+')
+        self._decoded = np.lib.format.open_memmap(decoded_path, mode='r+')
+
+    @abc.abstractmethod
+    def _decode(self, index: int) -> np.ndarray:
+        # returns the BGR frame at its native size
+        pass
+
+    @abc.abstractmethod
+    def _source_description(self) -> str:
+        # describes the source files, so the disk cache is not reused when they change
+        pass
+
+
+class ImageSequence(FrameSource):
+
+    def __init__(
+            self,
+            image_paths: Union[str, Sequence[str]],
+            size: tuple[int, int] = (1080, 1080),
+            cache_dir: Optional[str] = None,
+            max_ram_frames: int = 8
+    ):
+        """
+        Still images used as the frames of an AnimatedBase, see FrameSource
+
+        :param image_paths: paths to the image files, or a glob pattern matching them, which are used in sorted order
+        :param size: (width, height) the images are resized to
+        :param cache_dir: optional directory of the memory mapped frame caches
+        :param max_ram_frames: maximum number of images held in memory
+        """
+        super().__init__(size, cache_dir, max_ram_frames)
+        self.image_paths = sorted(glob.glob(image_paths)) if isinstance(image_paths, str) else list(image_paths)
+        if not self.image_paths:
+            raise ValueError(f'no images in {image_paths}')
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def _decode(self, index: int) -> np.ndarray:
+        image = cv2.imread(self.image_paths[index])
+        if image is None:
+            raise ValueError(f'could not read image {self.image_paths[index]}')
+        return image
+
+    def _source_description(self) -> str:
+        return ''.join(_file_description(path) for path in self.image_paths)
+
+
+class VideoFrames(FrameSource):
+
+    def __init__(
+            self,
+            video_path: str,
+            size: tuple[int, int] = (1080, 1080),
+            cache_dir: Optional[str] = None,
+            max_ram_frames: int = 8
+    ):
+        """
+        The frames of a video file used as the frames of an AnimatedBase, see FrameSource. Frames read in order are
+        decoded sequentially, other reads seek in the file.
+
+        :param video_path: path to the video file
+        :param size: (width, height) the frames are resized to
+        :param cache_dir: optional directory of the memory mapped frame caches
+        :param max_ram_frames: maximum number of frames held in memory
+        """
+        super().__init__(size, cache_dir, max_ram_frames)
+        self.video_path = video_path
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError(f'could not open video {video_path}')
+        self.n_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+        self._capture = None
+        self._next_index = 0
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_capture'] = None
+        return state
+
+    def _decode(self, index: int) -> np.ndarray:
+        if self._capture is None:
+            self._capture = cv2.VideoCapture(self.video_path)
+            self._next_index = 0
+        if index != self._next_index:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        success, frame = self._capture.read()
+        if not success:
+            raise ValueError(f'could not read frame {index} of {self.video_path}')
+        self._next_index = index + 1
+        return frame
+
+    def _source_description(self) -> str:
+        return _file_description(self.video_path)
+
+
+def _file_description(path: str) -> str:
+    stat = os.stat(path)
+    return f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};'
+
+
+def _create_npy(path: Path, shape: tuple):
+    # written to a temporary file and renamed into place, so other processes only ever open a complete file
+    handle, temporary_path = tempfile.mkstemp(suffix='.npy', dir=path.parent)
+    os.close(handle)
+    np.lib.format.open_memmap(temporary_path, mode='w+', dtype=np.uint8, shape=shape).flush()
+    os.replace(temporary_path, path)
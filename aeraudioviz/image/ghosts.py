@@ -0,0 +1,40 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+def add_shifted_copies(
+        image: np.ndarray, shifts: np.ndarray, weights: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Function to add weighted copies of an image translated by whole pixels, accumulating in float32 and saturating
+    to uint8 once at the end. Pixels shifted in from outside the image are black.
+
+    :param image: uint8 image
+    :param shifts: integer array of shape (n, 2) with the (dx, dy) shift of each copy
+    :param weights: array of shape (n,) with the weight of each copy
+    :param out: optional uint8 array of the image's shape the result is written to
+    :return: out, or a new uint8 image when out is None
+    """
+    height, width = image.shape[:2]
+    accumulator = image.astype(np.float32)
+    for (dx, dy), weight in zip(shifts, weights):
+        (dst_rows, src_rows), (dst_columns, src_columns) = _shift_slices(dy, height), _shift_slices(dx, width)
+        if dst_rows.start >= dst_rows.stop or dst_columns.start >= dst_columns.stop:
+            continue
+        target = accumulator[dst_rows, dst_columns]
+        # the uint8 copy is converted as it is added, so no float copy of the image is made
+        cv2.addWeighted(target, 1., image[src_rows, src_columns], float(weight), 0., dst=target, dtype=cv2.CV_32F)
+    return to_uint8(accumulator, out)
+
+
+def to_uint8(float_image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # rounds and saturates in a single pass
+    return cv2.add(float_image, 0., dst=out, dtype=cv2.CV_8U)
+
+
+def _shift_slices(shift: int, length: int) -> tuple[slice, slice]:
+    # destination and source slices of a translation by shift pixels along an axis of length pixels
+    shift = int(np.clip(shift, -length, length))
+    return slice(max(shift, 0), length + min(shift, 0)), slice(max(-shift, 0), length - max(shift, 0))
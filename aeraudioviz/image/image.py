@@ -1,3 +1,6 @@
+import copy
+from functools import cached_property
+
 import cv2
 from matplotlib import pyplot as plt
 
@@ -6,13 +9,43 @@ class BaseImage:
 
     def __init__(self, image_path: str, size=(1080, 1080)):
         """
+        A still image used as the base of every frame. The image is read and resized when rgb_image is first
+        accessed, and the BGR and HSV versions are only computed when they are accessed.
 
-        :param image_path:
+        :param image_path: path to the image file
+        :param size: (width, height) the image is resized to
         """
         self.image_path = image_path
-        self.bgr_image = cv2.resize(cv2.imread(self.image_path), size)
-        self.rgb_image = cv2.cvtColor(self.bgr_image, cv2.COLOR_BGR2RGB)
-        self.hsv_image = cv2.cvtColor(self.rgb_image, cv2.COLOR_RGB2HSV)
+        self.size = tuple(size)
+
+    @cached_property
+    def rgb_image(self):
+        bgr_image = cv2.imread(self.image_path)
+        if bgr_image is None:
+            raise ValueError(f'could not read image {self.image_path}')
+        return cv2.cvtColor(cv2.resize(bgr_image, self.size), cv2.COLOR_BGR2RGB)
+
+    @cached_property
+    def bgr_image(self):
+        return cv2.cvtColor(self.rgb_image, cv2.COLOR_RGB2BGR)
+
+    @cached_property
+    def hsv_image(self):
+        return cv2.cvtColor(self.rgb_image, cv2.COLOR_RGB2HSV)
+
+    def resized(self, size: tuple[int, int]) -> 'BaseImage':
+        """
+        Method to get a copy of the image at another size without reading the image file again
+
+        :param size: (width, height) of the copy
+        :return: BaseImage object
+        """
+        resized_image = copy.copy(self)
+        resized_image.__dict__.pop('bgr_image', None)
+        resized_image.__dict__.pop('hsv_image', None)
+        resized_image.size = tuple(size)
+        resized_image.rgb_image = cv2.resize(self.rgb_image, size, interpolation=cv2.INTER_AREA)
+        return resized_image
 
     def show(self):
         """
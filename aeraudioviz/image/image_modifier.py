@@ -1,39 +1,48 @@
 import cv2
 import numpy as np
-from typing import Union
+from typing import Optional, Union
+
+from aeraudioviz.image import lut
+from aeraudioviz.image.ghosts import add_shifted_copies
+from aeraudioviz.image.noise import NoiseBank, add_gaussian_noise, random_line_spans, scatter_pixels
 
 
 class ImageModifiers:
 
+    # Every modifier takes an optional out array of the image's shape and dtype. When it is given the result is
+    # written to it and out is returned, so a render can reuse preallocated frames, see video.FrameBuffers. Without
+    # it a new array is returned, except by the line modifiers, which draw on the image in place.
+
     @staticmethod
-    def apply_median_blur(image, kernel_size: int = 51):
+    def apply_median_blur(image, kernel_size: int = 51, out: Optional[np.ndarray] = None):
         kernel_size = _round_to_nearest_odd_int(kernel_size)
-        return cv2.medianBlur(image, kernel_size)
+        return cv2.medianBlur(image, kernel_size, dst=out)
 
     @staticmethod
-    def apply_gaussian_blur(image, kernel_size: int = 51):
+    def apply_gaussian_blur(image, kernel_size: int = 51, out: Optional[np.ndarray] = None):
         if kernel_size == 0:
-            return image
+            return image if out is None else _copy_to(image, out)
         kernel_size = _round_to_nearest_odd_int(kernel_size)
-        return cv2.GaussianBlur(image, (kernel_size, kernel_size), 0)
+        return cv2.GaussianBlur(image, (kernel_size, kernel_size), 0, dst=out)
 
     @staticmethod
-    def apply_gaussian_noise(image, mean: int = 0, standard_deviation: int = 5):
-        noise = np.random.normal(mean, standard_deviation, image.shape).astype(np.uint8)
-        return cv2.add(image, noise)
+    def apply_gaussian_noise(image, mean: int = 0, standard_deviation: int = 5,
+                             rng: Optional[np.random.Generator] = None, noise_bank: Optional[NoiseBank] = None,
+                             out: Optional[np.ndarray] = None):
+        # pass a NoiseBank, e.g. with functools.partial, to sample precomputed noise instead of generating it
+        return add_gaussian_noise(image, mean, standard_deviation, _get_rng(rng), noise_bank=noise_bank, out=out)
 
     @staticmethod
-    def apply_salt_and_pepper_noise(image, noise_ratio: float = .1):
-        # add salt noise (random white pixels)
-        noisy_image = ImageModifiers._replace_random_pixels(image, value=255, replace_ratio=noise_ratio/2.)
-        # add pepper noise (random black pixels)
-        return ImageModifiers._replace_random_pixels(noisy_image, value=0, replace_ratio=noise_ratio/2.)
+    def apply_salt_and_pepper_noise(image, noise_ratio: float = .1, rng: Optional[np.random.Generator] = None,
+                                    out: Optional[np.ndarray] = None):
+        # salt noise (random white pixels) and pepper noise (random black pixels) placed in one draw
+        noisy_pixels = int(image.size * noise_ratio / 2.)
+        return scatter_pixels(_copy_to(image, out), (255, 0), (noisy_pixels, noisy_pixels), _get_rng(rng))
 
     @staticmethod
-    def apply_hue_multiplication(image, hue_factor: float = 1.):
-        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        hsv_image[:, :, 0] = np.uint8(np.clip((hsv_image[:, :, 0] * hue_factor) % 360, 0, 360))
-        return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2RGB)
+    def apply_hue_multiplication(image, hue_factor: float = 1., out: Optional[np.ndarray] = None):
+        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=out)
+        return cv2.cvtColor(ImageModifiers._multiply_hue(hsv_image, hue_factor), cv2.COLOR_HSV2RGB, dst=hsv_image)
 
     @staticmethod
     def apply_hue_multiplication_to_area(
@@ -42,10 +51,40 @@ class ImageModifiers:
             area_centre_height: float = .5,
             area_width: float = 1.,
             area_height: float = 1.,
+            mod_factor: float = 1.,
+            out: Optional[np.ndarray] = None
+    ):
+        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=out)
+        hsv_image = ImageModifiers._multiply_hue_in_area(
+            hsv_image, area_centre_width, area_centre_height, area_width, area_height, mod_factor
+        )
+        return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2RGB, dst=hsv_image)
+
+    @staticmethod
+    def apply_saturation_multiplication(image, saturation_factor: float = 1., out: Optional[np.ndarray] = None):
+        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=out)
+        return cv2.cvtColor(
+            ImageModifiers._multiply_saturation(hsv_image, saturation_factor), cv2.COLOR_HSV2RGB, dst=hsv_image
+        )
+
+    # HSV domain versions of the hue and saturation modifiers. They modify the HSV image in place so several can be
+    # applied between a single pair of colour conversions.
+
+    @staticmethod
+    def _multiply_hue(hsv_image, hue_factor: float = 1.):
+        return cv2.LUT(hsv_image, _hue_table(hue_factor), dst=hsv_image)
+
+    @staticmethod
+    def _multiply_hue_in_area(
+            hsv_image,
+            area_centre_width: float = .5,
+            area_centre_height: float = .5,
+            area_width: float = 1.,
+            area_height: float = 1.,
             mod_factor: float = 1.
     ):
-        image_width = image.shape[1]
-        image_height = image.shape[0]
+        image_width = hsv_image.shape[1]
+        image_height = hsv_image.shape[0]
         centre_width_pixel = int(area_centre_width * image_width)
         centre_height_pixel = int(area_centre_height * image_height)
         width_pixels = _round_to_nearest_even_int(image_width * area_width)
@@ -54,127 +93,156 @@ class ImageModifiers:
         right = int(np.clip(centre_width_pixel + width_pixels / 2, 0, image_width))
         top = int(np.clip(centre_height_pixel + height_pixels / 2, 0, image_width))
         bottom = int(np.clip(centre_width_pixel - height_pixels / 2, 0, image_width))
-        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        hsv_image[bottom:top, left:right, 0] = np.uint8(
-            np.clip((hsv_image[bottom:top, left:right, 0] * mod_factor) % 360, 0, 360)
-        )
-        return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2RGB)
+        area = hsv_image[bottom:top, left:right]
+        if area.size:
+            cv2.LUT(area, _hue_table(mod_factor), dst=area)
+        return hsv_image
 
     @staticmethod
-    def apply_saturation_multiplication(image, saturation_factor: float = 1.):
-        hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
-        hsv_image[:, :, 1] = np.uint8(np.clip(hsv_image[:, :, 1] * saturation_factor, 0, 255))
-        return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2RGB)
+    def _multiply_saturation(hsv_image, saturation_factor: float = 1.):
+        table = lut.merge_channels(lut.IDENTITY, lut.channel_table(lut.multiply_curve, saturation_factor), lut.IDENTITY)
+        return cv2.LUT(hsv_image, table, dst=hsv_image)
 
     @staticmethod
-    def apply_rgb_multiplication(image, red_factor: float = 1., green_factor: float = 1., blue_factor: float = 1.):
-        return np.uint8(
-            np.stack(
-                [
-                    np.clip(image[:, :, 0] * red_factor, 0, 255),
-                    np.clip(image[:, :, 1] * green_factor, 0, 255),
-                    np.clip(image[:, :, 2] * blue_factor, 0, 255)
-                ], axis=-1)
-        )
+    def apply_rgb_multiplication(image, red_factor: float = 1., green_factor: float = 1., blue_factor: float = 1.,
+                                 out: Optional[np.ndarray] = None):
+        return cv2.LUT(image, lut.merge_channels(
+            lut.channel_table(lut.multiply_curve, red_factor),
+            lut.channel_table(lut.multiply_curve, green_factor),
+            lut.channel_table(lut.multiply_curve, blue_factor)
+        ), dst=out)
+
+    @staticmethod
+    def apply_red_scaling(image, scale_factor: float = 0., out: Optional[np.ndarray] = None):
+        return ImageModifiers._scale_rgb_channel(image, scale_factor, 0, out=out)
+
+    @staticmethod
+    def apply_green_scaling(image, scale_factor: float = 0., out: Optional[np.ndarray] = None):
+        return ImageModifiers._scale_rgb_channel(image, scale_factor, 1, out=out)
 
     @staticmethod
-    def apply_red_scaling(image, scale_factor: float = 0.):
-        return ImageModifiers._scale_rgb_channel(image, scale_factor, 0)
+    def apply_blue_scaling(image, scale_factor: float = 0., out: Optional[np.ndarray] = None):
+        return ImageModifiers._scale_rgb_channel(image, scale_factor, 2, out=out)
 
     @staticmethod
-    def apply_green_scaling(image, scale_factor: float = 0.):
-        return ImageModifiers._scale_rgb_channel(image, scale_factor, 1)
+    def _scale_rgb_channel(image, scale_factor: float, channel: int, out: Optional[np.ndarray] = None):
+        if scale_factor == 0.:
+            return image if out is None else _copy_to(image, out)
+        tables = [lut.IDENTITY, lut.IDENTITY, lut.IDENTITY]
+        tables[channel] = lut.channel_table(lut.scale_curve, scale_factor)
+        return cv2.LUT(image, lut.merge_channels(*tables), dst=out)
+
+    # Float versions of the RGB channel modifiers. They modify a float32 RGB array in place and do not round, so
+    # several can be combined into one lookup table with lut.float_curve_table.
 
     @staticmethod
-    def apply_blue_scaling(image, scale_factor: float = 0.):
-        return ImageModifiers._scale_rgb_channel(image, scale_factor, 2)
+    def _multiply_rgb_float(float_image, red_factor: float = 1., green_factor: float = 1., blue_factor: float = 1.):
+        float_image *= np.array([red_factor, green_factor, blue_factor], dtype=np.float32)
+        return np.clip(float_image, 0, 255, out=float_image)
 
     @staticmethod
-    def _scale_rgb_channel(image, scale_factor: float, channel: int):
+    def _scale_rgb_channel_float(float_image, scale_factor: float = 0., channel: int = 0):
+        modified_channel = float_image[:, :, channel]
         if scale_factor < 0.:
-            modified_channel = image[:, :, channel] + scale_factor * image[:, :, channel]
+            modified_channel *= 1. + scale_factor
         elif scale_factor > 0.:
-            modified_channel = image[:, :, channel] + scale_factor * (255 - image[:, :, channel])
-        else:
-            return image
-        arrays = []
-        for i in [0, 1, 2]:
-            if i == channel:
-                arrays.append(np.clip(modified_channel, 0, 255))
-            else:
-                arrays.append(image[:, :, i])
-        return np.uint8(np.stack(arrays, axis=-1))
-
-    @staticmethod
-    def apply_ghost_images(image, number_of_ghost_images: int = 5, max_shift: int = 75, alpha: float = .1):
-        number_of_ghost_images = int(number_of_ghost_images)
-        max_shift = int(max_shift)
-
-        output = image.copy()
+            modified_channel *= 1. - scale_factor
+            modified_channel += scale_factor * 255.
+        np.clip(modified_channel, 0, 255, out=modified_channel)
+        return float_image
 
-        # Generate spatially shifted versions and blend them
-        for i in range(number_of_ghost_images):
-            dx = np.random.randint(-max_shift, max_shift + 1)
-            dy = np.random.randint(-max_shift, max_shift + 1)
+    @staticmethod
+    def apply_ghost_images(image, number_of_ghost_images: int = 5, max_shift: int = 75, alpha: float = .1,
+                           decay: float = 1., rng: Optional[np.random.Generator] = None,
+                           out: Optional[np.ndarray] = None):
+        # ghost i is weighted alpha * decay ** i and the blend is saturated once, after all ghosts are added
+        shifts, weights = ImageModifiers._draw_ghosts(number_of_ghost_images, max_shift, alpha, decay, _get_rng(rng))
+        return add_shifted_copies(image, shifts, weights, out=out)
 
-            m = np.float32([[1, 0, dx], [0, 1, dy]])
-            shifted_image = cv2.warpAffine(
-                image,
-                m,
-                (image.shape[1], image.shape[0])
-            )
-            output = cv2.addWeighted(output, 1, shifted_image, alpha, 0)
-        return np.uint8(output)
+    @staticmethod
+    def _draw_ghosts(number_of_ghost_images: int, max_shift: int, alpha: float, decay: float,
+                     rng: np.random.Generator):
+        # the (dx, dy) shifts and the weights of the ghosts
+        number_of_ghost_images = int(number_of_ghost_images)
+        max_shift = int(max_shift)
+        shifts = rng.integers(-max_shift, max_shift + 1, size=(number_of_ghost_images, 2))
+        return shifts, alpha * decay ** np.arange(number_of_ghost_images)
 
     @staticmethod
-    def apply_red_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8):
-        return ImageModifiers._apply_coloured_vlines(image, no_lines, min_thickness, max_thickness, 0)
+    def apply_red_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8,
+                         rng: Optional[np.random.Generator] = None, out: Optional[np.ndarray] = None):
+        return ImageModifiers._apply_coloured_vlines(
+            image, no_lines, min_thickness, max_thickness, 0, rng=rng, out=out
+        )
 
     @staticmethod
-    def apply_green_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8):
-        return ImageModifiers._apply_coloured_vlines(image, no_lines, min_thickness, max_thickness, 1)
+    def apply_green_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8,
+                           rng: Optional[np.random.Generator] = None, out: Optional[np.ndarray] = None):
+        return ImageModifiers._apply_coloured_vlines(
+            image, no_lines, min_thickness, max_thickness, 1, rng=rng, out=out
+        )
 
     @staticmethod
-    def apply_blue_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8):
-        return ImageModifiers._apply_coloured_vlines(image, no_lines, min_thickness, max_thickness, 2)
+    def apply_blue_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8,
+                          rng: Optional[np.random.Generator] = None, out: Optional[np.ndarray] = None):
+        return ImageModifiers._apply_coloured_vlines(
+            image, no_lines, min_thickness, max_thickness, 2, rng=rng, out=out
+        )
 
     @staticmethod
-    def apply_random_coloured_hlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8):
-        no_lines = int(no_lines)
-        min_thickness = int(min_thickness)
-        max_thickness = int(max_thickness)
-        image_width = image.shape[1]
-        vline_starts = np.random.randint(0, image_width, size=no_lines)
-        vline_widths = np.random.randint(min_thickness, max_thickness, size=no_lines)
-        for i in range(no_lines):
-            start_idx = vline_starts[i]
-            end_idx = min(vline_starts[i] + vline_widths[i], image_width)
-            for channel in (0, 1, 2):
-                image[start_idx:end_idx, :, channel] = np.random.randint(0, 255)
+    def apply_random_coloured_hlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8,
+                                     rng: Optional[np.random.Generator] = None,
+                                     out: Optional[np.ndarray] = None):
+        if out is not None:
+            image = _copy_to(image, out)
+        line_spans, colours = ImageModifiers._draw_hlines(
+            image.shape[0], no_lines, min_thickness, max_thickness, _get_rng(rng)
+        )
+        rows = np.flatnonzero(line_spans >= 0)
+        image[rows] = colours[line_spans[rows], None, :]
         return image
 
+    @staticmethod
+    def _draw_hlines(height: int, no_lines: int, min_thickness: int, max_thickness: int, rng: np.random.Generator):
+        # the line covering each row, see random_line_spans, and the colour of each line
+        line_spans = random_line_spans(height, int(no_lines), int(min_thickness), int(max_thickness), rng)
+        return line_spans, rng.integers(0, 255, size=(int(no_lines), 3), dtype=np.uint8)
+
     @staticmethod
     def _apply_coloured_vlines(image, no_lines: int = 10, min_thickness: int = 1, max_thickness: int = 8,
-                               colour_channel: int = 0):
-        no_lines = int(no_lines)
-        min_thickness = int(min_thickness)
-        max_thickness = int(max_thickness)
-        image_width = image.shape[1]
-        vline_starts = np.random.randint(0, image_width, size=no_lines)
-        vline_widths = np.random.randint(min_thickness, max_thickness, size=no_lines)
-        for i in range(no_lines):
-            start_idx = vline_starts[i]
-            end_idx = min(vline_starts[i] + vline_widths[i], image_width)
-            image[:, start_idx:end_idx, colour_channel] = 255
+                               colour_channel: int = 0, rng: Optional[np.random.Generator] = None,
+                               out: Optional[np.ndarray] = None):
+        rng = _get_rng(rng)
+        if out is not None:
+            image = _copy_to(image, out)
+        line_spans = random_line_spans(image.shape[1], int(no_lines), int(min_thickness), int(max_thickness), rng)
+        image[:, line_spans >= 0, colour_channel] = 255
         return image
 
     @staticmethod
-    def _replace_random_pixels(image, value: int = 255, replace_ratio: float = .1):
-        noisy_pixels = int(image.size * replace_ratio)
-        indices_to_modify = [np.random.randint(0, i - 1, noisy_pixels) for i in image.shape]
-        modified_image = image.copy()
-        modified_image[indices_to_modify[0], indices_to_modify[1], :] = [value, value, value]
-        return modified_image
+    def _replace_random_pixels(image, value: int = 255, replace_ratio: float = .1,
+                               rng: Optional[np.random.Generator] = None, out: Optional[np.ndarray] = None):
+        return scatter_pixels(_copy_to(image, out), (value,), (int(image.size * replace_ratio),), _get_rng(rng))
+
+
+def _hue_table(hue_factor: float) -> np.ndarray:
+    return lut.merge_channels(lut.channel_table(lut.hue_multiply_curve, hue_factor), lut.IDENTITY, lut.IDENTITY)
+
+
+def _copy_to(image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # the array a modifier that sets pixels in place works on: out holding the image, or a copy when out is None
+    if out is None:
+        return image.copy()
+    if out is not image:
+        np.copyto(out, image)
+    return out
+
+
+def _get_rng(rng: Optional[np.random.Generator] = None) -> np.random.Generator:
+    if rng is not None:
+        return rng
+    # seed from the legacy global state so np.random.seed still makes unseeded calls repeatable
+    return np.random.default_rng(np.random.randint(0, 2 ** 31))
 
 
 def _round_to_nearest_odd_int(x: Union[int, float]):
@@ -0,0 +1,81 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+# resolution of the parameter values that lookup tables are built and cached for
+PARAMETER_STEP = 1e-4
+
+IDENTITY = np.arange(256, dtype=np.uint8)
+IDENTITY.flags.writeable = False
+
+
+def multiply_curve(values, factor: float):
+    return np.clip(values * factor, 0, 255)
+
+
+def scale_curve(values, scale_factor: float):
+    if scale_factor < 0.:
+        values = values + scale_factor * values
+    elif scale_factor > 0.:
+        values = values + scale_factor * (255 - values)
+    return np.clip(values, 0, 255)
+
+
+def hue_multiply_curve(values, hue_factor: float):
+    return np.clip((values * hue_factor) % 360, 0, 360)
+
+
+def quantise(value: float, step: float = PARAMETER_STEP) -> float:
+    """
+    Function to round a parameter value to the resolution lookup tables are cached for
+
+    :param value: the parameter value
+    :param step: the resolution
+    :return: the rounded value
+    """
+    return round(float(value) / step) * step
+
+
+def channel_table(curve, value: float) -> np.ndarray:
+    """
+    Function to get the 256 entry lookup table of a single channel point operation. Tables are cached on the quantised
+    parameter value, so repeated and nearby values reuse the same table.
+
+    :param curve: function mapping an array of uint8 values and the parameter value to new values, e.g. multiply_curve
+    :param value: the parameter value
+    :return: read only uint8 array of shape (256,)
+    """
+    return _channel_table(curve, quantise(value))
+
+
+@lru_cache(maxsize=4096)
+def _channel_table(curve, value: float) -> np.ndarray:
+    table = np.uint8(curve(np.arange(256, dtype=np.float64), value))
+    table.flags.writeable = False
+    return table
+
+
+def merge_channels(first: np.ndarray, second: np.ndarray, third: np.ndarray) -> np.ndarray:
+    """
+    Function to combine three single channel tables into a table for cv2.LUT on 3 channel images
+
+    :return: uint8 array of shape (256, 1, 3)
+    """
+    return np.stack([first, second, third], axis=-1).reshape(256, 1, 3)
+
+
+def float_curve_table(curves_with_kwargs) -> np.ndarray:
+    """
+    Function to build a single lookup table for a sequence of float point operations on RGB images. The operations
+    are evaluated on the 256 possible values without rounding in between, so the table gives the same result as
+    applying them to a float image and rounding once at the end.
+
+    :param curves_with_kwargs: sequence of (function, key word arguments) where each function modifies a float32 RGB
+    array of shape (..., 3) in place and returns it
+    :return: uint8 array of shape (256, 1, 3)
+    """
+    values = np.repeat(np.arange(256, dtype=np.float32).reshape(256, 1, 1), 3, axis=2)
+    for curve, kwargs in curves_with_kwargs:
+        values = curve(values, **kwargs)
+    return values.astype(np.uint8)
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class NoiseBank:
+
+    def __init__(self, n_textures: int = 4, margin: int = 64, seed: int = 0):
+        """
+        Bank of precomputed standard normal noise textures. Each sample is a window of one of the textures at a random
+        offset, which costs no random number generation per pixel. Textures are generated from seed the first time an
+        image shape is sampled, so a bank gives the same noise in every process. Each texture takes
+        (height + margin) * (width + margin) * channels * 4 bytes.
+
+        :param n_textures: number of textures per image shape
+        :param margin: textures are this many pixels taller and wider than the image, giving (margin + 1) ** 2
+        offsets per texture
+        :param seed: seed of the textures
+        """
+        self.n_textures = n_textures
+        self.margin = margin
+        self.seed = seed
+        self._textures = {}
+
+    def __getstate__(self):
+        # the textures are rebuilt from the seed rather than sent to worker processes
+        state = self.__dict__.copy()
+        state['_textures'] = {}
+        return state
+
+    def sample(self, shape: tuple, rng: np.random.Generator) -> np.ndarray:
+        """
+        Method to get standard normal float32 noise
+
+        :param shape: shape of the noise, (height, width) or (height, width, channels)
+        :param rng: generator choosing the texture and offset
+        :return: read only view of a texture
+        """
+        textures = self._get_textures(tuple(shape))
+        texture = textures[rng.integers(len(textures))]
+        dy, dx = rng.integers(0, self.margin + 1, size=2)
+        return texture[dy:dy + shape[0], dx:dx + shape[1]]
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(texture.nbytes for textures in self._textures.values() for texture in textures)
+
+    def _get_textures(self, shape: tuple) -> list[np.ndarray]:
+        textures = self._textures.get(shape)
+        if textures is None:
+            rng = np.random.default_rng([self.seed, *shape])
+            texture_shape = (shape[0] + self.margin, shape[1] + self.margin, *shape[2:])
+            textures = [rng.standard_normal(texture_shape, dtype=np.float32) for _ in range(self.n_textures)]
+            for texture in textures:
+                texture.flags.writeable = False
+            self._textures[shape] = textures
+        return textures
+
+
+def add_gaussian_noise(
+        image: np.ndarray, mean: float, standard_deviation: float, rng: np.random.Generator,
+        noise_bank: Optional[NoiseBank] = None, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Function to add Gaussian noise to a uint8 image, saturating at 0 and 255
+
+    :param image: uint8 image
+    :param mean: mean of the noise
+    :param standard_deviation: standard deviation of the noise
+    :param rng: generator of the noise, or of the texture and offset when noise_bank is given
+    :param noise_bank: optional NoiseBank to sample the noise from rather than generating it
+    :param out: optional uint8 array of the image's shape the result is written to
+    :return: out, or a new uint8 image when out is None
+    """
+    if noise_bank is not None:
+        noise = noise_bank.sample(image.shape, rng)
+    else:
+        noise = rng.standard_normal(image.shape, dtype=np.float32)
+    return cv2.addWeighted(image, 1., noise, float(standard_deviation), float(mean), dst=out, dtype=cv2.CV_8U)
+
+
+def scatter_pixels(image: np.ndarray, values: tuple, counts: tuple, rng: np.random.Generator) -> np.ndarray:
+    """
+    Function to set randomly placed pixels of an image in place, with one draw of positions for all values
+
+    :param image: image of shape (height, width, channels)
+    :param values: the values to set
+    :param counts: number of pixels set to each value, later values overwrite earlier ones where positions coincide
+    :param rng: generator of the positions
+    :return: the image
+    """
+    pixels = image.reshape(-1, image.shape[-1])
+    positions = rng.integers(0, len(pixels), size=sum(counts))
+    for value, value_positions in zip(values, np.split(positions, np.cumsum(counts)[:-1])):
+        pixels[value_positions] = value
+    return image
+
+
+def random_line_spans(
+        length: int, no_lines: int, min_thickness: int, max_thickness: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Function to place lines of random position and thickness along an axis
+
+    :param length: length of the axis in pixels
+    :param no_lines: number of lines
+    :param min_thickness: minimum line thickness in pixels
+    :param max_thickness: maximum line thickness in pixels, exclusive
+    :param rng: generator of the positions and thicknesses
+    :return: integer array of shape (length,) with, for each pixel, the index of the last line covering it, or -1
+    """
+    if no_lines <= 0:
+        return np.full(length, -1)
+    starts = rng.integers(0, length, size=no_lines)
+    ends = np.minimum(starts + rng.integers(min_thickness, max_thickness, size=no_lines), length)
+    positions = np.arange(length)
+    covered = (positions >= starts[:, None]) & (positions < ends[:, None])
+    last_line = no_lines - 1 - np.argmax(covered[::-1], axis=0)
+    return np.where(covered.any(axis=0), last_line, -1)
@@ -1,3 +1,13 @@
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.frame_cache import FrameCache
+from aeraudioviz.video.live import LiveRenderer
+from aeraudioviz.video.modifier_chain import ModifierChain, OutAdapter
 from aeraudioviz.video.modifier_mapping import ModifierMapping
+from aeraudioviz.video.parameter_table import ParameterTable
+from aeraudioviz.video.render_report import LiveReport, RenderReport
+from aeraudioviz.video.segments import SegmentCache
+from aeraudioviz.video.sinks import CallbackSink, FileSink, FrameSink, PipeSink
+from aeraudioviz.video.temporal_ghosts import TemporalGhosts
+from aeraudioviz.video.tiling import BandExecutor
 from aeraudioviz.video.video import VideoGenerator
 
@@ -0,0 +1,74 @@
+import inspect
+import math
+
+from aeraudioviz.image import ImageModifiers
+from aeraudioviz.video.modifier_mapping import ModifierMapping
+
+
+# key word arguments measured in pixels, with the smallest value each keeps when it is scaled down
+PIXEL_KWARGS = {
+    ImageModifiers.apply_median_blur: {'kernel_size': 1},
+    ImageModifiers.apply_gaussian_blur: {'kernel_size': 1},
+    ImageModifiers.apply_ghost_images: {'max_shift': 1},
+    ImageModifiers.apply_red_vlines: {'min_thickness': 1, 'max_thickness': 2},
+    ImageModifiers.apply_green_vlines: {'min_thickness': 1, 'max_thickness': 2},
+    ImageModifiers.apply_blue_vlines: {'min_thickness': 1, 'max_thickness': 2},
+    ImageModifiers.apply_random_coloured_hlines: {'min_thickness': 1, 'max_thickness': 2},
+}
+
+
+def register_pixel_kwargs(modifier_function, **minimum_values: float):
+    """
+    Function to declare the pixel unit key word arguments of a custom modifier function, so draft renders scale them
+
+    :param modifier_function: the modifier function
+    :param minimum_values: Key is a key word argument measured in pixels. Value is the smallest value it is scaled to
+    when it is at least that value at full resolution.
+    """
+    PIXEL_KWARGS[modifier_function] = minimum_values
+
+
+def scale_modifier_mapping(mod_mapping: ModifierMapping, scale: float) -> ModifierMapping:
+    """
+    Function to rescale the pixel unit key word arguments of a modifier mapping for a render at a fraction of the
+    resolution. The ends of the kwarg ranges and the quantisation steps are multiplied by scale, and range ends at or
+    above their minimum value stay at or above it, so a one pixel line does not disappear. The max_thickness of a line
+    modifier stays above its min_thickness after both are truncated to int, and a band_halo is scaled up to whole rows.
+    Pixel unit arguments the mapping leaves at their defaults are added as constant ranges so that they are scaled too.
+
+    :param mod_mapping: the ModifierMapping
+    :param scale: the ratio of the draft resolution to the full resolution
+    :return: a new ModifierMapping, or mod_mapping if its function has no pixel unit arguments
+    """
+    function = mod_mapping.modifier_function
+    minimum_values = PIXEL_KWARGS.get(getattr(function, 'func', function))
+    if not minimum_values:
+        return mod_mapping
+    kwarg_ranges = dict(mod_mapping.kwarg_ranges)
+    quantisation_steps = dict(mod_mapping.quantisation_steps)
+    parameters = inspect.signature(function).parameters
+    for kwarg, minimum_value in minimum_values.items():
+        if kwarg not in kwarg_ranges:
+            if kwarg not in parameters or parameters[kwarg].default is inspect.Parameter.empty:
+                continue
+            kwarg_ranges[kwarg] = (parameters[kwarg].default, parameters[kwarg].default)
+        kwarg_ranges[kwarg] = tuple(_scale_value(value, scale, minimum_value) for value in kwarg_ranges[kwarg])
+        if kwarg in quantisation_steps:
+            quantisation_steps[kwarg] = quantisation_steps[kwarg] * scale
+    if 'min_thickness' in kwarg_ranges and 'max_thickness' in kwarg_ranges:
+        # the line modifiers truncate both thicknesses to int and need max_thickness above min_thickness
+        lowest_max_thickness = int(max(kwarg_ranges['min_thickness'])) + 1
+        kwarg_ranges['max_thickness'] = tuple(
+            max(value, lowest_max_thickness) for value in kwarg_ranges['max_thickness']
+        )
+    band_halo = math.ceil(mod_mapping.band_halo * scale) if mod_mapping.band_halo is not None else None
+    return ModifierMapping(
+        function, mod_mapping.modifier_column, quantisation_steps=quantisation_steps, band_halo=band_halo,
+        **kwarg_ranges
+    )
+
+
+def _scale_value(value: float, scale: float, minimum_value: float) -> float:
+    if value >= minimum_value:
+        return max(value * scale, minimum_value)
+    return value * scale
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class FrameBuffers:
+
+    def __init__(self, shape: tuple, n_outputs: int = 2, dtype=np.uint8):
+        """
+        Preallocated arrays a ModifierChain renders frames into. The stages of a frame alternate between two scratch
+        arrays and the last stage writes to the next array of a ring of n_outputs output arrays, so a render allocates
+        no frames. An output array is written again n_outputs frames later, so a frame must be consumed or copied
+        before then, e.g. n_outputs of the StreamingVideoWriter queue_size + 2 covers the frames waiting in the queue,
+        the frame being encoded and the frame being rendered.
+
+        :param shape: shape of the frames, (height, width, 3)
+        :param n_outputs: number of output arrays. With 0 each frame is rendered into a new array, for frames that are
+        sent to another process or kept.
+        :param dtype: dtype of the frames
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.scratch = [np.empty(self.shape, dtype=self.dtype) for _ in range(2)]
+        self.outputs = [np.empty(self.shape, dtype=self.dtype) for _ in range(n_outputs)]
+        self._position = 0
+
+    def __len__(self):
+        return len(self.outputs)
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(array.nbytes for array in self.scratch + self.outputs)
+
+    def next_output(self) -> np.ndarray:
+        """
+        Method to get the array the next frame is rendered into
+
+        :return: the least recently used output array, or a new array when there are no output arrays
+        """
+        if not self.outputs:
+            return np.empty(self.shape, dtype=self.dtype)
+        output = self.outputs[self._position]
+        self._position = (self._position + 1) % len(self.outputs)
+        return output
+
+    def next_scratch(self, image: np.ndarray) -> np.ndarray:
+        """
+        Method to get the scratch array a stage reading image writes to
+
+        :param image: the input of the stage
+        :return: the scratch array that is not image
+        """
+        return self.scratch[1] if image is self.scratch[0] else self.scratch[0]
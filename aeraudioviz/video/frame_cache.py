@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+
+
+class FrameCache:
+
+    def __init__(self, max_bytes: int = 512 * 1024 ** 2):
+        """
+        Least recently used store of rendered frames bounded by the total size of the frames it holds. Frames are
+        copied in and stored read only, so a frame rendered into a reused buffer, see FrameBuffers, can be cached and
+        a frame returned from the cache can be shared between several positions in the video.
+
+        :param max_bytes: maximum total size of the cached frames in bytes
+        """
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """
+        Method to look up a frame, marking it as recently used
+
+        :param key: the frame key
+        :return: the cached frame or None if the key is not cached
+        """
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+        return frame
+
+    def put(self, key: Hashable, frame: np.ndarray) -> np.ndarray:
+        """
+        Method to add a frame, evicting the least recently used frames when the cache is full
+
+        :param key: the frame key
+        :param frame: the rendered frame
+        :return: the cached read only copy of the frame
+        """
+        if key in self._frames:
+            return self.get(key)
+        frame = frame.copy()
+        frame.flags.writeable = False
+        if frame.nbytes > self.max_bytes:
+            return frame
+        while self.n_bytes + frame.nbytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self.n_bytes -= evicted.nbytes
+        self._frames[key] = frame
+        self.n_bytes += frame.nbytes
+        return frame
+
+    def clear(self):
+        self._frames.clear()
+        self.n_bytes = 0
@@ -0,0 +1,233 @@
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from aeraudioviz.audio import Audio
+from aeraudioviz.audio.online_features import ONLINE_FEATURE_COLUMNS, OnlineAudioFeatures
+from aeraudioviz.image import BaseImage
+from aeraudioviz.video.draft import scale_modifier_mapping
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.modifier_chain import ModifierChain, frame_rng
+from aeraudioviz.video.modifier_mapping import ModifierMapping
+from aeraudioviz.video.parameter_table import ParameterTable
+from aeraudioviz.video.render_report import LiveReport
+from aeraudioviz.video.sinks import FrameSink
+from aeraudioviz.video.temporal_ghosts import TemporalGhosts
+from aeraudioviz.video.tiling import BandExecutor
+
+
+FULL, DRAFT = 'full', 'draft'
+
+# weight of the latest render time in the running estimate of the render time
+RENDER_TIME_SMOOTHING = .2
+
+
+class LiveRenderer:
+
+    def __init__(
+            self,
+            base_image: BaseImage,
+            modifier_mappings: tuple[ModifierMapping],
+            sink: FrameSink,
+            fps: float = 24.,
+            sample_rate: float = 44100.,
+            deadline: Optional[float] = None,
+            degrade: bool = True,
+            draft_scale: float = .5,
+            seed: Optional[int] = None,
+            fuse_colour_ops: bool = True,
+            temporal_ghosts: Optional[TemporalGhosts] = None,
+            n_fft: int = 2048,
+            hop_length: int = 512,
+            band_threads: int = 1
+    ):
+        """
+        Renders video frames from blocks of audio as they arrive, e.g. from a sound card, for live shows. The features
+        are computed with OnlineAudioFeatures, so the modifier columns must be from 'Onset', 'Spectral Centroid' and
+        'RMS'. Each completed video frame is rendered through the modifier chain and written to the sink, and must be
+        emitted within deadline seconds of the arrival of the audio block that completed it. A frame that would miss
+        the deadline at full resolution, going by the recent render times, is rendered at draft_scale and upscaled
+        when degrade is True and that would meet the deadline, and is dropped otherwise. Dropped frames are not
+        written to the sink.
+
+        :param base_image: the BaseImage every frame is rendered from
+        :param modifier_mappings: tuple of ModifierMapping objects applied to each frame in order
+        :param sink: the FrameSink the frames are written to
+        :param fps: frame rate of the video
+        :param sample_rate: sample rate of the audio blocks in Hertz
+        :param deadline: seconds from the arrival of a frame's audio to its emission, defaults to one frame period
+        :param degrade: Boolean controlling whether frames that would miss the deadline are rendered at draft_scale
+        rather than dropped
+        :param draft_scale: ratio of the resolution of degraded frames to the full resolution, see VideoGenerator.draft
+        :param seed: seed for the stochastic modifiers, see VideoGenerator. If None a random seed is chosen.
+        :param fuse_colour_ops: Boolean controlling whether consecutive colour modifiers are fused, see ModifierChain
+        :param temporal_ghosts: optional TemporalGhosts blending the previously emitted frames onto each frame
+        :param n_fft: length of the audio analysis frames in samples
+        :param hop_length: number of samples between audio analysis frames
+        :param band_threads: number of threads each frame is rendered on, as horizontal bands, see BandExecutor
+        """
+        columns = [mod_mapping.modifier_column for mod_mapping in modifier_mappings]
+        self.features = OnlineAudioFeatures(
+            sample_rate, fps, n_fft, hop_length,
+            features=[column for column in ONLINE_FEATURE_COLUMNS if column in columns]
+        )
+        unknown_columns = set(columns) - set(self.features.features)
+        if unknown_columns:
+            raise ValueError(f'modifier columns that cannot be computed live: {unknown_columns}')
+        self._feature_indices = [self.features.features.index(column) for column in columns]
+        self.base_image = base_image
+        self.modifier_mappings = modifier_mappings
+        self.sink = sink
+        self.fps = fps
+        self.deadline = deadline if deadline is not None else 1. / fps
+        self.degrade = degrade
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy)
+        self.temporal_ghosts = temporal_ghosts
+        self.band_executor = BandExecutor(band_threads) if band_threads > 1 else None
+        feature_columns = pd.DataFrame(columns=list(dict.fromkeys(columns)), dtype=np.float64)
+        self.modifier_chain = ModifierChain(modifier_mappings, fuse_colour_ops=fuse_colour_ops)
+        self.parameter_table = ParameterTable(feature_columns, modifier_mappings)
+        height, width = base_image.rgb_image.shape[:2]
+        self.size = (width, height)
+        if degrade:
+            draft_size = tuple(max(2, round(length * draft_scale)) for length in self.size)
+            draft_mappings = tuple(
+                scale_modifier_mapping(mod_mapping, draft_size[0] / width) for mod_mapping in modifier_mappings
+            )
+            self._draft_image = base_image.resized(draft_size).rgb_image
+            self._draft_chain = ModifierChain(draft_mappings, fuse_colour_ops=fuse_colour_ops)
+            self._draft_table = ParameterTable(feature_columns, draft_mappings)
+        self.report = LiveReport(self.deadline, (n_fft // 2) / sample_rate)
+        self._expected_seconds = {FULL: None, DRAFT: None}
+        self._buffers = None
+        self._draft_buffers = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """
+        Method to open the sink and start a new run
+
+        :return:
+        """
+        # a frame is not rendered over until the sink has released it
+        self._buffers = FrameBuffers(self.base_image.rgb_image.shape, n_outputs=self.sink.frames_held + 1)
+        if self.degrade:
+            self._draft_buffers = FrameBuffers(self._draft_image.shape, n_outputs=1)
+        self.features.reset()
+        if self.temporal_ghosts is not None:
+            self.temporal_ghosts.reset()
+        self.report = LiveReport(self.report.deadline_seconds, self.report.analysis_latency_seconds)
+        self.sink.open()
+
+    def close(self):
+        self.sink.close()
+        if self.band_executor is not None:
+            self.band_executor.close()
+
+    def feed(self, block: np.ndarray) -> int:
+        """
+        Method to add the next block of audio, rendering and emitting the video frames it completes
+
+        :param block: mono float samples at sample_rate
+        :return: number of video frames the block completed, including dropped frames
+        """
+        arrival_time = time.perf_counter()
+        rows = self.features.process(block)
+        for row in rows:
+            self._emit(row, arrival_time)
+        return len(rows)
+
+    def flush(self) -> int:
+        """
+        Method to end the audio, rendering and emitting the remaining video frames
+
+        :return: number of video frames completed
+        """
+        arrival_time = time.perf_counter()
+        rows = self.features.flush()
+        for row in rows:
+            self._emit(row, arrival_time)
+        return len(rows)
+
+    def play(self, audio_object: Audio, block_size: int = 1024, realtime: bool = True) -> LiveReport:
+        """
+        Method to run the renderer on an audio file fed in blocks, e.g. to rehearse a live show or to test a setup
+
+        :param audio_object: Audio object at the renderer's sample rate
+        :param block_size: number of samples per block, as a sound card would deliver them
+        :param realtime: Boolean controlling whether each block is fed when it would have finished playing rather than
+        as fast as possible
+        :return: LiveReport of the run
+        """
+        if audio_object.sample_rate != self.features.sample_rate:
+            raise ValueError(
+                f'audio sample rate {audio_object.sample_rate} does not match the renderer {self.features.sample_rate}'
+            )
+        with self:
+            start_time = time.perf_counter()
+            n_samples = 0
+            for block in audio_object.iter_blocks(block_size):
+                n_samples += len(block)
+                if realtime:
+                    time.sleep(max(0., start_time + n_samples / audio_object.sample_rate - time.perf_counter()))
+                self.feed(block)
+            self.flush()
+        return self.report
+
+    def _emit(self, feature_values: np.ndarray, arrival_time: float):
+        frame_index = self.report.frames
+        self.report.frames += 1
+        deadline_time = arrival_time + self.deadline
+        start_time = time.perf_counter()
+        quality = self._choose_quality(deadline_time - start_time)
+        if quality is None:
+            self.report.frames_dropped += 1
+            return
+        mapping_values = feature_values[self._feature_indices]
+        rng = frame_rng(self.seed, frame_index)
+        if quality == FULL:
+            frame = self.modifier_chain(
+                self.base_image.rgb_image, self.parameter_table.kwargs_from_features(mapping_values), rng,
+                buffers=self._buffers, band_executor=self.band_executor
+            )
+        else:
+            draft_frame = self._draft_chain(
+                self._draft_image, self._draft_table.kwargs_from_features(mapping_values), rng,
+                buffers=self._draft_buffers, band_executor=self.band_executor
+            )
+            frame = cv2.resize(
+                draft_frame, self.size, dst=self._buffers.next_output(), interpolation=cv2.INTER_LINEAR
+            )
+            self.report.frames_degraded += 1
+        if self.temporal_ghosts is not None:
+            frame = self.temporal_ghosts(frame, out=frame)
+        self.sink.write_frame(frame)
+        emit_time = time.perf_counter()
+        expected_seconds = self._expected_seconds[quality]
+        self._expected_seconds[quality] = emit_time - start_time if expected_seconds is None else (
+            (1. - RENDER_TIME_SMOOTHING) * expected_seconds + RENDER_TIME_SMOOTHING * (emit_time - start_time)
+        )
+        self.report.latencies.append(emit_time - arrival_time)
+        if emit_time > deadline_time:
+            self.report.deadline_misses += 1
+
+    def _choose_quality(self, remaining_seconds: float) -> Optional[str]:
+        if remaining_seconds <= 0.:
+            return None
+        qualities = (FULL, DRAFT) if self.degrade else (FULL,)
+        for quality in qualities:
+            expected_seconds = self._expected_seconds[quality]
+            if expected_seconds is None or expected_seconds <= remaining_seconds:
+                return quality
+            # the estimate of a skipped quality decays, so it is tried again once the load drops
+            self._expected_seconds[quality] = expected_seconds * (1. - RENDER_TIME_SMOOTHING)
+        return None
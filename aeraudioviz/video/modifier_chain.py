@@ -0,0 +1,254 @@
+from functools import partial
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from aeraudioviz.image import BlurPyramid, ImageModifiers, lut
+from aeraudioviz.image.image_modifier import _copy_to
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.modifier_mapping import ModifierMapping, function_name
+from aeraudioviz.video.tiling import BandExecutor, band_rule
+
+
+# modifiers that are a single operation on the HSV image between a conversion from and back to RGB
+HSV_KERNELS = {
+    ImageModifiers.apply_hue_multiplication: ImageModifiers._multiply_hue,
+    ImageModifiers.apply_hue_multiplication_to_area: ImageModifiers._multiply_hue_in_area,
+    ImageModifiers.apply_saturation_multiplication: ImageModifiers._multiply_saturation,
+}
+
+# modifiers that map each RGB channel independently
+RGB_CHANNEL_KERNELS = {
+    ImageModifiers.apply_rgb_multiplication: ImageModifiers._multiply_rgb_float,
+    ImageModifiers.apply_red_scaling: partial(ImageModifiers._scale_rgb_channel_float, channel=0),
+    ImageModifiers.apply_green_scaling: partial(ImageModifiers._scale_rgb_channel_float, channel=1),
+    ImageModifiers.apply_blue_scaling: partial(ImageModifiers._scale_rgb_channel_float, channel=2),
+}
+
+BLUR_FUNCTIONS = (ImageModifiers.apply_gaussian_blur, ImageModifiers.apply_median_blur)
+
+SINGLE, HSV, RGB_CHANNELS = 'single', 'hsv', 'rgb_channels'
+
+
+def frame_rng(seed: int, frame_index: int) -> np.random.Generator:
+    """
+    Function to create the random number generator for a single frame. The generator depends only on the render seed
+    and the frame index, so a frame is identical whichever process renders it and in whichever order.
+
+    :param seed: the seed of the render
+    :param frame_index: the index of the frame in the feature time series
+    :return: numpy.random.Generator
+    """
+    return np.random.default_rng([seed, frame_index])
+
+
+class OutAdapter:
+
+    def __init__(self, modifier_function):
+        """
+        Adapts a modifier function without an out argument to the out protocol of the ImageModifiers methods. The
+        function is given out holding a copy of the image, so a function that modifies its input in place never
+        modifies the base image, and its result is copied to out unless it is out.
+
+        :param modifier_function: function of an image and key word arguments returning the modified image
+        """
+        self.modifier_function = modifier_function
+
+    def __call__(self, image: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+        out = image.copy() if out is None else out
+        if out is not image:
+            np.copyto(out, image)
+        result = self.modifier_function(out, **kwargs)
+        if result is not out:
+            np.copyto(out, result)
+        return out
+
+
+class ModifierChain:
+
+    def __init__(
+            self,
+            modifier_mappings: tuple[ModifierMapping],
+            fuse_colour_ops: bool = True,
+            blur_cache_levels: int = 0
+    ):
+        """
+        Compiles a tuple of modifier mappings into the stages applied to each frame. With fuse_colour_ops, runs of
+        consecutive HSV modifiers share one RGB to HSV conversion and one conversion back, and runs of consecutive RGB
+        channel modifiers are evaluated in float32 on the 256 possible channel values and applied to the frame as a
+        single lookup table. This saves colour conversions and avoids the rounding error of converting between each
+        modifier, so fused output can differ slightly from applying the modifiers one at a time.
+
+        :param modifier_mappings: tuple of ModifierMapping objects applied in order
+        :param fuse_colour_ops: Boolean controlling whether consecutive colour modifiers are fused
+        :param blur_cache_levels: when greater than zero and the first modifier is a Gaussian or median blur with a
+        kernel_size range, the base image is blurred at up to this many kernel sizes on the first call and the first
+        modifier becomes a lookup in that BlurPyramid. Calls with a different base image blur it as normal.
+        """
+        self.modifier_mappings = modifier_mappings
+        self.fuse_colour_ops = fuse_colour_ops
+        self.blur_cache_levels = blur_cache_levels
+        self.blur_pyramid = None
+        self.uses_rng = any(mod_mapping.uses_rng for mod_mapping in modifier_mappings)
+        self.stages = []
+        for mapping_index, mod_mapping in enumerate(modifier_mappings):
+            domain, kernel = SINGLE, mod_mapping.modifier_function
+            if fuse_colour_ops and mod_mapping.modifier_function in HSV_KERNELS:
+                domain, kernel = HSV, HSV_KERNELS[mod_mapping.modifier_function]
+            elif fuse_colour_ops and mod_mapping.modifier_function in RGB_CHANNEL_KERNELS:
+                domain, kernel = RGB_CHANNELS, RGB_CHANNEL_KERNELS[mod_mapping.modifier_function]
+            if domain != SINGLE and self.stages and self.stages[-1][0] == domain:
+                self.stages[-1][1].append(mapping_index)
+                self.stages[-1][2].append(kernel)
+            else:
+                self.stages.append((domain, [mapping_index], [kernel]))
+        # a fused stage of one modifier gains nothing, so it is applied as it is
+        self.stages = [
+            (SINGLE, indices, [_out_function(modifier_mappings[indices[0]])]) if len(indices) == 1
+            else (domain, indices, kernels)
+            for domain, indices, kernels in self.stages
+        ]
+        self.band_rules = [
+            band_rule(modifier_mappings[indices[0]]) if domain == SINGLE else None for domain, indices, _ in self.stages
+        ]
+
+    def __call__(
+            self, base_rgb_image: np.ndarray, mapping_kwargs: list[dict], rng: np.random.Generator,
+            stage_seconds: Optional[list] = None, buffers: Optional[FrameBuffers] = None,
+            band_executor: Optional[BandExecutor] = None
+    ) -> np.ndarray:
+        """
+        Method to render a frame from the base image. Each stage reads the output of the previous stage and writes its
+        own output to another array, so the base image is never copied.
+
+        :param base_rgb_image: the RGB base image, which is not modified
+        :param mapping_kwargs: the key word arguments for each modifier mapping for this frame
+        :param rng: random number generator passed to the modifier functions that take an rng argument
+        :param stage_seconds: optional list the time in seconds of each stage is appended to
+        :param buffers: optional FrameBuffers of the base image's shape. The stages then write to its scratch arrays
+        and the frame to its next output array, instead of to new arrays.
+        :param band_executor: optional BandExecutor the stages that can be are run on as horizontal bands in parallel.
+        The frame is identical to one rendered without it.
+        :return: the rendered RGB frame
+        """
+        start_time = time.perf_counter()
+        stages = self.stages
+        first_stage = 0
+        frame = base_rgb_image
+        blur_pyramid = self._get_blur_pyramid(base_rgb_image)
+        if blur_pyramid is not None:
+            stages = stages[1:]
+            first_stage = 1
+            frame = blur_pyramid.lookup(**mapping_kwargs[0], out=_destination(frame, buffers, not stages))
+            if stage_seconds is not None:
+                stage_seconds.append(time.perf_counter() - start_time)
+                start_time = time.perf_counter()
+        elif not stages:
+            frame = _copy_to(frame, buffers.next_output() if buffers is not None else None)
+        for position, (domain, indices, kernels) in enumerate(stages):
+            out = _destination(frame, buffers, position == len(stages) - 1)
+            band_plan = None
+            if band_executor is not None:
+                band_plan = self._band_plan(first_stage + position, frame.shape, mapping_kwargs, rng)
+            if band_plan is not None:
+                halo, band_function = band_plan
+                frame = band_executor.run(band_function, frame, out if out is not None else np.empty_like(frame), halo)
+            elif domain == HSV:
+                frame = _apply_hsv_kernels(kernels, [mapping_kwargs[i] for i in indices], frame, out)
+            elif domain == RGB_CHANNELS:
+                frame = _apply_table(self._rgb_table(indices, kernels, mapping_kwargs), frame, out)
+            else:
+                mapping_index = indices[0]
+                kwargs = mapping_kwargs[mapping_index]
+                if self.modifier_mappings[mapping_index].uses_rng:
+                    kwargs = dict(kwargs, rng=rng)
+                frame = kernels[0](frame, out=out, **kwargs)
+            if stage_seconds is not None:
+                stage_seconds.append(time.perf_counter() - start_time)
+                start_time = time.perf_counter()
+        return frame
+
+    def _band_plan(self, stage_index: int, shape: tuple, mapping_kwargs: list[dict], rng: np.random.Generator):
+        # (halo, band function) of a stage for this frame, or None when the stage modifies the frame whole
+        domain, indices, kernels = self.stages[stage_index]
+        if domain == HSV:
+            # the area of an area modifier depends on the frame height
+            if ImageModifiers._multiply_hue_in_area in kernels:
+                return None
+            apply_hsv_kernels = partial(_apply_hsv_kernels, kernels, [mapping_kwargs[i] for i in indices])
+            return 0, partial(_ignore_first_row, apply_hsv_kernels)
+        if domain == RGB_CHANNELS:
+            apply_table = partial(_apply_table, self._rgb_table(indices, kernels, mapping_kwargs))
+            return 0, partial(_ignore_first_row, apply_table)
+        rule = self.band_rules[stage_index]
+        if rule is None:
+            return None
+        return rule(shape, mapping_kwargs[indices[0]], rng)
+
+    @staticmethod
+    def _rgb_table(indices: list[int], kernels: list, mapping_kwargs: list[dict]) -> np.ndarray:
+        return lut.float_curve_table(
+            [(kernel, mapping_kwargs[mapping_index]) for mapping_index, kernel in zip(indices, kernels)]
+        )
+
+    @property
+    def stage_names(self) -> list[str]:
+        # fused stages are named by the modifiers they apply, joined by '+'
+        return [
+            '+'.join(function_name(self.modifier_mappings[i].modifier_function) for i in indices)
+            for _, indices, _ in self.stages
+        ]
+
+    def __getstate__(self):
+        # the blur pyramid is rebuilt from the base image in the process that uses the chain
+        state = self.__dict__.copy()
+        state['blur_pyramid'] = None
+        return state
+
+    def _get_blur_pyramid(self, base_rgb_image: np.ndarray):
+        if self.blur_cache_levels <= 0 or not self.modifier_mappings:
+            return None
+        first_mapping = self.modifier_mappings[0]
+        if first_mapping.modifier_function not in BLUR_FUNCTIONS or 'kernel_size' not in first_mapping.kwarg_ranges:
+            return None
+        if self.blur_pyramid is None:
+            self.blur_pyramid = BlurPyramid(
+                base_rgb_image, first_mapping.modifier_function, *first_mapping.kwarg_ranges['kernel_size'],
+                max_levels=self.blur_cache_levels
+            )
+        if self.blur_pyramid.image is not base_rgb_image:
+            return None
+        return self.blur_pyramid
+
+
+def _apply_hsv_kernels(kernels: list, kernel_kwargs: list[dict], image: np.ndarray,
+                       out: Optional[np.ndarray]) -> np.ndarray:
+    # one conversion to HSV, the kernels in place and one conversion back
+    hsv_image = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=out)
+    for kernel, kwargs in zip(kernels, kernel_kwargs):
+        hsv_image = kernel(hsv_image, **kwargs)
+    return cv2.cvtColor(hsv_image, cv2.COLOR_HSV2RGB, dst=hsv_image)
+
+
+def _apply_table(table: np.ndarray, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    return cv2.LUT(image, table, dst=out)
+
+
+def _ignore_first_row(function, image: np.ndarray, out: np.ndarray, first_row: int):
+    # adapts a point operation of (image, out) to the band function signature of BandExecutor.run
+    function(image, out)
+
+
+def _out_function(mod_mapping: ModifierMapping):
+    if mod_mapping.writes_out:
+        return mod_mapping.modifier_function
+    return OutAdapter(mod_mapping.modifier_function)
+
+
+def _destination(image: np.ndarray, buffers: Optional[FrameBuffers], last: bool) -> np.ndarray:
+    # the array a stage reading image writes to: the next output array for the last stage, otherwise a scratch array
+    if buffers is None:
+        return np.empty_like(image)
+    return buffers.next_output() if last else buffers.next_scratch(image)
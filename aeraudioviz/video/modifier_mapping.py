@@ -1,14 +1,25 @@
-from typing import Union
+import inspect
+from typing import Optional, Union
 
 
 class ModifierMapping:
 
-    def __init__(self, modifier_function, modifier_column: str,
+    def __init__(self, modifier_function, modifier_column: str, *,
+                 quantisation_steps: Optional[dict[str, Union[float, int]]] = None,
+                 band_halo: Optional[int] = None,
                  **kwarg_ranges: tuple[Union[float, int], Union[float, int]]):
         """
 
-        :param modifier_function: a method from the ImageModifiers class
+        :param modifier_function: a method from the ImageModifiers class, or a function of an RGB image and key word
+        arguments returning the modified image. Functions with an out argument write their result to it, as the
+        ImageModifiers methods do. Other functions are given a copy of the image they may modify, see OutAdapter.
         :param modifier_column: the column in the feature DataFrame that will control the image modificaitons
+        :param quantisation_steps: optional resolution of the key word argument values, e.g. {'kernel_size': 2}.
+        Values are rounded to a multiple of their step, so frames whose values round the same are identical and can be
+        reused by the VideoGenerator frame cache.
+        :param band_halo: optional number of rows above and below a pixel its output depends on, declaring that a
+        modifier_function with an out argument and without an rng argument can be applied to horizontal bands of a
+        frame, see BandExecutor. The ImageModifiers methods that can be are known without it.
         :param kwarg_ranges: Key ward arguments.
         Key is the key word argument for the modifier_function that the feature data will control value of.
         Value is a tuple containing min and max range of the key word argument value to pass to modifier_function.
@@ -16,3 +27,30 @@ class ModifierMapping:
         self.modifier_function = modifier_function
         self.modifier_column = modifier_column
         self.kwarg_ranges = kwarg_ranges
+        self.quantisation_steps = quantisation_steps if quantisation_steps is not None else {}
+        unknown_kwargs = set(self.quantisation_steps) - set(self.kwarg_ranges)
+        if unknown_kwargs:
+            raise ValueError(f'quantisation_steps given for key word arguments without a range: {unknown_kwargs}')
+        self.uses_rng = _accepts_kwarg(modifier_function, 'rng')
+        self.writes_out = _accepts_kwarg(modifier_function, 'out')
+        if band_halo is not None and (self.uses_rng or not self.writes_out):
+            raise ValueError('band_halo is only supported for modifier functions with an out and no rng argument')
+        self.band_halo = band_halo
+
+
+def function_name(function) -> str:
+    """
+    Function to get the name of a modifier function, as used to label parameter table columns and render stages
+
+    :param function: the modifier function, a functools.partial of one or a callable object
+    :return: the name of the function, or of the class of a callable object
+    """
+    function = getattr(function, 'func', function)
+    return getattr(function, '__name__', type(function).__name__)
+
+
+def _accepts_kwarg(function, kwarg: str) -> bool:
+    try:
+        return kwarg in inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
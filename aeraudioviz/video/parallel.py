@@ -0,0 +1,172 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Hashable, Iterable, Iterator, Optional
+
+import numpy as np
+
+from aeraudioviz.image import BaseFrames
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.frame_cache import FrameCache
+from aeraudioviz.video.modifier_chain import ModifierChain, frame_rng
+
+
+_worker_state = {}
+
+
+class ParallelFrameRenderer:
+
+    def __init__(
+            self,
+            base_rgb_image: np.ndarray,
+            modifier_chain: ModifierChain,
+            seed: int,
+            workers: int,
+            max_pending: Optional[int] = None,
+            on_stage_seconds: Optional[Callable[[list], None]] = None,
+            base_frames: Optional[BaseFrames] = None
+    ):
+        """
+        Renders frames in a pool of worker processes. The base image is placed in shared memory once instead of being
+        pickled for every frame. The modifier functions of the chain must be picklable, e.g. ImageModifiers methods or
+        functions defined at module level.
+
+        :param base_rgb_image: the RGB base image
+        :param modifier_chain: the ModifierChain applied to each frame
+        :param seed: the seed of the render, combined with the frame index to seed each frame
+        :param workers: number of worker processes
+        :param max_pending: maximum number of frames submitted but not yet returned. Defaults to twice the number of
+        workers, which keeps the workers busy while bounding memory use
+        :param on_stage_seconds: optional function called with the stage timings of each frame, see ModifierChain, in
+        the thread that completes the frame's Future
+        :param base_frames: optional BaseFrames of an animated base, which each worker renders its frames from instead
+        of base_rgb_image
+        """
+        self.base_rgb_image = base_rgb_image
+        self.modifier_chain = modifier_chain
+        self.seed = seed
+        self.workers = workers
+        self.max_pending = max_pending if max_pending is not None else 2 * workers
+        self.on_stage_seconds = on_stage_seconds
+        self.base_frames = base_frames
+        self._shared_memory = None
+        self._executor = None
+
+    def __enter__(self):
+        self._shared_memory = SharedMemory(create=True, size=self.base_rgb_image.nbytes)
+        shared_image = np.ndarray(self.base_rgb_image.shape, self.base_rgb_image.dtype, buffer=self._shared_memory.buf)
+        shared_image[:] = self.base_rgb_image
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(
+                self._shared_memory.name, self.base_rgb_image.shape, self.base_rgb_image.dtype.str,
+                self.modifier_chain, self.seed, self.base_frames
+            )
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(cancel_futures=True)
+        self._shared_memory.close()
+        self._shared_memory.unlink()
+
+    def submit(self, frame_index: int, mapping_kwargs: list[dict]) -> Future:
+        """
+        Method to render a frame in the worker pool
+
+        :param frame_index: the index of the frame
+        :param mapping_kwargs: the key word arguments for each modifier mapping for this frame
+        :return: concurrent.futures.Future of the rendered frame
+        """
+        if self.on_stage_seconds is None:
+            return self._executor.submit(_render_in_worker, frame_index, mapping_kwargs)
+        return _unpack_timed_frame(
+            self._executor.submit(_render_in_worker, frame_index, mapping_kwargs, True), self.on_stage_seconds
+        )
+
+
+def render_in_order(
+        frame_tasks: Iterable[tuple[int, list[dict], Hashable]],
+        submit: Callable[[int, list[dict]], Future],
+        max_pending: int = 1,
+        frame_cache: Optional[FrameCache] = None
+) -> Iterator[np.ndarray]:
+    """
+    Generator yielding rendered frames in order while up to max_pending frames are being rendered. When a frame cache
+    is given, a frame whose key is cached or already being rendered is reused instead of rendered again.
+
+    :param frame_tasks: iterable of (frame index, key word arguments for each modifier mapping, frame key)
+    :param submit: function starting the render of a frame and returning a Future of it
+    :param max_pending: maximum number of frames submitted but not yet yielded
+    :param frame_cache: optional FrameCache
+    :return: iterator of rendered frames in the order of frame_tasks
+    """
+    pending = deque()
+    in_flight = {}
+    for frame_index, mapping_kwargs, key in frame_tasks:
+        if len(pending) >= max_pending:
+            yield _resolve(*pending.popleft(), in_flight, frame_cache)
+        if frame_cache is not None:
+            frame = frame_cache.get(key)
+            if frame is None:
+                frame = in_flight.get(key)
+            if frame is not None:
+                frame_cache.hits += 1
+                pending.append((key, frame))
+                continue
+            frame_cache.misses += 1
+        future = submit(frame_index, mapping_kwargs)
+        if frame_cache is not None:
+            in_flight[key] = future
+        pending.append((key, future))
+    while pending:
+        yield _resolve(*pending.popleft(), in_flight, frame_cache)
+
+
+def _resolve(key, frame, in_flight, frame_cache):
+    if isinstance(frame, Future):
+        frame = frame.result()
+        if frame_cache is not None:
+            frame = frame_cache.put(key, frame)
+            in_flight.pop(key, None)
+    return frame
+
+
+def _init_worker(shared_memory_name, shape, dtype, modifier_chain, seed, base_frames=None):
+    shared_memory = SharedMemory(name=shared_memory_name)
+    _worker_state['shared_memory'] = shared_memory
+    _worker_state['base_rgb_image'] = np.ndarray(shape, np.dtype(dtype), buffer=shared_memory.buf)
+    _worker_state['modifier_chain'] = modifier_chain
+    _worker_state['seed'] = seed
+    _worker_state['base_frames'] = base_frames
+    # frames are pickled back to the main process, so only the scratch arrays are reused
+    _worker_state['buffers'] = FrameBuffers(shape, n_outputs=0, dtype=dtype)
+
+
+def _render_in_worker(frame_index, mapping_kwargs, timed=False):
+    stage_seconds = [] if timed else None
+    base_frames = _worker_state['base_frames']
+    base_rgb_image = base_frames(frame_index) if base_frames is not None else _worker_state['base_rgb_image']
+    frame = _worker_state['modifier_chain'](
+        base_rgb_image, mapping_kwargs, frame_rng(_worker_state['seed'], frame_index),
+        stage_seconds=stage_seconds, buffers=_worker_state['buffers']
+    )
+    return (frame, stage_seconds) if timed else frame
+
+
+def _unpack_timed_frame(timed_future: Future, on_stage_seconds: Callable[[list], None]) -> Future:
+    # the worker returns the frame with its stage timings, the Future returned resolves to the frame alone
+    future = Future()
+
+    def unpack(done_future):
+        try:
+            frame, stage_seconds = done_future.result()
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        on_stage_seconds(stage_seconds)
+        future.set_result(frame)
+
+    timed_future.add_done_callback(unpack)
+    return future
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from aeraudioviz.video.modifier_mapping import ModifierMapping, function_name
+
+
+class ParameterTable:
+
+    def __init__(self, feature_time_series: pd.DataFrame, modifier_mappings: tuple[ModifierMapping]):
+        """
+        The key word argument values passed to every modifier function for every frame, computed in one pass.
+        Column j of values holds the argument columns[j] = (mapping index, key word argument) scaled from the
+        mapping's modifier_column into its (min, max) range and rounded to the mapping's quantisation step, if any.
+
+        :param feature_time_series: pandas.DataFrame with one row per frame
+        :param modifier_mappings: tuple of ModifierMapping objects
+        """
+        self.index = feature_time_series.index
+        self.modifier_mappings = modifier_mappings
+        self.columns = [
+            (mapping_index, arg)
+            for mapping_index, mod_mapping in enumerate(modifier_mappings)
+            for arg in mod_mapping.kwarg_ranges.keys()
+        ]
+        self._column_mapping_indices = np.array([mapping_index for mapping_index, _ in self.columns], dtype=int)
+        self._lows = np.array(
+            [modifier_mappings[i].kwarg_ranges[arg][0] for i, arg in self.columns], dtype=np.float64
+        )
+        self._highs = np.array(
+            [modifier_mappings[i].kwarg_ranges[arg][1] for i, arg in self.columns], dtype=np.float64
+        )
+        self._steps = np.array(
+            [modifier_mappings[i].quantisation_steps.get(arg, 0.) for i, arg in self.columns], dtype=np.float64
+        )
+        feature_values = feature_time_series[
+            [mod_mapping.modifier_column for mod_mapping in modifier_mappings]
+        ].to_numpy(dtype=np.float64)
+        self.values = self._scale(feature_values)
+        self._mapping_slices = []
+        start = 0
+        for mod_mapping in modifier_mappings:
+            stop = start + len(mod_mapping.kwarg_ranges)
+            self._mapping_slices.append((tuple(mod_mapping.kwarg_ranges.keys()), start, stop))
+            start = stop
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def frame_kwargs(self, frame_index: int) -> list[dict]:
+        """
+        Method to get the key word arguments for each modifier mapping for one frame
+
+        :param frame_index: the index of the frame
+        :return: list with a dictionary of key word arguments per modifier mapping
+        """
+        return self._row_kwargs(self.values[frame_index])
+
+    def kwargs_from_features(self, feature_values: np.ndarray) -> list[dict]:
+        """
+        Method to get the key word arguments for each modifier mapping for feature values that are not in the table,
+        e.g. those of a live render
+
+        :param feature_values: the value of the modifier_column of each modifier mapping, in mapping order
+        :return: list with a dictionary of key word arguments per modifier mapping
+        """
+        return self._row_kwargs(self._scale(np.asarray(feature_values, dtype=np.float64).reshape(1, -1))[0])
+
+    def _scale(self, feature_values: np.ndarray) -> np.ndarray:
+        # scales each mapping's feature value into the ranges of its key word arguments and quantises them
+        values = np.ascontiguousarray(
+            self._lows + (self._highs - self._lows) * feature_values[:, self._column_mapping_indices]
+        ).reshape(len(feature_values), len(self.columns))
+        quantised = self._steps > 0
+        if quantised.any():
+            steps = self._steps[quantised]
+            values[:, quantised] = np.round(values[:, quantised] / steps) * steps
+        return values
+
+    def _row_kwargs(self, row: np.ndarray) -> list[dict]:
+        row = row.tolist()
+        return [dict(zip(args, row[start:stop])) for args, start, stop in self._mapping_slices]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Method to get the parameter table as a DataFrame for inspection, plotting or saving
+
+        :return: pandas.DataFrame with the feature time series index and a (mapping, modifier, kwarg) column
+        MultiIndex
+        """
+        columns = pd.MultiIndex.from_tuples(
+            [
+                (mapping_index, function_name(self.modifier_mappings[mapping_index].modifier_function), arg)
+                for mapping_index, arg in self.columns
+            ],
+            names=['mapping', 'modifier', 'kwarg']
+        )
+        return pd.DataFrame(self.values, index=self.index, columns=columns)
@@ -0,0 +1,142 @@
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # the resource module is only available on Unix, peak memory is not reported elsewhere
+    resource = None
+
+
+class RenderProfiler:
+
+    def __init__(
+            self,
+            stage_names: list[str],
+            on_metrics: Optional[Callable[[dict], None]] = None,
+            metrics_interval: float = 1.
+    ):
+        """
+        Collects the timings of a render: the time of each ModifierChain stage for every rendered frame, the time the
+        main process waits for rendered frames and for space in the encoder queue, and the depth of the encoder queue.
+
+        :param stage_names: names of the ModifierChain stages, see ModifierChain.stage_names
+        :param on_metrics: optional function called with a dict of live metrics, see metrics, at most every
+        metrics_interval seconds during the render
+        :param metrics_interval: minimum number of seconds between calls of on_metrics
+        """
+        self.stage_names = stage_names
+        self.on_metrics = on_metrics
+        self.metrics_interval = metrics_interval
+        self.frames = 0
+        self.render_wait_seconds = 0.
+        self.encode_wait_seconds = 0.
+        self._stage_seconds = []
+        self._queue_depths = []
+        self._lock = threading.Lock()
+        self._start_time = time.perf_counter()
+        self._last_metrics_time = self._start_time
+
+    def add_stage_seconds(self, stage_seconds: list[float]):
+        """
+        Method to record the stage timings of a rendered frame. Thread safe, so it can be called from Future callbacks.
+
+        :param stage_seconds: seconds spent in each stage
+        :return:
+        """
+        with self._lock:
+            self._stage_seconds.append(stage_seconds)
+
+    def frame_done(
+            self, render_wait_seconds: float, encode_wait_seconds: float = 0., queue_depth: Optional[int] = None
+    ):
+        """
+        Method to record a frame passed to the encoder
+
+        :param render_wait_seconds: seconds spent waiting for the frame to be rendered
+        :param encode_wait_seconds: seconds spent waiting for space in the encoder queue
+        :param queue_depth: number of frames in the encoder queue after the frame was added
+        :return:
+        """
+        self.frames += 1
+        self.render_wait_seconds += render_wait_seconds
+        self.encode_wait_seconds += encode_wait_seconds
+        if queue_depth is not None:
+            self._queue_depths.append(queue_depth)
+        if self.on_metrics is not None and time.perf_counter() - self._last_metrics_time >= self.metrics_interval:
+            self._last_metrics_time = time.perf_counter()
+            self.on_metrics(self.metrics())
+
+    def metrics(self) -> dict:
+        """
+        Method to get a snapshot of the render so far
+
+        :return: dict of frames done, elapsed seconds, frames per second, current queue depth and the mean seconds of
+        each stage
+        """
+        elapsed_seconds = time.perf_counter() - self._start_time
+        stage_seconds = self._stage_array()
+        return {
+            'frames': self.frames,
+            'elapsed_seconds': elapsed_seconds,
+            'frames_per_second': self.frames / elapsed_seconds if elapsed_seconds else 0.,
+            'queue_depth': self._queue_depths[-1] if self._queue_depths else None,
+            'stage_mean_seconds': dict(zip(self.stage_names, stage_seconds.mean(axis=0).tolist()))
+            if len(stage_seconds) else {},
+        }
+
+    def stage_timings(self) -> list[dict]:
+        """
+        Method to summarise the stage timings over the rendered frames
+
+        :return: list with, per stage and for the whole chain, a dict of the mean, 95th percentile and max seconds per
+        frame and the share of the chain time
+        """
+        stage_seconds = self._stage_array()
+        if not len(stage_seconds):
+            return []
+        total_seconds = stage_seconds.sum()
+        columns = [(name, stage_seconds[:, i]) for i, name in enumerate(self.stage_names)]
+        columns.append(('total', stage_seconds.sum(axis=1)))
+        return [
+            {
+                'stage': name,
+                'mean_seconds': float(seconds.mean()),
+                'p95_seconds': float(np.percentile(seconds, 95)),
+                'max_seconds': float(seconds.max()),
+                'share': float(seconds.sum() / total_seconds) if total_seconds else 0.,
+                'frames': len(seconds),
+            }
+            for name, seconds in columns
+        ]
+
+    def _stage_array(self) -> np.ndarray:
+        # one row per frame and one column per stage, with no rows for a chain without stages
+        if not self.stage_names:
+            return np.empty((0, 0))
+        with self._lock:
+            return np.array(self._stage_seconds, dtype=np.float64).reshape(-1, len(self.stage_names))
+
+    def queue_depth(self) -> dict:
+        if not self._queue_depths:
+            return {'mean': None, 'max': None}
+        return {'mean': float(np.mean(self._queue_depths)), 'max': int(np.max(self._queue_depths))}
+
+
+def peak_memory_bytes(children: bool = False) -> Optional[int]:
+    """
+    Function to get the peak resident memory of this process or of its finished child processes, i.e. render workers
+    and ffmpeg
+
+    :param children: Boolean controlling whether the peak of the child processes is returned instead
+    :return: bytes, or None where the resource module is not available
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
@@ -0,0 +1,127 @@
+import json
+
+import numpy as np
+
+
+class RenderReport:
+
+    def __init__(self):
+        """
+        Summary of a call to VideoGenerator.generate. stage_timings holds, per ModifierChain stage and for the whole
+        chain, the mean, 95th percentile and max seconds per rendered frame. render_wait_seconds and
+        encode_wait_seconds are the time the main process spent waiting for rendered frames and for space in the
+        encoder queue, so the larger of the two shows whether the render is bound on rendering or on encoding.
+        """
+        self.output_path = None
+        self.frames = 0
+        self.render_seconds = 0.
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.segments_rendered = 0
+        self.segments_reused = 0
+        self.stage_timings = []
+        self.render_wait_seconds = 0.
+        self.encode_wait_seconds = 0.
+        self.frames_encoded = 0
+        self.encode_seconds = 0.
+        self.mean_queue_depth = None
+        self.max_queue_depth = None
+        self.peak_memory_bytes = None
+        self.peak_child_memory_bytes = None
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.render_seconds if self.render_seconds else 0.
+
+    @property
+    def cache_hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.
+
+    @property
+    def encoder_frames_per_second(self) -> float:
+        return self.frames_encoded / self.encode_seconds if self.encode_seconds else 0.
+
+    @property
+    def bottleneck(self) -> str:
+        return 'encoding' if self.encode_wait_seconds > self.render_wait_seconds else 'rendering'
+
+    def to_dict(self) -> dict:
+        return {
+            'output_path': self.output_path,
+            'frames': self.frames,
+            'render_seconds': self.render_seconds,
+            'frames_per_second': self.frames_per_second,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': self.cache_hit_rate,
+            'segments_rendered': self.segments_rendered,
+            'segments_reused': self.segments_reused,
+            'stage_timings': self.stage_timings,
+            'render_wait_seconds': self.render_wait_seconds,
+            'encode_wait_seconds': self.encode_wait_seconds,
+            'bottleneck': self.bottleneck,
+            'frames_encoded': self.frames_encoded,
+            'encode_seconds': self.encode_seconds,
+            'encoder_frames_per_second': self.encoder_frames_per_second,
+            'mean_queue_depth': self.mean_queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'peak_child_memory_bytes': self.peak_child_memory_bytes,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class LiveReport:
+
+    def __init__(self, deadline_seconds: float = 0., analysis_latency_seconds: float = 0.):
+        """
+        Summary of a LiveRenderer run. The latency of a frame is the time from the arrival of the audio block that
+        completed it to its emission to the sink. The audio analysis adds analysis_latency_seconds, half an analysis
+        frame, on top of that, and a frame is only complete at the end of its frame period.
+
+        :param deadline_seconds: the per frame deadline of the render
+        :param analysis_latency_seconds: the latency of the audio analysis
+        """
+        self.deadline_seconds = deadline_seconds
+        self.analysis_latency_seconds = analysis_latency_seconds
+        self.frames = 0
+        self.frames_degraded = 0
+        self.frames_dropped = 0
+        self.deadline_misses = 0
+        self.latencies = []
+
+    @property
+    def frames_emitted(self) -> int:
+        return self.frames - self.frames_dropped
+
+    @property
+    def mean_latency_seconds(self) -> float:
+        return float(np.mean(self.latencies)) if self.latencies else 0.
+
+    @property
+    def p95_latency_seconds(self) -> float:
+        return float(np.percentile(self.latencies, 95)) if self.latencies else 0.
+
+    @property
+    def max_latency_seconds(self) -> float:
+        return float(np.max(self.latencies)) if self.latencies else 0.
+
+    def to_dict(self) -> dict:
+        return {
+            'deadline_seconds': self.deadline_seconds,
+            'analysis_latency_seconds': self.analysis_latency_seconds,
+            'frames': self.frames,
+            'frames_emitted': self.frames_emitted,
+            'frames_degraded': self.frames_degraded,
+            'frames_dropped': self.frames_dropped,
+            'deadline_misses': self.deadline_misses,
+            'mean_latency_seconds': self.mean_latency_seconds,
+            'p95_latency_seconds': self.p95_latency_seconds,
+            'max_latency_seconds': self.max_latency_seconds,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
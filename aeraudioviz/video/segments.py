@@ -0,0 +1,165 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import inspect
+import os
+from pathlib import Path
+import tempfile
+from typing import Optional, Union
+
+import numpy as np
+
+from aeraudioviz.image import BaseFrames
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.modifier_chain import ModifierChain, frame_rng
+from aeraudioviz.video.temporal_ghosts import TemporalGhosts
+from aeraudioviz.video.writer import StreamingVideoWriter
+
+
+_worker_state = {}
+
+
+class SegmentCache:
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Directory of encoded video segments named by the hash of everything that determines their frames, see
+        segment_key. A segment is only rendered again when its hash changes. The hash covers the parameters of the
+        render, not the code of the modifier functions, so clear the cache after changing a modifier function.
+
+        :param directory: directory holding the segments, created if it does not exist
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.directory / f'{key}.mp4'
+
+    def __contains__(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def temporary_path(self) -> str:
+        # segments are encoded to a temporary file and renamed into place, so an interrupted render leaves no entry
+        handle, path = tempfile.mkstemp(suffix='.mp4', dir=self.directory)
+        os.close(handle)
+        return path
+
+    def clear(self):
+        for path in self.directory.glob('*.mp4'):
+            path.unlink(missing_ok=True)
+
+
+def segment_key(*parts) -> str:
+    """
+    Function to hash the description of a segment. Arrays are hashed by dtype, shape and contents, functions by
+    qualified name, functools.partial objects by function and arguments, and other objects by class and public
+    attributes.
+
+    :param parts: the values that determine the frames of the segment
+    :return: hex digest
+    """
+    digest = hashlib.sha256()
+    _update_digest(digest, parts)
+    return digest.hexdigest()
+
+
+def render_segment(
+        base_rgb_image: np.ndarray,
+        modifier_chain: ModifierChain,
+        seed: int,
+        frame_indices: range,
+        mapping_kwargs: list[list[dict]],
+        n_warm_up_frames: int,
+        temporal_ghosts: Optional[TemporalGhosts],
+        output_path: str,
+        writer_kwargs: dict,
+        base_frames: Optional[BaseFrames] = None
+) -> str:
+    """
+    Function to render and encode a segment of a video
+
+    :param base_rgb_image: the RGB base image
+    :param modifier_chain: the ModifierChain applied to each frame
+    :param seed: the seed of the render
+    :param frame_indices: the video frame indices of the segment, preceded by n_warm_up_frames frames
+    :param mapping_kwargs: the key word arguments of each modifier mapping for each frame in frame_indices
+    :param n_warm_up_frames: number of frames rendered only to fill the temporal ghosts ring buffer
+    :param temporal_ghosts: optional TemporalGhosts settings, a new ring buffer is used for the segment
+    :param output_path: path of the video file to write
+    :param writer_kwargs: size, fps, codec and preset for the StreamingVideoWriter
+    :param base_frames: optional BaseFrames of an animated base the frames are rendered from instead of base_rgb_image
+    :return: output_path
+    """
+    if temporal_ghosts is not None:
+        temporal_ghosts = TemporalGhosts(temporal_ghosts.number_of_frames, temporal_ghosts.alpha, temporal_ghosts.decay)
+    with StreamingVideoWriter(output_path, **writer_kwargs) as writer:
+        buffers = FrameBuffers(base_rgb_image.shape, n_outputs=writer.queue_size + 2)
+        for position, (frame_index, frame_kwargs) in enumerate(zip(frame_indices, mapping_kwargs)):
+            base = base_frames(frame_index) if base_frames is not None else base_rgb_image
+            frame = modifier_chain(base, frame_kwargs, frame_rng(seed, frame_index), buffers=buffers)
+            if temporal_ghosts is not None:
+                frame = temporal_ghosts(frame, out=frame)
+            if position >= n_warm_up_frames:
+                writer.write_frame(frame)
+    return output_path
+
+
+def segment_executor(base_rgb_image: np.ndarray, modifier_chain: ModifierChain, seed: int, workers: int):
+    """
+    Function to create a pool of processes that each render and encode whole segments, see submit_segment
+
+    :param base_rgb_image: the RGB base image, sent to each process once
+    :param modifier_chain: the ModifierChain applied to each frame
+    :param seed: the seed of the render
+    :param workers: number of processes
+    :return: ProcessPoolExecutor object
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(base_rgb_image, modifier_chain, seed)
+    )
+
+
+def submit_segment(executor: ProcessPoolExecutor, *args):
+    """
+    Function to render a segment in a segment_executor process, taking the arguments of render_segment after seed
+
+    :return: Future of the output path
+    """
+    return executor.submit(_render_segment_in_worker, *args)
+
+
+def _init_worker(base_rgb_image: np.ndarray, modifier_chain: ModifierChain, seed: int):
+    _worker_state['base_rgb_image'] = base_rgb_image
+    _worker_state['modifier_chain'] = modifier_chain
+    _worker_state['seed'] = seed
+
+
+def _render_segment_in_worker(*args) -> str:
+    return render_segment(
+        _worker_state['base_rgb_image'], _worker_state['modifier_chain'], _worker_state['seed'], *args
+    )
+
+
+def _update_digest(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update(f'ndarray{value.dtype.str}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict{len(value)}'.encode())
+        for key in sorted(value, key=repr):
+            _update_digest(digest, key)
+            _update_digest(digest, value[key])
+    elif isinstance(value, functools.partial):
+        digest.update(b'partial')
+        _update_digest(digest, (value.func, value.args, value.keywords))
+    elif inspect.isroutine(value) or inspect.isclass(value):
+        digest.update(f'{value.__module__}.{value.__qualname__}'.encode())
+    elif value is None or isinstance(value, (bool, int, float, str, bytes, range, np.generic)):
+        digest.update(repr(value).encode())
+    else:
+        digest.update(f'{type(value).__module__}.{type(value).__qualname__}'.encode())
+        _update_digest(digest, {key: item for key, item in vars(value).items() if not key.startswith('_')})
@@ -0,0 +1,121 @@
+import abc
+import subprocess
+from typing import BinaryIO, Callable, Optional
+
+import numpy as np
+
+from aeraudioviz.video.writer import StreamingVideoWriter
+
+
+class FrameSink(abc.ABC):
+
+    # number of frames the sink may still read after write_frame returns, so a renderer reusing frame arrays must not
+    # overwrite a frame until that many further frames have been written
+    frames_held = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def write_frame(self, frame: np.ndarray):
+        """
+        Method to emit a frame
+
+        :param frame: RGB uint8 array of shape (height, width, 3)
+        :return:
+        """
+
+    def close(self):
+        pass
+
+
+class CallbackSink(FrameSink):
+
+    def __init__(self, callback: Callable[[np.ndarray], None]):
+        """
+        Passes each frame to a function, e.g. one showing it in a window. The frame array is reused for a later frame,
+        so the function must copy it to keep it.
+
+        :param callback: function called with each RGB uint8 frame
+        """
+        self.callback = callback
+
+    def write_frame(self, frame: np.ndarray):
+        self.callback(frame)
+
+
+class PipeSink(FrameSink):
+
+    def __init__(self, stream: Optional[BinaryIO] = None, command: Optional[list[str]] = None):
+        """
+        Writes each frame as raw rgb24 bytes to a binary stream, or to the standard input of a command started when
+        the sink is opened, e.g. ['ffplay', '-f', 'rawvideo', '-pixel_format', 'rgb24', '-video_size', '640x360',
+        '-framerate', '24', '-i', '-'].
+
+        :param stream: binary stream to write to, such as sys.stdout.buffer or a named pipe opened for writing
+        :param command: command to start and write to instead of stream
+        """
+        if (stream is None) == (command is None):
+            raise ValueError('give exactly one of stream and command')
+        self.stream = stream
+        self.command = command
+        self._process = None
+
+    def open(self):
+        if self.command is not None:
+            self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE)
+            self.stream = self._process.stdin
+
+    def write_frame(self, frame: np.ndarray):
+        self.stream.write(np.ascontiguousarray(frame).data)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.flush()
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+            self.stream = None
+
+
+class FileSink(FrameSink):
+
+    def __init__(
+            self,
+            output_path: str,
+            size: tuple[int, int],
+            fps: float,
+            codec: str = 'libx264',
+            preset: str = 'ultrafast',
+            queue_size: int = 8
+    ):
+        """
+        Encodes the frames to a video file with a StreamingVideoWriter
+
+        :param output_path: path of the video file to write
+        :param size: (width, height) of the frames in pixels
+        :param fps: frame rate of the output video
+        :param codec: ffmpeg video codec
+        :param preset: ffmpeg encoding preset
+        :param queue_size: maximum number of frames waiting to be encoded
+        """
+        self.writer = StreamingVideoWriter(output_path, size, fps, codec=codec, preset=preset, queue_size=queue_size)
+        # the frames in the queue and the frame being encoded
+        self.frames_held = queue_size + 1
+
+    def open(self):
+        self.writer.open()
+
+    def write_frame(self, frame: np.ndarray):
+        self.writer.write_frame(frame)
+
+    def close(self):
+        self.writer.close()
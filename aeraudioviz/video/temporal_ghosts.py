@@ -0,0 +1,65 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from aeraudioviz.image.ghosts import to_uint8
+
+
+class TemporalGhosts:
+
+    def __init__(self, number_of_frames: int = 3, alpha: float = .3, decay: float = .5):
+        """
+        Ghosts of the previously rendered frames blended onto each frame. The last number_of_frames rendered frames
+        are kept in a preallocated ring buffer and frame t - i is added with weight alpha * decay ** (i - 1), then the
+        blend is saturated once. The ghosts are made of the rendered frames, not of earlier blends.
+
+        :param number_of_frames: number of previous frames to blend
+        :param alpha: weight of the previous frame
+        :param decay: factor applied to the weight of each older frame
+        """
+        self.number_of_frames = number_of_frames
+        self.alpha = alpha
+        self.decay = decay
+        self._frames: Optional[np.ndarray] = None
+        self._accumulator: Optional[np.ndarray] = None
+        self._n_stored = 0
+        self._position = 0
+
+    def reset(self):
+        self._n_stored = 0
+        self._position = 0
+
+    def __call__(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Method to blend the ghosts of the previous frames onto a frame and add the frame to the ring buffer
+
+        :param frame: the next rendered uint8 frame
+        :param out: optional uint8 array the blend is written to, which may be frame itself
+        :return: out, or when out is None a new uint8 frame, or frame if there is nothing to blend
+        """
+        if self.number_of_frames > 0 and (self._frames is None or self._frames.shape[1:] != frame.shape):
+            self._frames = np.empty((self.number_of_frames, *frame.shape), dtype=np.uint8)
+            self._accumulator = np.empty(frame.shape, dtype=np.float32)
+            self.reset()
+        if self.number_of_frames <= 0 or not self._n_stored:
+            if self.number_of_frames > 0:
+                self._store(frame)
+            if out is None or out is frame:
+                return frame
+            np.copyto(out, frame)
+            return out
+        accumulator = self._accumulator
+        accumulator[...] = frame
+        for age in range(1, self._n_stored + 1):
+            weight = self.alpha * self.decay ** (age - 1)
+            previous = self._frames[(self._position - age) % self.number_of_frames]
+            cv2.addWeighted(accumulator, 1., previous, weight, 0., dst=accumulator, dtype=cv2.CV_32F)
+        # the frame is stored before out is written, as out may be the frame
+        self._store(frame)
+        return to_uint8(accumulator, out)
+
+    def _store(self, frame: np.ndarray):
+        self._frames[self._position] = frame
+        self._position = (self._position + 1) % self.number_of_frames
+        self._n_stored = min(self._n_stored + 1, self.number_of_frames)
@@ -0,0 +1,242 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import inspect
+import os
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from aeraudioviz.image import ImageModifiers
+from aeraudioviz.image.ghosts import add_shifted_copies
+from aeraudioviz.image.image_modifier import _copy_to, _get_rng, _round_to_nearest_odd_int
+from aeraudioviz.image.noise import random_line_spans
+from aeraudioviz.video.modifier_mapping import ModifierMapping
+
+
+class BandExecutor:
+
+    def __init__(self, threads: Optional[int] = None, min_band_rows: int = 64):
+        """
+        Thread pool a ModifierChain renders a frame on as horizontal bands, one per thread, for a lower latency per
+        frame when frames are not rendered in parallel, e.g. in a live render. OpenCV and NumPy release the GIL for
+        most of the work of a band. A stage whose output rows depend on neighbouring rows, such as a blur, reads each
+        band with halo rows above and below it. The thread pool and the scratch arrays of the bands are created on
+        first use and are not pickled.
+
+        :param threads: number of threads, defaults to the number of CPUs
+        :param min_band_rows: minimum number of rows per band, so small frames are split into fewer bands
+        """
+        self.threads = threads if threads is not None else os.cpu_count()
+        self.min_band_rows = min_band_rows
+        self._executor = None
+        self._scratch = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['_scratch'] = {}
+        return state
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def bands(self, height: int) -> list[tuple[int, int]]:
+        """
+        Method to split the rows of a frame into bands of near equal height
+
+        :param height: number of rows of the frame
+        :return: list of (first row, end row) of each band
+        """
+        n_bands = max(1, min(self.threads, height // self.min_band_rows))
+        edges = np.linspace(0, height, n_bands + 1).round().astype(int).tolist()
+        return list(zip(edges[:-1], edges[1:]))
+
+    def run(self, band_function: Callable, image: np.ndarray, out: np.ndarray, halo: int = 0) -> np.ndarray:
+        """
+        Method to apply a function to every band of an image in parallel
+
+        :param band_function: function of an image band, the array of the band's shape its output is written to and
+        the row of the image the band starts at
+        :param image: the input image
+        :param out: array of the image's shape the output is written to, which must not be image
+        :param halo: number of rows above and below each band the output rows of the band depend on
+        :return: out
+        """
+        bands = self.bands(image.shape[0])
+        if len(bands) == 1:
+            band_function(image, out, 0)
+            return out
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='band')
+        futures = [
+            self._executor.submit(self._run_band, band_function, image, out, halo, band_index, first_row, end_row)
+            for band_index, (first_row, end_row) in enumerate(bands)
+        ]
+        for future in futures:
+            future.result()
+        return out
+
+    def _run_band(self, band_function, image, out, halo, band_index, first_row, end_row):
+        if halo <= 0:
+            band_function(image[first_row:end_row], out[first_row:end_row], first_row)
+            return
+        # the band is rendered with its halo into scratch and only its own rows are copied to out
+        start, stop = max(first_row - halo, 0), min(end_row + halo, image.shape[0])
+        scratch = self._get_scratch(band_index, (stop - start, *image.shape[1:]), image.dtype)
+        band_function(image[start:stop], scratch, start)
+        out[first_row:end_row] = scratch[first_row - start:end_row - start]
+
+    def _get_scratch(self, band_index: int, shape: tuple, dtype) -> np.ndarray:
+        # each band has its own array, grown to the most rows it has needed, so bands never share scratch
+        scratch = self._scratch.get(band_index)
+        if scratch is None or scratch.shape[1:] != shape[1:] or scratch.dtype != dtype or len(scratch) < shape[0]:
+            scratch = np.empty(shape, dtype=dtype)
+            self._scratch[band_index] = scratch
+        return scratch[:shape[0]]
+
+
+def band_rule(mod_mapping: ModifierMapping) -> Optional[Callable]:
+    """
+    Function to get how a modifier is applied to bands. The rule is a function of the image shape, the frame's key
+    word arguments and the frame's random number generator returning (halo, band function), or None when the frame
+    must be modified whole. It draws any random numbers up front, in the order the modifier draws them, so a banded
+    frame is identical to a whole frame.
+
+    :param mod_mapping: the ModifierMapping
+    :return: the rule, or None when the modifier is never applied to bands
+    """
+    if mod_mapping.band_halo is not None:
+        return partial(_fixed_halo_rule, mod_mapping.modifier_function, mod_mapping.band_halo)
+    function, keywords = _unwrap(mod_mapping.modifier_function)
+    rule = BAND_RULES.get(function)
+    if rule is None:
+        return None
+    return partial(_partial_rule, rule, mod_mapping.modifier_function, keywords)
+
+
+def _unwrap(function):
+    # the function a functools.partial wraps and its key word arguments
+    keywords = {}
+    while isinstance(function, partial):
+        keywords = {**function.keywords, **keywords}
+        function = function.func
+    return function, keywords
+
+
+def _partial_rule(rule, modifier_function, keywords, shape, kwargs, rng):
+    return rule(modifier_function, shape, {**keywords, **kwargs}, rng)
+
+
+def _kwarg(function, kwargs: dict, name: str):
+    # the value of a key word argument, or its default when the mapping does not set it
+    if name in kwargs:
+        return kwargs[name]
+    return inspect.signature(_unwrap(function)[0]).parameters[name].default
+
+
+def _apply_to_band(modifier_function, kwargs, image, out, first_row):
+    result = modifier_function(image, out=out, **kwargs)
+    if result is not out:
+        np.copyto(out, result)
+
+
+def _fixed_halo_rule(modifier_function, halo, shape, kwargs, rng):
+    return halo, partial(_apply_to_band, modifier_function, kwargs)
+
+
+def _point_rule(modifier_function, shape, kwargs, rng):
+    # each output pixel depends only on the same input pixel
+    return 0, partial(_apply_to_band, modifier_function, kwargs)
+
+
+def _blur_rule(modifier_function, shape, kwargs, rng):
+    kernel_size = _kwarg(modifier_function, kwargs, 'kernel_size')
+    halo = 0 if kernel_size == 0 else _round_to_nearest_odd_int(kernel_size) // 2
+    return halo, partial(_apply_to_band, modifier_function, kwargs)
+
+
+def _ghosts_rule(modifier_function, shape, kwargs, rng):
+    shifts, weights = ImageModifiers._draw_ghosts(
+        _kwarg(modifier_function, kwargs, 'number_of_ghost_images'), _kwarg(modifier_function, kwargs, 'max_shift'),
+        _kwarg(modifier_function, kwargs, 'alpha'), _kwarg(modifier_function, kwargs, 'decay'), _get_rng(rng)
+    )
+    halo = int(np.abs(shifts[:, 1]).max()) if len(shifts) else 0
+    return halo, partial(_ghosts_band, shifts, weights)
+
+
+def _ghosts_band(shifts, weights, image, out, first_row):
+    # rows shifted in from beyond the band come from its halo, so only rows beyond the frame are black
+    add_shifted_copies(image, shifts, weights, out=out)
+
+
+def _vlines_rule(channel, modifier_function, shape, kwargs, rng):
+    no_lines, min_thickness, max_thickness = (
+        int(_kwarg(modifier_function, kwargs, name)) for name in ('no_lines', 'min_thickness', 'max_thickness')
+    )
+    line_spans = random_line_spans(shape[1], no_lines, min_thickness, max_thickness, _get_rng(rng))
+    return 0, partial(_vlines_band, line_spans >= 0, channel)
+
+
+def _vlines_band(columns, channel, image, out, first_row):
+    _copy_to(image, out)[:, columns, channel] = 255
+
+
+def _hlines_rule(modifier_function, shape, kwargs, rng):
+    line_spans, colours = ImageModifiers._draw_hlines(
+        shape[0], _kwarg(modifier_function, kwargs, 'no_lines'), _kwarg(modifier_function, kwargs, 'min_thickness'),
+        _kwarg(modifier_function, kwargs, 'max_thickness'), _get_rng(rng)
+    )
+    return 0, partial(_hlines_band, line_spans, colours)
+
+
+def _hlines_band(line_spans, colours, image, out, first_row):
+    band_spans = line_spans[first_row:first_row + len(image)]
+    rows = np.flatnonzero(band_spans >= 0)
+    _copy_to(image, out)[rows] = colours[band_spans[rows], None, :]
+
+
+def _noise_rule(modifier_function, shape, kwargs, rng):
+    # noise generated per pixel costs more than adding it, so only noise sampled from a NoiseBank is banded
+    noise_bank = kwargs.get('noise_bank')
+    if noise_bank is None:
+        return None
+    noise = noise_bank.sample(shape, _get_rng(rng))
+    return 0, partial(
+        _noise_band, noise, float(_kwarg(modifier_function, kwargs, 'mean')),
+        float(_kwarg(modifier_function, kwargs, 'standard_deviation'))
+    )
+
+
+def _noise_band(noise, mean, standard_deviation, image, out, first_row):
+    cv2.addWeighted(
+        image, 1., noise[first_row:first_row + len(image)], standard_deviation, mean, dst=out, dtype=cv2.CV_8U
+    )
+
+
+# ImageModifiers methods that can be applied to bands, see band_rule. The others, e.g. those depending on the position
+# of a pixel in the frame or scattering pixels over the whole frame, modify the frame whole.
+BAND_RULES = {
+    ImageModifiers.apply_median_blur: _blur_rule,
+    ImageModifiers.apply_gaussian_blur: _blur_rule,
+    ImageModifiers.apply_gaussian_noise: _noise_rule,
+    ImageModifiers.apply_hue_multiplication: _point_rule,
+    ImageModifiers.apply_saturation_multiplication: _point_rule,
+    ImageModifiers.apply_rgb_multiplication: _point_rule,
+    ImageModifiers.apply_red_scaling: _point_rule,
+    ImageModifiers.apply_green_scaling: _point_rule,
+    ImageModifiers.apply_blue_scaling: _point_rule,
+    ImageModifiers.apply_ghost_images: _ghosts_rule,
+    ImageModifiers.apply_red_vlines: partial(_vlines_rule, 0),
+    ImageModifiers.apply_green_vlines: partial(_vlines_rule, 1),
+    ImageModifiers.apply_blue_vlines: partial(_vlines_rule, 2),
+    ImageModifiers.apply_random_coloured_hlines: _hlines_rule,
+}
@@ -1,58 +1,440 @@
+from concurrent.futures import Future
+import functools
 from moviepy.video.io.ImageSequenceClip import ImageSequenceClip
+import numpy as np
+import os
 import pandas as pd
+import time
 from tqdm import tqdm
-from typing import Optional
+from typing import Callable, Optional, Union
 
 from aeraudioviz.audio import Audio
 from aeraudioviz.audio.feature_utils import normalise_features
-from aeraudioviz.image import ImageModifiers, BaseImage
+from aeraudioviz.image import AnimatedBase, BaseFrames, ImageModifiers, BaseImage
+from aeraudioviz.video.draft import scale_modifier_mapping
+from aeraudioviz.video.frame_buffers import FrameBuffers
+from aeraudioviz.video.frame_cache import FrameCache
+from aeraudioviz.video.modifier_chain import ModifierChain, frame_rng
 from aeraudioviz.video.modifier_mapping import ModifierMapping
+from aeraudioviz.video.parallel import ParallelFrameRenderer, render_in_order
+from aeraudioviz.video.parameter_table import ParameterTable
+from aeraudioviz.video.profiling import RenderProfiler, peak_memory_bytes
+from aeraudioviz.video.render_report import RenderReport
+from aeraudioviz.video.segments import SegmentCache, render_segment, segment_executor, segment_key, submit_segment
+from aeraudioviz.video.temporal_ghosts import TemporalGhosts
+from aeraudioviz.video.tiling import BandExecutor
+from aeraudioviz.video.writer import StreamingVideoWriter, concat_videos
 
 
 class VideoGenerator:
 
-    # ToDo: consider how to ensure the feature_time_series index freq and fps are consistent and only require
-    #  specification at one point
-
     def __init__(
             self,
-            base_image: BaseImage,
+            base_image: Union[BaseImage, AnimatedBase],
             feature_time_series: pd.DataFrame,
             modifier_mappings: tuple[ModifierMapping],
-            fps: int = 24,
+            fps: Optional[float] = None,
             audio: Optional[Audio] = None,
-            normalise_feature_values: bool = True
+            normalise_feature_values: bool = True,
+            seed: Optional[int] = None,
+            fuse_colour_ops: bool = False,
+            frame_cache_bytes: int = 0,
+            blur_cache_levels: int = 0,
+            temporal_ghosts: Optional[TemporalGhosts] = None,
+            band_threads: int = 1
     ):
+        """
+
+        :param base_image: the BaseImage every frame is rendered from, or an AnimatedBase giving each frame its own base
+        :param feature_time_series: pandas.DataFrame with one row per frame
+        :param modifier_mappings: tuple of ModifierMapping objects applied to each frame in order
+        :param fps: frame rate of the video. If None it is taken from the fps entry of feature_time_series.attrs,
+        set by AudioFeatures.get_feature_time_series(fps=...), and defaults to 24 when there is no such entry.
+        :param audio: optional Audio object to add to the video
+        :param normalise_feature_values: Boolean controlling whether the feature columns are min-max normalised
+        :param seed: seed for the stochastic modifiers. Each frame gets its own generator seeded from the seed and the
+        frame index, so renders with the same seed are identical regardless of the number of workers.
+        If None a random seed is chosen.
+        :param fuse_colour_ops: Boolean controlling whether consecutive HSV modifiers and consecutive RGB channel
+        modifiers are applied in a single colour space pass, see ModifierChain
+        :param frame_cache_bytes: size in bytes of the cache of rendered frames. When greater than zero a frame whose
+        parameter values equal those of a cached frame reuses it instead of being rendered again. Parameter values
+        are compared after rounding to the quantisation_steps of their ModifierMapping. For chains with stochastic
+        modifiers the frame seed is part of the key, so only re-renders of the same frame hit the cache.
+        :param blur_cache_levels: when greater than zero and the first modifier mapping is a Gaussian or median blur,
+        the base image is blurred at up to this many kernel sizes before rendering and each frame's blur is looked up
+        from them, see ModifierChain. It is not used with an AnimatedBase, whose bases change from frame to frame.
+        :param temporal_ghosts: optional TemporalGhosts blending the previously rendered frames onto each frame. It is
+        applied in order after rendering, so it works with any number of workers and with the frame cache.
+        :param band_threads: number of threads each frame of a single process render is rendered on, as horizontal
+        bands, see BandExecutor. This lowers the latency of a frame rather than raising the throughput of a render
+        with several workers.
+        """
+        feature_fps = feature_time_series.attrs.get('fps')
+        if fps is not None and feature_fps is not None and fps != feature_fps:
+            raise ValueError(f'fps {fps} does not match the feature time series frame rate {feature_fps}')
         self.base_image = base_image
         self.feature_time_series = feature_time_series
         if normalise_feature_values:
             self.feature_time_series = normalise_features(self.feature_time_series)
         self.modifier_mappings = modifier_mappings
+        self.parameter_table = ParameterTable(self.feature_time_series, self.modifier_mappings)
+        self.modifier_chain = ModifierChain(
+            self.modifier_mappings, fuse_colour_ops=fuse_colour_ops,
+            blur_cache_levels=blur_cache_levels if not isinstance(base_image, AnimatedBase) else 0
+        )
         self.image_modifier = ImageModifiers()
-        self.fps = fps
+        self.fps = next(value for value in (fps, feature_fps, 24) if value is not None)
         self.audio = audio
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy)
+        self.frame_cache = FrameCache(frame_cache_bytes) if frame_cache_bytes > 0 else None
+        self.temporal_ghosts = temporal_ghosts
+        self.frame_buffers: Optional[FrameBuffers] = None
+        self.band_executor = BandExecutor(band_threads) if band_threads > 1 else None
+        self.base_frames = None
+        if isinstance(base_image, AnimatedBase):
+            self.base_frames = BaseFrames(base_image, base_image.positions(self.feature_time_series, self.fps))
 
-    def generate(self, output_path: str = "output_video.mp4"):
-        frames = []
+    def iter_frames(
+            self, workers: int = 1, profiler: Optional[RenderProfiler] = None, buffers: Optional[FrameBuffers] = None
+    ):
+        """
+        Generator rendering one frame per row of the feature time series
+
+        :param workers: number of processes to render frames in. Frames are yielded in order and are identical to a
+        single process render.
+        :param profiler: optional RenderProfiler the stage timings of each rendered frame are added to
+        :param buffers: optional FrameBuffers a single process render writes its frames to, see get_frame_buffers. A
+        yielded frame is then overwritten len(buffers) frames later, so it must be consumed or copied before then.
+        :return: iterator of RGB uint8 frames
+        """
+        if self.temporal_ghosts is None:
+            yield from self._iter_rendered_frames(workers, profiler, buffers)
+            return
+        self.temporal_ghosts.reset()
+        for frame in self._iter_rendered_frames(workers, profiler, buffers):
+            # the blend replaces the rendered frame unless it is a shared frame from the frame cache
+            yield self.temporal_ghosts(frame, out=frame if frame.flags.writeable else None)
+
+    def get_frame_buffers(self, n_outputs: int) -> FrameBuffers:
+        """
+        Method to get the FrameBuffers of this generator, which are reused by later renders with the same number of
+        output arrays
+
+        :param n_outputs: number of output arrays, see FrameBuffers
+        :return: FrameBuffers object
+        """
+        shape = self.base_image.rgb_image.shape
+        if self.frame_buffers is None or self.frame_buffers.shape != shape or len(self.frame_buffers) != n_outputs:
+            self.frame_buffers = FrameBuffers(shape, n_outputs=n_outputs, dtype=self.base_image.rgb_image.dtype)
+        return self.frame_buffers
+
+    def _iter_rendered_frames(
+            self, workers: int, profiler: Optional[RenderProfiler] = None, buffers: Optional[FrameBuffers] = None
+    ):
+        on_stage_seconds = profiler.add_stage_seconds if profiler is not None else None
+        if workers > 1:
+            with ParallelFrameRenderer(
+                    self.base_image.rgb_image, self.modifier_chain, self.seed, workers,
+                    on_stage_seconds=on_stage_seconds, base_frames=self.base_frames
+            ) as renderer:
+                yield from render_in_order(
+                    self._iter_frame_tasks(), renderer.submit, renderer.max_pending, self.frame_cache
+                )
+            return
+        yield from render_in_order(
+            self._iter_frame_tasks(),
+            functools.partial(self._render_frame, on_stage_seconds=on_stage_seconds, buffers=buffers),
+            frame_cache=self.frame_cache
+        )
+
+    def _iter_frame_tasks(self):
+        for frame_index in range(len(self.parameter_table)):
+            yield frame_index, self.parameter_table.frame_kwargs(frame_index), self._frame_key(frame_index)
+
+    def _frame_key(self, frame_index: int):
+        if self.frame_cache is None:
+            return None
+        key = self.parameter_table.values[frame_index].tobytes()
+        if self.base_frames is not None:
+            key = key, self.base_frames.positions[frame_index]
+        if self.modifier_chain.uses_rng:
+            return key, frame_index
+        return key
+
+    def _render_frame(
+            self, frame_index: int, mapping_kwargs: list[dict], on_stage_seconds: Optional[Callable] = None,
+            buffers: Optional[FrameBuffers] = None
+    ) -> Future:
+        stage_seconds = [] if on_stage_seconds is not None else None
+        future = Future()
+        base_rgb_image = self.base_frames(frame_index) if self.base_frames is not None else self.base_image.rgb_image
+        future.set_result(self.modifier_chain(
+            base_rgb_image, mapping_kwargs, frame_rng(self.seed, frame_index), stage_seconds=stage_seconds,
+            buffers=buffers, band_executor=self.band_executor
+        ))
+        if on_stage_seconds is not None:
+            on_stage_seconds(stage_seconds)
+        return future
+
+    def generate(
+            self,
+            output_path: str = "output_video.mp4",
+            streaming: bool = True,
+            queue_size: int = 8,
+            codec: str = "libx264",
+            preset: str = "medium",
+            workers: int = 1,
+            on_metrics: Optional[Callable[[dict], None]] = None,
+            metrics_interval: float = 1.
+    ) -> RenderReport:
+        """
+
+        :param output_path: path of the video file to write
+        :param streaming: Boolean controlling whether frames are encoded as they are rendered.
+        When True frames are piped to ffmpeg through a queue of at most queue_size frames, so memory use does not grow
+        with the length of the video. When False all frames are rendered before the video is written.
+        :param queue_size: maximum number of rendered frames waiting to be encoded in streaming mode
+        :param codec: ffmpeg video codec
+        :param preset: ffmpeg encoding preset
+        :param workers: number of processes to render frames in
+        :param on_metrics: optional function called during the render with a dict of live metrics, see
+        RenderProfiler.metrics
+        :param metrics_interval: minimum number of seconds between calls of on_metrics
+        :return: RenderReport summarising the render, including per stage timings of the modifier chain, encoder
+        throughput, encoder queue depth and peak memory
+        """
+        report = RenderReport()
+        report.output_path = output_path
+        cache_hits, cache_misses = (
+            (self.frame_cache.hits, self.frame_cache.misses) if self.frame_cache is not None else (0, 0)
+        )
+        profiler = RenderProfiler(
+            self.modifier_chain.stage_names, on_metrics=on_metrics, metrics_interval=metrics_interval
+        )
+        start_time = time.perf_counter()
+        if streaming:
+            writer = self._generate_streaming(
+                output_path, queue_size=queue_size, codec=codec, preset=preset, workers=workers, profiler=profiler
+            )
+            report.frames_encoded = writer.frames_encoded
+            report.encode_seconds = writer.encode_seconds
+        else:
+            self._generate_buffered(output_path, codec=codec, preset=preset, workers=workers, profiler=profiler)
+        report.render_seconds = time.perf_counter() - start_time
+        report.frames = len(self.parameter_table)
+        report.stage_timings = profiler.stage_timings()
+        report.render_wait_seconds = profiler.render_wait_seconds
+        report.encode_wait_seconds = profiler.encode_wait_seconds
+        queue_depth = profiler.queue_depth()
+        report.mean_queue_depth, report.max_queue_depth = queue_depth['mean'], queue_depth['max']
+        report.peak_memory_bytes = peak_memory_bytes()
+        report.peak_child_memory_bytes = peak_memory_bytes(children=True)
+        if self.frame_cache is not None:
+            report.cache_hits = self.frame_cache.hits - cache_hits
+            report.cache_misses = self.frame_cache.misses - cache_misses
+            print(f"Frame cache hit rate: {report.cache_hit_rate:.1%}")
+        return report
+
+    def generate_segmented(
+            self,
+            output_path: str = "output_video.mp4",
+            segment_cache_dir: str = "segment_cache",
+            segment_seconds: float = 10.,
+            codec: str = "libx264",
+            preset: str = "medium",
+            workers: int = 1
+    ) -> RenderReport:
+        """
+        Method to render the video as fixed length segments that are cached on disk, so a render after a change only
+        renders and encodes the segments whose frames changed. Each segment is keyed by a hash of its rows of the
+        parameter table, the base image, the modifier functions, the encoder settings, for stochastic chains the seed
+        and frame indices and, for an AnimatedBase, its source files and the source positions of its frames. The
+        segments are joined with a stream copy, without re-encoding. The frame cache is not used.
+
+        :param output_path: path of the video file to write
+        :param segment_cache_dir: directory of the SegmentCache
+        :param segment_seconds: length of the segments in seconds
+        :param codec: ffmpeg video codec
+        :param preset: ffmpeg encoding preset
+        :param workers: number of processes to render and encode segments in
+        :return: RenderReport summarising the render
+        """
+        report = RenderReport()
+        report.output_path = output_path
+        start_time = time.perf_counter()
+        segment_cache = SegmentCache(segment_cache_dir)
+        height, width = self.base_image.rgb_image.shape[:2]
+        writer_kwargs = {'size': (width, height), 'fps': self.fps, 'codec': codec, 'preset': preset}
+        # frames before each segment are rendered again to refill the temporal ghosts ring buffer
+        n_warm_up_frames = self.temporal_ghosts.number_of_frames if self.temporal_ghosts is not None else 0
+        render_key = segment_key(
+            self.base_image.rgb_image, self.modifier_chain.fuse_colour_ops, self.modifier_chain.blur_cache_levels,
+            [(mod_mapping.modifier_function, mod_mapping.modifier_column) for mod_mapping in self.modifier_mappings],
+            self.parameter_table.columns, self.temporal_ghosts, writer_kwargs,
+            self.base_image.cache_key if self.base_frames is not None else None
+        )
+        n_frames = len(self.parameter_table)
+        segment_frames = max(1, round(segment_seconds * self.fps))
+        segment_paths, tasks = [], {}
+        for start in range(0, n_frames, segment_frames):
+            first = max(start - n_warm_up_frames, 0)
+            frame_indices = range(first, min(start + segment_frames, n_frames))
+            key = segment_key(
+                render_key, self.parameter_table.values[frame_indices.start:frame_indices.stop], start - first,
+                (self.seed, frame_indices) if self.modifier_chain.uses_rng else None,
+                self.base_frames.positions[frame_indices.start:frame_indices.stop] if self.base_frames is not None
+                else None
+            )
+            segment_paths.append(str(segment_cache.path(key)))
+            if key in segment_cache or key in tasks:
+                report.segments_reused += 1
+                continue
+            tasks[key] = (
+                frame_indices, [self.parameter_table.frame_kwargs(i) for i in frame_indices], start - first,
+                self.temporal_ghosts
+            )
+        print(f"Rendering {len(tasks)} of {len(segment_paths)} segments...")
+        self._render_segments(segment_cache, tasks, writer_kwargs, workers)
+        print("Joining segments...")
+        concat_videos(segment_paths, output_path, audio_path=self.audio.audio_path if self.audio is not None else None)
+        print(f"Video written successfully to {output_path}.")
+        report.render_seconds = time.perf_counter() - start_time
+        report.frames = n_frames
+        report.segments_rendered = len(tasks)
+        return report
+
+    def _render_segments(self, segment_cache: SegmentCache, tasks: dict, writer_kwargs: dict, workers: int):
+        temporary_paths = {key: segment_cache.temporary_path() for key in tasks}
+        try:
+            if workers > 1 and len(tasks) > 1:
+                with segment_executor(self.base_image.rgb_image, self.modifier_chain, self.seed, workers) as executor:
+                    futures = {
+                        key: submit_segment(executor, *task, temporary_paths[key], writer_kwargs, self.base_frames)
+                        for key, task in tasks.items()
+                    }
+                    for key, future in tqdm(futures.items()):
+                        future.result()
+                        os.replace(temporary_paths.pop(key), segment_cache.path(key))
+            else:
+                for key, task in tqdm(tasks.items()):
+                    render_segment(
+                        self.base_image.rgb_image, self.modifier_chain, self.seed, *task, temporary_paths[key],
+                        writer_kwargs, self.base_frames
+                    )
+                    os.replace(temporary_paths.pop(key), segment_cache.path(key))
+        finally:
+            for temporary_path in temporary_paths.values():
+                os.remove(temporary_path)
+
+    def draft(self, scale: float = .25, frame_step: int = 2) -> 'VideoGenerator':
+        """
+        Method to get a generator of a quick preview of this video, at a fraction of the resolution and frame rate.
+        The base image is downscaled, pixel unit key word arguments such as blur kernel_size, ghost max_shift and line
+        thicknesses are scaled with it, see draft.PIXEL_KWARGS, and only every frame_step-th frame is rendered.
+
+        :param scale: ratio of the draft resolution to the full resolution
+        :param frame_step: render every frame_step-th frame, at fps / frame_step
+        :return: VideoGenerator object
+        """
+        height, width = self.base_image.rgb_image.shape[:2]
+        # libx264 needs even frame dimensions
+        size = tuple(max(2, 2 * round(length * scale / 2)) for length in (width, height))
+        pixel_scale = size[0] / width
+        feature_time_series = self.feature_time_series.iloc[::frame_step].copy()
+        feature_time_series.attrs['fps'] = self.fps / frame_step
+        temporal_ghosts = self.temporal_ghosts
+        if temporal_ghosts is not None:
+            temporal_ghosts = TemporalGhosts(temporal_ghosts.number_of_frames, temporal_ghosts.alpha,
+                                             temporal_ghosts.decay)
+        return VideoGenerator(
+            self.base_image.resized(size),
+            feature_time_series,
+            tuple(scale_modifier_mapping(mod_mapping, pixel_scale) for mod_mapping in self.modifier_mappings),
+            audio=self.audio,
+            normalise_feature_values=False,
+            seed=self.seed,
+            fuse_colour_ops=self.modifier_chain.fuse_colour_ops,
+            frame_cache_bytes=self.frame_cache.max_bytes if self.frame_cache is not None else 0,
+            blur_cache_levels=self.modifier_chain.blur_cache_levels,
+            temporal_ghosts=temporal_ghosts,
+            band_threads=self.band_executor.threads if self.band_executor is not None else 1
+        )
+
+    def generate_draft(
+            self,
+            output_path: str = "draft_video.mp4",
+            scale: float = .25,
+            frame_step: int = 2,
+            preset: str = "ultrafast",
+            workers: int = 1
+    ) -> RenderReport:
+        """
+        Method to render a quick preview of the video, see draft
+
+        :param output_path: path of the video file to write
+        :param scale: ratio of the draft resolution to the full resolution
+        :param frame_step: render every frame_step-th frame
+        :param preset: ffmpeg encoding preset
+        :param workers: number of processes to render frames in
+        :return: RenderReport summarising the render
+        """
+        return self.draft(scale=scale, frame_step=frame_step).generate(output_path, preset=preset, workers=workers)
+
+    def _generate_streaming(
+            self, output_path: str, queue_size: int = 8, codec: str = "libx264", preset: str = "medium",
+            workers: int = 1, profiler: Optional[RenderProfiler] = None
+    ) -> StreamingVideoWriter:
+        height, width = self.base_image.rgb_image.shape[:2]
+        audio_path = self.audio.audio_path if self.audio is not None else None
+        profiler = profiler if profiler is not None else RenderProfiler(self.modifier_chain.stage_names)
+        # a frame is not rendered over until it has left the queue and been piped to ffmpeg
+        buffers = self.get_frame_buffers(queue_size + 2) if workers <= 1 else None
+        print("Generating and writing video frames...")
+        with StreamingVideoWriter(
+                output_path, (width, height), self.fps, codec=codec, preset=preset, audio_path=audio_path,
+                queue_size=queue_size
+        ) as writer:
+            for frame, render_wait_seconds in tqdm(
+                    _timed(self.iter_frames(workers=workers, profiler=profiler, buffers=buffers)),
+                    total=len(self.parameter_table)
+            ):
+                start_time = time.perf_counter()
+                writer.write_frame(frame)
+                profiler.frame_done(render_wait_seconds, time.perf_counter() - start_time, writer.queue_depth)
+        print(f"Video written successfully to {output_path}.")
+        return writer
+
+    def _generate_buffered(
+            self, output_path: str, codec: str = "libx264", preset: str = "medium", workers: int = 1,
+            profiler: Optional[RenderProfiler] = None
+    ):
+        profiler = profiler if profiler is not None else RenderProfiler(self.modifier_chain.stage_names)
         print("Generating video frames...")
-        for idx, row in tqdm(self.feature_time_series.iterrows(), total=len(self.feature_time_series)):
-            frame = self.base_image.rgb_image.copy()
-            for mod_mapping in self.modifier_mappings:
-                mod_value = row[mod_mapping.modifier_column]
-                kwargs = {
-                    arg: mod_mapping.kwarg_ranges[arg][0] + (
-                            mod_mapping.kwarg_ranges[arg][1] - mod_mapping.kwarg_ranges[arg][0]
-                    ) * mod_value
-                    for arg in mod_mapping.kwarg_ranges.keys()
-                }
-                frame = mod_mapping.modifier_function(frame, **kwargs)
+        frames = []
+        for frame, render_wait_seconds in tqdm(
+                _timed(self.iter_frames(workers=workers, profiler=profiler)), total=len(self.parameter_table)
+        ):
             frames.append(frame)
-        clip = ImageSequenceClip(frames, fps=24)
+            profiler.frame_done(render_wait_seconds)
+        clip = ImageSequenceClip(frames, fps=self.fps)
         print("Frames generated.")
         if self.audio is not None:
             print("Setting audio...")
             clip = clip.set_audio(self.audio.moveipy_audio_clip)
             print("Audio set.")
         print("Writing video...")
-        clip.write_videofile(output_path, codec="libx264")
+        clip.write_videofile(output_path, codec=codec, preset=preset)
         print(f"Video written successfully to {output_path}.")
+
+
+def _timed(iterable):
+    # yields each item with the seconds spent waiting for it
+    iterator = iter(iterable)
+    while True:
+        start_time = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield item, time.perf_counter() - start_time
@@ -0,0 +1,203 @@
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.tools import subprocess_call
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+
+class StreamingVideoWriter:
+
+    def __init__(
+            self,
+            output_path: str,
+            size: tuple[int, int],
+            fps: float,
+            codec: str = 'libx264',
+            preset: str = 'medium',
+            audio_path: Optional[str] = None,
+            audio_codec: str = 'aac',
+            queue_size: int = 8,
+            ffmpeg_params: Optional[list[str]] = None
+    ):
+        """
+        Writes frames to ffmpeg as they are produced rather than collecting them in memory first. Frames are passed to
+        a background thread through a bounded queue, so rendering and encoding overlap and at most queue_size frames
+        are held in memory at once. When audio_path is given the audio is muxed in after the last frame is written.
+
+        :param output_path: path of the video file to write
+        :param size: (width, height) of the frames in pixels
+        :param fps: frame rate of the output video
+        :param codec: ffmpeg video codec
+        :param preset: ffmpeg encoding preset, e.g. 'ultrafast' or 'medium'
+        :param audio_path: optional path to an audio file to mux into the output
+        :param audio_codec: ffmpeg audio codec used when muxing audio_path
+        :param queue_size: maximum number of frames waiting to be encoded
+        :param ffmpeg_params: additional ffmpeg output arguments
+        """
+        self.output_path = output_path
+        self.size = size
+        self.fps = fps
+        self.codec = codec
+        self.preset = preset
+        self.audio_path = audio_path
+        self.audio_codec = audio_codec
+        self.queue_size = queue_size
+        self.ffmpeg_params = ffmpeg_params
+        self._queue = None
+        self._thread = None
+        self._writer = None
+        self._error = None
+        self._video_path = None
+        self.frames_encoded = 0
+        self.encode_seconds = 0.
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(abort=exc_type is not None)
+
+    def open(self):
+        """
+        Method to start the ffmpeg process and the encoding thread
+
+        :return:
+        """
+        if self.audio_path is None:
+            self._video_path = self.output_path
+        else:
+            # the video stream is written to a temporary file next to the output and muxed with the audio on close
+            handle, self._video_path = tempfile.mkstemp(
+                suffix=os.path.splitext(self.output_path)[1],
+                dir=os.path.dirname(os.path.abspath(self.output_path))
+            )
+            os.close(handle)
+        self._writer = FFMPEG_VideoWriter(
+            self._video_path, self.size, self.fps, codec=self.codec, preset=self.preset,
+            ffmpeg_params=self.ffmpeg_params
+        )
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._encode_frames, daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def write_frame(self, frame: np.ndarray):
+        """
+        Method to queue a frame for encoding. Blocks while the queue is full.
+
+        :param frame: RGB uint8 array of shape (height, width, 3)
+        :return:
+        """
+        self._put(frame)
+
+    def close(self, abort: bool = False):
+        """
+        Method to flush the queued frames, stop ffmpeg and mux in the audio
+
+        :param abort: when True the audio is not muxed in, used when rendering stopped early
+        :return:
+        """
+        if self._thread is None:
+            return
+        try:
+            try:
+                self._put(None)
+                self._thread.join()
+            finally:
+                self._thread = None
+                self._writer.close()
+            if self._error is not None:
+                raise self._error
+            if self.audio_path is not None and not abort:
+                mux_audio(self._video_path, self.audio_path, self.output_path, audio_codec=self.audio_codec)
+        finally:
+            if self._video_path != self.output_path:
+                os.remove(self._video_path)
+
+    def _put(self, item):
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._queue.put(item, timeout=.1)
+                return
+            except queue.Full:
+                continue
+
+    def _encode_frames(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    return
+                start_time = time.perf_counter()
+                self._writer.write_frame(frame)
+                # time spent piping the frame to ffmpeg, which blocks while ffmpeg is busy encoding
+                self.encode_seconds += time.perf_counter() - start_time
+                self.frames_encoded += 1
+        except Exception as e:
+            self._error = e
+
+
+def mux_audio(video_path: str, audio_path: str, output_path: str, audio_codec: str = 'aac'):
+    """
+    Function to combine a video file and an audio file without re-encoding the video stream. The output is cut to the
+    shorter of the two streams.
+
+    :param video_path: path to the video file
+    :param audio_path: path to the audio file
+    :param output_path: path of the combined file to write
+    :param audio_codec: ffmpeg audio codec for the output
+    :return:
+    """
+    subprocess_call([
+        get_setting("FFMPEG_BINARY"), '-y',
+        '-i', video_path,
+        '-i', audio_path,
+        '-map', '0:v:0', '-map', '1:a:0',
+        '-c:v', 'copy', '-c:a', audio_codec,
+        '-shortest',
+        output_path
+    ], logger=None)
+
+
+def concat_videos(
+        video_paths: list[str], output_path: str, audio_path: Optional[str] = None, audio_codec: str = 'aac'
+):
+    """
+    Function to join video files end to end without re-encoding, using the ffmpeg concat demuxer. The files must have
+    been encoded with the same codec settings, size and frame rate, and should each start with a key frame.
+
+    :param video_paths: paths to the video files in order
+    :param output_path: path of the joined file to write
+    :param audio_path: optional path to an audio file to mux into the output, which is cut to the shorter stream
+    :param audio_codec: ffmpeg audio codec used when muxing audio_path
+    :return:
+    """
+    handle, list_path = tempfile.mkstemp(suffix='.txt', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with os.fdopen(handle, 'w') as list_file:
+            for video_path in video_paths:
+                escaped_path = os.path.abspath(video_path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped_path}'\n")
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path is not None:
+            command += [
+                '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy', '-c:a', audio_codec, '-shortest'
+            ]
+        else:
+            command += ['-c', 'copy']
+        subprocess_call(command + [output_path], logger=None)
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+
+from aeraudioviz.audio import Audio, AudioFeatures
+from benchmarks.timing import time_call
+
+
+def synthetic_audio(path: str, seconds: float, sample_rate: int = 44100, seed: int = 0):
+    """
+    Function to write a reproducible WAV file with a tone sweep, noise and a click every half second, so onset and
+    beat tracking have something to find
+
+    :param path: path of the WAV file to write
+    :param seconds: length of the audio
+    :param sample_rate: sample rate in Hertz
+    :param seed: seed of the noise
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = .3 * np.sin(2. * np.pi * (220. + 40. * t % 660.) * t)
+    audio += .05 * np.random.default_rng(seed).standard_normal(len(t))
+    clicks = (t % .5) < .01
+    audio[clicks] += .5 * np.sin(2. * np.pi * 2000. * t[clicks])
+    soundfile.write(path, np.clip(audio, -1., 1.).astype(np.float32), sample_rate, subtype='PCM_16')
+
+
+def run(durations=(10., 60., 300.), repeats: int = 3) -> list[dict]:
+    """
+    Function to time loading audio, extracting the features and building the feature time series for synthetic audio
+    of increasing length, in memory and in streaming mode
+
+    :param durations: lengths of the synthetic audio in seconds
+    :param repeats: number of timed calls per case
+    :return: list of result dicts
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for seconds in durations:
+            path = os.path.join(directory, f'{seconds:g}s.wav')
+            synthetic_audio(path, seconds)
+            for streaming in (False, True):
+                params = {'seconds': seconds, 'streaming': streaming}
+                cases = {
+                    'Audio': lambda: Audio(path, streaming=streaming),
+                    'AudioFeatures': lambda: _all_features(AudioFeatures(Audio(path, streaming=streaming))),
+                }
+                features = AudioFeatures(Audio(path, streaming=streaming))
+                _all_features(features)
+                cases['get_feature_time_series'] = lambda: features.get_feature_time_series()
+                cases['get_feature_time_series(fps=24)'] = lambda: features.get_feature_time_series(fps=24)
+                for name, function in cases.items():
+                    timing = time_call(function, repeats=repeats, warm_up=0)
+                    results.append({'suite': 'audio_features', 'name': name, 'params': params, **timing})
+    return results
+
+
+def _all_features(features: AudioFeatures) -> AudioFeatures:
+    for feature in ('onset_envelope', 'onset_times', 'beat_times', 'spectral_centroid', 'rms_values'):
+        getattr(features, feature)
+    return features
@@ -0,0 +1,69 @@
+import inspect
+
+import numpy as np
+
+from aeraudioviz.image import ImageModifiers
+from benchmarks.timing import RESOLUTIONS, synthetic_image, time_call
+
+
+# the low, middle and high ends of the key word argument ranges typically given to ModifierMapping
+PARAMETER_GRID = {
+    'apply_median_blur': [{'kernel_size': 3}, {'kernel_size': 25}, {'kernel_size': 51}],
+    'apply_gaussian_blur': [{'kernel_size': 3}, {'kernel_size': 51}, {'kernel_size': 151}],
+    'apply_gaussian_noise': [{'standard_deviation': 1}, {'standard_deviation': 10}, {'standard_deviation': 50}],
+    'apply_salt_and_pepper_noise': [{'noise_ratio': .01}, {'noise_ratio': .1}, {'noise_ratio': .5}],
+    'apply_hue_multiplication': [{'hue_factor': .5}, {'hue_factor': 1.5}],
+    'apply_hue_multiplication_to_area': [
+        {'area_width': .25, 'area_height': .25, 'mod_factor': 1.5},
+        {'area_width': 1., 'area_height': 1., 'mod_factor': 1.5}
+    ],
+    'apply_saturation_multiplication': [{'saturation_factor': .5}, {'saturation_factor': 1.5}],
+    'apply_rgb_multiplication': [{'red_factor': .5, 'green_factor': 1.2, 'blue_factor': 1.5}],
+    'apply_red_scaling': [{'scale_factor': -.5}, {'scale_factor': .5}],
+    'apply_green_scaling': [{'scale_factor': -.5}, {'scale_factor': .5}],
+    'apply_blue_scaling': [{'scale_factor': -.5}, {'scale_factor': .5}],
+    'apply_ghost_images': [
+        {'number_of_ghost_images': 1, 'max_shift': 25}, {'number_of_ghost_images': 5, 'max_shift': 75},
+        {'number_of_ghost_images': 20, 'max_shift': 150}
+    ],
+    'apply_red_vlines': [{'no_lines': 1}, {'no_lines': 10}, {'no_lines': 100}],
+    'apply_green_vlines': [{'no_lines': 10}],
+    'apply_blue_vlines': [{'no_lines': 10}],
+    'apply_random_coloured_hlines': [{'no_lines': 1}, {'no_lines': 10}, {'no_lines': 100}],
+}
+
+
+def modifier_functions() -> dict:
+    return {
+        name: getattr(ImageModifiers, name)
+        for name, _ in inspect.getmembers(ImageModifiers, predicate=inspect.isfunction) if name.startswith('apply_')
+    }
+
+
+def run(resolutions=('480p', '1080p', '4k'), repeats: int = 5, modifiers=None) -> list[dict]:
+    """
+    Function to time every ImageModifiers.apply_ method at each resolution for each set of key word arguments in
+    PARAMETER_GRID. Methods missing from the grid are timed with their defaults. Each call gets a fresh copy of the
+    image, as in ModifierChain, and the copy is not timed. Stochastic methods get a seeded generator.
+
+    :param resolutions: keys of RESOLUTIONS
+    :param repeats: number of timed calls per case
+    :param modifiers: optional names of the methods to time, all by default
+    :return: list of result dicts
+    """
+    results = []
+    functions = modifier_functions()
+    for resolution in resolutions:
+        image = synthetic_image(RESOLUTIONS[resolution])
+        for name, function in functions.items():
+            if modifiers is not None and name not in modifiers:
+                continue
+            takes_rng = 'rng' in inspect.signature(function).parameters
+            for kwargs in PARAMETER_GRID.get(name, [{}]):
+                rng = np.random.default_rng(0)
+                call_kwargs = dict(kwargs, rng=rng) if takes_rng else kwargs
+                timing = time_call(lambda frame: function(frame, **call_kwargs), setup=image.copy, repeats=repeats)
+                results.append({
+                    'suite': 'image_modifiers', 'name': name, 'resolution': resolution, 'params': kwargs, **timing
+                })
+    return results
@@ -0,0 +1,81 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from aeraudioviz.image import ImageModifiers
+from aeraudioviz.video import ModifierMapping, VideoGenerator
+from benchmarks.timing import RESOLUTIONS, synthetic_image
+
+
+class NullWriter:
+
+    def __init__(self):
+        """
+        Stand in for StreamingVideoWriter that copies each frame to bytes, as piping it to ffmpeg would, and discards it
+        """
+        self.frames = 0
+        self.n_bytes = 0
+
+    def write_frame(self, frame: np.ndarray):
+        self.n_bytes += len(frame.tobytes())
+        self.frames += 1
+
+
+class _Image:
+
+    def __init__(self, rgb_image: np.ndarray):
+        # the part of BaseImage that VideoGenerator uses
+        self.rgb_image = rgb_image
+
+
+def mappings() -> tuple[ModifierMapping, ...]:
+    return (
+        ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(0, 31)),
+        ModifierMapping(ImageModifiers.apply_saturation_multiplication, 'Onset', saturation_factor=(.5, 1.5)),
+        ModifierMapping(ImageModifiers.apply_hue_multiplication, 'Centroid', hue_factor=(.8, 1.2)),
+        ModifierMapping(ImageModifiers.apply_red_scaling, 'Beats', scale_factor=(0., .4)),
+        ModifierMapping(ImageModifiers.apply_gaussian_noise, 'Onset', standard_deviation=(0, 15)),
+        ModifierMapping(ImageModifiers.apply_red_vlines, 'Beats', no_lines=(0, 10)),
+    )
+
+
+def run(resolutions=('480p', '1080p'), frames: int = 48, workers=(1,), generator_kwargs=None) -> list[dict]:
+    """
+    Function to measure end to end VideoGenerator frames per second with a fake encoder, from the parameter table to
+    frames copied out for the encoder
+
+    :param resolutions: keys of RESOLUTIONS
+    :param frames: number of frames to render
+    :param workers: numbers of worker processes to render with
+    :param generator_kwargs: optional dict of name to VideoGenerator key word arguments, each run as a separate case
+    :return: list of result dicts
+    """
+    generator_kwargs = generator_kwargs if generator_kwargs is not None else {
+        'default': {}, 'fused': {'fuse_colour_ops': True}, 'fused_blur_cache': {'fuse_colour_ops': True,
+                                                                                  'blur_cache_levels': 16},
+        'fused_bands': {'fuse_colour_ops': True, 'band_threads': os.cpu_count() or 1}
+    }
+    rng = np.random.default_rng(0)
+    features = pd.DataFrame(
+        rng.random((frames, 4)), columns=['RMS', 'Onset', 'Centroid', 'Beats'],
+        index=pd.to_timedelta(np.arange(frames) / 24., unit='s')
+    )
+    results = []
+    for resolution in resolutions:
+        base_image = _Image(synthetic_image(RESOLUTIONS[resolution]))
+        for name, kwargs in generator_kwargs.items():
+            for n_workers in workers:
+                generator = VideoGenerator(base_image, features, mappings(), seed=0, **kwargs)
+                writer = NullWriter()
+                start_time = time.perf_counter()
+                for frame in generator.iter_frames(workers=n_workers):
+                    writer.write_frame(frame)
+                seconds = time.perf_counter() - start_time
+                results.append({
+                    'suite': 'rendering', 'name': name, 'resolution': resolution,
+                    'params': {'frames': frames, 'workers': n_workers, **kwargs},
+                    'seconds': seconds, 'frames_per_second': writer.frames / seconds,
+                })
+    return results
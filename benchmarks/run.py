@@ -0,0 +1,124 @@
+"""
+Runs the benchmark suites and writes the results as JSON.
+
+    python -m benchmarks.run --output bench_results.json
+    python -m benchmarks.run --quick --compare bench_results.json
+
+With --compare the results are matched to a previous run by suite, name, resolution and params, and the command exits
+with status 1 if any case is slower than the previous run by more than --threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import cv2
+import librosa
+import numpy as np
+
+from benchmarks import bench_audio_features, bench_image_modifiers, bench_rendering
+
+
+SUITES = ('image_modifiers', 'audio_features', 'rendering')
+
+
+def run(suites=SUITES, quick: bool = False) -> dict:
+    """
+    Function to run benchmark suites
+
+    :param suites: names of the suites to run
+    :param quick: Boolean controlling whether small sizes and few repeats are used, for a fast smoke run
+    :return: dict with the environment under 'meta' and a list of result dicts under 'results'
+    """
+    results = []
+    if 'image_modifiers' in suites:
+        results += bench_image_modifiers.run(
+            resolutions=('480p',) if quick else ('480p', '1080p', '4k'), repeats=1 if quick else 5
+        )
+    if 'audio_features' in suites:
+        results += bench_audio_features.run(durations=(2.,) if quick else (10., 60., 300.), repeats=1 if quick else 3)
+    if 'rendering' in suites:
+        results += bench_rendering.run(
+            resolutions=('480p',) if quick else ('480p', '1080p'), frames=4 if quick else 48,
+            workers=(1,) if quick else tuple(sorted({1, os.cpu_count() or 1}))
+        )
+    return {'meta': _environment(), 'results': results}
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float = 1.2) -> list[dict]:
+    """
+    Function to find the cases that got slower than in a baseline run
+
+    :param results: result dicts of the current run
+    :param baseline: result dicts of the baseline run
+    :param threshold: ratio of current to baseline time above which a case counts as a regression
+    :return: list of dicts with the case, the baseline and current times and their ratio
+    """
+    baseline_seconds = {_case_key(result): _seconds(result) for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_seconds.get(_case_key(result))
+        if previous and _seconds(result) / previous > threshold:
+            regressions.append({
+                'case': _case_key(result), 'baseline': previous, 'current': _seconds(result),
+                'ratio': _seconds(result) / previous
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', action='append', choices=SUITES, help='suite to run, repeatable, default all')
+    parser.add_argument('--quick', action='store_true', help='small sizes and one repeat')
+    parser.add_argument('--output', help='path of the JSON file to write, default stdout')
+    parser.add_argument('--compare', help='path of a previous JSON output to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio counted as a regression')
+    args = parser.parse_args(argv)
+    report = run(suites=args.suite or SUITES, quick=args.quick)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            report['regressions'] = compare(report['results'], json.load(baseline_file)['results'], args.threshold)
+    output = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    return 1 if report.get('regressions') else 0
+
+
+def _case_key(result: dict) -> str:
+    return json.dumps([result['suite'], result['name'], result.get('resolution'), result['params']], sort_keys=True)
+
+
+def _seconds(result: dict) -> float:
+    # rendering results time the whole run, the other suites time each call
+    return result['median'] if 'median' in result else result['seconds']
+
+
+def _environment() -> dict:
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'git_revision': revision,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'librosa': librosa.__version__,
+    }
+
+
+if __name__ == '__main__':
+    sys.exit(main())
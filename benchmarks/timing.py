@@ -0,0 +1,57 @@
+import statistics
+import time
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+
+RESOLUTIONS = {
+    '480p': (854, 480),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+    '4k': (3840, 2160),
+}
+
+
+def time_call(function: Callable, setup: Optional[Callable] = None, repeats: int = 5, warm_up: int = 1) -> dict:
+    """
+    Function to time repeated calls of a function
+
+    :param function: the function to time, called with the value returned by setup if given
+    :param setup: optional function preparing the argument of each call, e.g. a fresh copy of an image. It is not
+    included in the timings.
+    :param repeats: number of timed calls
+    :param warm_up: number of untimed calls made first, e.g. to fill lookup table caches
+    :return: dict of the min, median, mean and max call time in seconds and the number of repeats
+    """
+    timings = []
+    for call_index in range(warm_up + repeats):
+        argument = setup() if setup is not None else None
+        start_time = time.perf_counter()
+        function(argument) if setup is not None else function()
+        if call_index >= warm_up:
+            timings.append(time.perf_counter() - start_time)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'max': max(timings),
+        'repeats': repeats,
+    }
+
+
+def synthetic_image(size: tuple[int, int], seed: int = 0) -> np.ndarray:
+    """
+    Function to make a reproducible RGB test image with smooth gradients, edges and fine texture
+
+    :param size: (width, height) of the image
+    :param seed: seed of the texture
+    :return: RGB uint8 image
+    """
+    width, height = size
+    x, y = np.meshgrid(np.linspace(0., 1., width, dtype=np.float32), np.linspace(0., 1., height, dtype=np.float32))
+    image = np.stack([x, y, (np.sin(12. * x) * np.cos(9. * y) + 1.) / 2.], axis=-1) * 200.
+    image += np.random.default_rng(seed).normal(0., 20., image.shape).astype(np.float32)
+    cv2.circle(image, (width // 2, height // 2), min(size) // 4, (255., 255., 255.), thickness=min(size) // 40 + 1)
+    return np.clip(image, 0, 255).astype(np.uint8)
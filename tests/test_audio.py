@@ -1,9 +1,16 @@
+import shutil
+
 import librosa
+import numpy as np
+import pandas as pd
 
 from aeraudioviz.audio import Audio
 from aeraudioviz.audio import AudioFeatures
+from aeraudioviz.audio import FeatureStore
+from aeraudioviz.audio import OnlineAudioFeatures
 from aeraudioviz.audio.feature_utils import (normalise_features, fade_in_between_times, fade_out_between_times,
-                                             add_sine_wave_column, add_random_noise_column, set_to_zero_between_times)
+                                             add_sine_wave_column, add_random_noise_column, set_to_zero_between_times,
+                                             AutomationLane, apply_automation)
 
 
 WAV_FILE = 'tests/data/a_short_audio_sample.wav'
@@ -13,3 +20,114 @@ def test_audio_plot():
     audio = Audio(WAV_FILE)
     plot = audio.plot_waveform()
     assert type(plot) is librosa.display.AdaptiveWaveplot
+
+
+def test_audio_features_match_librosa():
+    audio = Audio(WAV_FILE)
+    features = AudioFeatures(audio)
+    y, sr = audio.audio, audio.sample_rate
+    assert np.allclose(features.onset_envelope, librosa.onset.onset_strength(y=y, sr=sr))
+    assert np.allclose(features.spectral_centroid, librosa.feature.spectral_centroid(y=y, sr=sr)[0])
+    assert np.allclose(features.rms_values, librosa.feature.rms(y=y)[0])
+    assert np.allclose(features.beat_times, librosa.beat.beat_track(y=y, sr=sr, units='time')[1])
+    assert np.allclose(features.onset_times, librosa.times_like(features.onset_envelope, sr=sr))
+
+
+def test_audio_features_are_computed_on_demand():
+    features = AudioFeatures(Audio(WAV_FILE))
+    df = features.get_feature_time_series(features=['RMS'])
+    assert list(df.columns) == ['RMS']
+    assert '_spectral_features' not in features.__dict__
+    assert 'beat_times' not in features.__dict__
+    df = features.get_feature_time_series()
+    assert list(df.columns) == ['Onset', 'Spectral Centroid', 'RMS', 'Spectral Centroid Rolling Mean',
+                                'Beats With Decay']
+
+
+def test_frame_aligned_feature_time_series():
+    features = AudioFeatures(Audio(WAV_FILE))
+    df = features.get_feature_time_series(fps=24)
+    assert len(df) == np.ceil(features.audio.duration * 24)
+    assert df.attrs['fps'] == 24
+    assert np.allclose(df.index.total_seconds(), np.arange(len(df)) / 24)
+    assert np.allclose(df.values, features.get_feature_time_series().values)
+    assert not features.get_feature_time_series(fps=100).isna().any().any()
+
+
+def test_streaming_audio_matches_loaded_audio():
+    audio = Audio(WAV_FILE)
+    streaming_audio = Audio(WAV_FILE, streaming=True, block_size=10000)
+    assert streaming_audio.n_samples == len(audio.audio)
+    assert np.allclose(np.concatenate(list(streaming_audio.iter_blocks())), audio.audio)
+    assert 'audio' not in streaming_audio.__dict__
+    resampled_audio = Audio(WAV_FILE, sample_rate=22050, streaming=True, block_size=10000)
+    y = librosa.load(WAV_FILE, sr=22050)[0]
+    assert np.allclose(np.concatenate(list(resampled_audio.iter_blocks())), y, atol=1e-4)
+
+
+def test_streaming_audio_features_match_loaded_audio_features():
+    features = AudioFeatures(Audio(WAV_FILE))
+    streaming_features = AudioFeatures(Audio(WAV_FILE, streaming=True, block_size=10000))
+    assert np.allclose(streaming_features.onset_envelope, features.onset_envelope, atol=1e-4)
+    assert np.allclose(streaming_features.spectral_centroid, features.spectral_centroid)
+    assert np.allclose(streaming_features.rms_values, features.rms_values)
+    assert np.allclose(streaming_features.beat_times, features.beat_times)
+    assert 'audio' not in streaming_features.audio.__dict__
+
+
+def test_feature_store_reuses_and_invalidates_features(tmp_path):
+    audio_path = tmp_path / 'audio.wav'
+    shutil.copy(WAV_FILE, audio_path)
+    store = FeatureStore(tmp_path / 'features')
+    df = AudioFeatures(Audio(audio_path, streaming=True), feature_store=store).get_feature_time_series()
+    features = AudioFeatures(Audio(audio_path, streaming=True), feature_store=store)
+    assert features.get_feature_time_series().equals(df)
+    assert np.array_equal(features.onset_envelope, AudioFeatures(Audio(WAV_FILE)).onset_envelope)
+    assert '_spectral_features' not in features.__dict__
+    assert not features.get_feature_time_series(normalise=False).equals(df)
+    digest = store.content_hash(audio_path)
+    with open(audio_path, 'r+b') as audio_file:
+        audio_file.seek(-4, 2)
+        audio_file.write(bytes(4))
+    assert store.content_hash(audio_path) != digest
+    assert not list(store.directory.glob(f'{digest}*'))
+
+
+def test_automation_lanes_match_time_window_edits():
+    n_frames = 240
+    df = pd.DataFrame(
+        {'RMS': np.linspace(0., 1., n_frames), 'Onset': np.ones(n_frames)},
+        index=pd.to_timedelta(np.arange(n_frames) / 24., unit='s')
+    )
+    seconds = df.index.total_seconds().to_numpy()
+    expected = df.copy()
+    window = (seconds >= 1.) & (seconds < 2.)
+    expected.loc[window, 'RMS'] *= (seconds[window] - 1.) * .5
+    window = (seconds > 6.) & (seconds < 8.)
+    expected.loc[window, 'RMS'] *= 1. - (seconds[window] - 6.) / 2.
+    expected.loc[(seconds >= 3.) & (seconds <= 4.), 'Onset'] = 0.
+    window = (seconds >= 2.) & (seconds < 5.)
+    expected.loc[window, 'Onset'] *= 2.
+    window = seconds < 1.
+    expected.loc[window, 'Onset'] *= .5 + .5 * (np.sin(seconds[window] % .5 / .5 * 2. * np.pi) + 1.) / 2.
+    lanes = [
+        AutomationLane('RMS').fade_out(6., 8.).fade_in(1., 2., factor=.5),
+        AutomationLane('Onset').gain(2., 5., 2.).set_to_zero(3., 4.).lfo(0., 1., frequency_Hz=2., depth=.5),
+    ]
+    assert np.allclose(apply_automation(df.copy(), lanes).to_numpy(), expected.to_numpy())
+    edited = fade_out_between_times(fade_in_between_times(df.copy(), 'RMS', 1., 2., .5), 'RMS', 6., 8.)
+    assert np.allclose(edited['RMS'], expected['RMS'])
+    assert set_to_zero_between_times(df.copy(), 'Onset', 3., 4.)['Onset'].sum() == n_frames - 25
+
+
+def test_online_features_match_offline_features():
+    audio = Audio(WAV_FILE)
+    columns = ['Onset', 'Spectral Centroid', 'RMS']
+    offline = AudioFeatures(audio).get_feature_time_series(fps=24., normalise=False, features=columns).to_numpy()
+    online_features = OnlineAudioFeatures(audio.sample_rate, fps=24., normalise=False)
+    online = np.concatenate([online_features.process(block) for block in audio.iter_blocks(1000)]
+                            + [online_features.flush()])
+    assert online.shape == offline.shape
+    assert np.allclose(online[:, 1:], offline[:, 1:], rtol=1e-5)
+    # the onset strength differs only in clipping the log mel spectrogram below its running rather than global maximum
+    assert np.corrcoef(online[:, 0], offline[:, 0])[0, 1] > .99
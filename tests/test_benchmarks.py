@@ -0,0 +1,11 @@
+from benchmarks import run
+
+
+def test_benchmarks_run_and_compare():
+    report = run.run(suites=('image_modifiers', 'rendering'), quick=True)
+    results = report['results']
+    assert {result['suite'] for result in results} == {'image_modifiers', 'rendering'}
+    assert all(result['frames_per_second'] > 0 for result in results if result['suite'] == 'rendering')
+    assert run.compare(results, results) == []
+    slower = [dict(result, median=result['median'] * 2) for result in results if 'median' in result]
+    assert len(run.compare(slower, results)) == len(slower)
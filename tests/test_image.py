@@ -1,8 +1,12 @@
+import cv2
 from matplotlib.image import AxesImage
 import numpy as np
+import pandas as pd
+import pickle
 import pytest
 
-from aeraudioviz.image import BaseImage, ImageModifiers
+from aeraudioviz.image import (AnimatedBase, BaseImage, BlurPyramid, FrameSource, ImageModifiers, ImageSequence,
+                               NoiseBank, lut)
 
 
 class TestBaseImage:
@@ -34,3 +38,161 @@ class TestBaseImage:
         assert isinstance(self.img.show_red_channel(), AxesImage)
         assert isinstance(self.img.show_saturation(), AxesImage)
         assert isinstance(self.img_resized.show(), AxesImage)
+
+    def test_views_are_computed_lazily(self):
+        img = BaseImage(self.IMAGE_FILE, size=self.NATIVE_SIZE)
+        assert not {'rgb_image', 'bgr_image', 'hsv_image'} & set(vars(img))
+        assert np.array_equal(img.rgb_image, self.img.rgb_image)
+        assert 'hsv_image' not in vars(img)
+        assert np.array_equal(img.hsv_image, cv2.cvtColor(img.rgb_image, cv2.COLOR_RGB2HSV))
+        resized = img.resized((50, 40))
+        assert resized.rgb_image.shape == (40, 50, 3) and resized.hsv_image.shape == (40, 50, 3)
+        assert img.hsv_image.shape == (150, 150, 3)
+        with pytest.raises(ValueError):
+            _ = BaseImage('missing.png').rgb_image
+
+
+class TestAnimatedBase:
+
+    SIZE = (40, 30)
+
+    @pytest.fixture
+    def image_paths(self, tmp_path):
+        paths = []
+        for i, value in enumerate((0, 100, 200)):
+            path = str(tmp_path / f'frame_{i}.png')
+            cv2.imwrite(path, np.full((60, 80, 3), value, dtype=np.uint8))
+            paths.append(path)
+        return paths
+
+    def test_image_sequence_caches_frames(self, image_paths, tmp_path):
+        sequence = ImageSequence(str(tmp_path / 'frame_*.png'), size=self.SIZE, cache_dir=tmp_path / 'cache',
+                                 max_ram_frames=2)
+        assert sequence.image_paths == image_paths and len(sequence) == 3
+        frames = [sequence.frame(i) for i in range(3)]
+        assert all(frame.shape == (30, 40, 3) and not frame.flags.writeable for frame in frames)
+        assert [int(frame[0, 0, 0]) for frame in frames] == [0, 100, 200]
+        assert list(sequence._frames) == [1, 2]
+        # another process, or a later run, reads the resized frames from the disk cache without decoding
+        reopened = pickle.loads(pickle.dumps(sequence))
+        assert not reopened._frames
+        reopened._decode = None
+        assert np.array_equal(reopened.frame(0), frames[0])
+        assert sequence.resized((20, 10)).frame(2).shape == (10, 20, 3)
+        with pytest.raises(TypeError):
+            FrameSource(size=self.SIZE)
+
+    def test_animated_base_positions_and_crossfade(self, image_paths):
+        features = pd.DataFrame({'RMS': [0., .25, 1.5]})
+        base = AnimatedBase(ImageSequence(image_paths, size=self.SIZE), column='RMS')
+        assert np.allclose(base.positions(features, fps=24.), [0., .5, 2.])
+        assert base.rgb_image_at(.5)[0, 0, 0] == 50
+        assert base.rgb_image_at(2.) is base.source.frame(2)
+        nearest = AnimatedBase(base.source, column='RMS', crossfade=False)
+        assert nearest.rgb_image_at(1.4)[0, 0, 0] == 100
+        looping = AnimatedBase(base.source, source_fps=12.)
+        assert np.allclose(looping.positions(pd.DataFrame(index=range(8)), fps=24.), [0., .5, 1., 1.5, 2., 2.5, 0., .5])
+        assert looping.rgb_image_at(2.5)[0, 0, 0] == 100
+
+
+class TestImageModifiers:
+
+    IMAGE_FILE = 'tests/data/aero_head_lq.png'
+
+    @classmethod
+    def setup_class(cls):
+        cls.img = BaseImage(cls.IMAGE_FILE, size=(150, 150))
+
+    def test_stochastic_modifiers_are_seedable(self):
+        for modifier in (ImageModifiers.apply_gaussian_noise, ImageModifiers.apply_salt_and_pepper_noise,
+                         ImageModifiers.apply_ghost_images, ImageModifiers.apply_blue_vlines,
+                         ImageModifiers.apply_random_coloured_hlines):
+            first = modifier(self.img.rgb_image.copy(), rng=np.random.default_rng(1))
+            second = modifier(self.img.rgb_image.copy(), rng=np.random.default_rng(1))
+            assert np.array_equal(first, second)
+
+    @pytest.mark.parametrize('modifier, kwargs', [
+        (ImageModifiers.apply_median_blur, {'kernel_size': 5}),
+        (ImageModifiers.apply_gaussian_blur, {'kernel_size': 0}),
+        (ImageModifiers.apply_gaussian_blur, {'kernel_size': 7}),
+        (ImageModifiers.apply_gaussian_noise, {'rng': np.random.default_rng(0)}),
+        (ImageModifiers.apply_salt_and_pepper_noise, {'rng': np.random.default_rng(0)}),
+        (ImageModifiers.apply_hue_multiplication, {'hue_factor': 1.3}),
+        (ImageModifiers.apply_hue_multiplication_to_area, {'mod_factor': 1.3, 'area_width': .5}),
+        (ImageModifiers.apply_saturation_multiplication, {'saturation_factor': .5}),
+        (ImageModifiers.apply_rgb_multiplication, {'red_factor': 1.2}),
+        (ImageModifiers.apply_green_scaling, {'scale_factor': -.4}),
+        (ImageModifiers.apply_ghost_images, {'rng': np.random.default_rng(0)}),
+        (ImageModifiers.apply_red_vlines, {'rng': np.random.default_rng(0)}),
+        (ImageModifiers.apply_random_coloured_hlines, {'rng': np.random.default_rng(0)}),
+        (ImageModifiers._replace_random_pixels, {'rng': np.random.default_rng(0)}),
+    ])
+    def test_modifiers_write_to_out(self, modifier, kwargs):
+        image = self.img.rgb_image.copy()
+        rng_state = kwargs['rng'].bit_generator.state if 'rng' in kwargs else None
+        out = np.empty_like(image)
+        assert modifier(image, out=out, **kwargs) is out
+        assert np.array_equal(image, self.img.rgb_image)
+        if rng_state is not None:
+            kwargs['rng'].bit_generator.state = rng_state
+        assert np.array_equal(out, modifier(image, **kwargs))
+
+    def test_noise_saturates_and_noise_bank_is_reproducible(self):
+        image = np.full((32, 48, 3), 250, dtype=np.uint8)
+        noisy = ImageModifiers.apply_gaussian_noise(image, standard_deviation=50, rng=np.random.default_rng(0))
+        assert noisy.min() > 30 and (noisy == 255).mean() > .4
+        noise_bank = NoiseBank(n_textures=2, margin=8, seed=3)
+        first = ImageModifiers.apply_gaussian_noise(image, rng=np.random.default_rng(1), noise_bank=noise_bank)
+        second = ImageModifiers.apply_gaussian_noise(
+            image, rng=np.random.default_rng(1), noise_bank=pickle.loads(pickle.dumps(noise_bank))
+        )
+        assert np.array_equal(first, second)
+        assert noise_bank.n_bytes == 2 * 40 * 56 * 3 * 4
+
+    def test_vectorised_lines(self):
+        image = np.zeros((40, 60, 3), dtype=np.uint8)
+        vlines = ImageModifiers.apply_red_vlines(image.copy(), no_lines=3, min_thickness=2, max_thickness=3,
+                                                 rng=np.random.default_rng(0))
+        assert 2 <= (vlines[0, :, 0] == 255).sum() <= 6
+        assert not vlines[:, :, 1:].any() and (vlines[:, :, 0] == vlines[:1, :, 0]).all()
+        hlines = ImageModifiers.apply_random_coloured_hlines(image.copy(), no_lines=0)
+        assert not hlines.any()
+
+    def test_ghost_images_saturate_once(self):
+        image = np.full((20, 30, 3), 200, dtype=np.uint8)
+        ghosted = ImageModifiers.apply_ghost_images(image, number_of_ghost_images=4, max_shift=0, alpha=.1, decay=.5)
+        assert (ghosted == round(200 * (1 + .1 + .05 + .025 + .0125))).all()
+        shifted = ImageModifiers.apply_ghost_images(image, number_of_ghost_images=1, max_shift=40, alpha=.1,
+                                                    rng=np.random.default_rng(0))
+        assert ((shifted == 200) | (shifted == 220)).all()
+
+    def test_lookup_table_point_ops(self):
+        image = self.img.rgb_image
+        expected = np.uint8(np.stack([
+            np.clip(image[:, :, 0] * 1.25, 0, 255), image[:, :, 1], np.clip(image[:, :, 2] * .5, 0, 255)
+        ], axis=-1))
+        assert np.array_equal(ImageModifiers.apply_rgb_multiplication(image, red_factor=1.25, blue_factor=.5), expected)
+        expected_green = np.uint8(np.clip(image[:, :, 1] + .3 * (255 - image[:, :, 1]), 0, 255))
+        assert np.array_equal(ImageModifiers.apply_green_scaling(image, .3)[:, :, 1], expected_green)
+        assert np.array_equal(ImageModifiers.apply_green_scaling(image, .3)[:, :, [0, 2]], image[:, :, [0, 2]])
+
+    def test_lookup_table_cache_and_merge(self):
+        assert lut.channel_table(lut.multiply_curve, .5) is lut.channel_table(lut.multiply_curve, .50000001)
+        first = lut.channel_table(lut.multiply_curve, 1.5)
+        second = lut.channel_table(lut.scale_curve, -.5)
+        rgb_table = lut.merge_channels(first, lut.IDENTITY, second)
+        assert np.array_equal(cv2.LUT(self.img.rgb_image, rgb_table)[:, :, 2], second[self.img.rgb_image[:, :, 2]])
+
+    def test_blur_pyramid(self):
+        image = self.img.rgb_image
+        exact = BlurPyramid(image, ImageModifiers.apply_gaussian_blur, 0, 15)
+        assert exact.kernel_sizes == [1, 3, 5, 7, 9, 11, 13, 15]
+        for kernel_size in (0, 2.5, 7, 14.9):
+            assert np.array_equal(exact.lookup(kernel_size), ImageModifiers.apply_gaussian_blur(image, kernel_size))
+        sparse = BlurPyramid(image, ImageModifiers.apply_median_blur, 1, 51, max_levels=6)
+        assert len(sparse.kernel_sizes) <= 6 and sparse.kernel_sizes[-1] == 51
+        lower, upper = sparse.kernel_sizes[-2:]
+        interpolated = sparse.lookup((lower + upper) / 2.).astype(int)
+        lower_level, upper_level = sparse.levels[-2].astype(int), sparse.levels[-1].astype(int)
+        assert np.all(interpolated >= np.minimum(lower_level, upper_level))
+        assert np.all(interpolated <= np.maximum(lower_level, upper_level))
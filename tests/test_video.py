@@ -1 +1,365 @@
-from aeraudioviz.video import VideoGenerator, ModifierMapping
+import cv2
+import imageio_ffmpeg
+import io
+import json
+from moviepy.editor import VideoFileClip
+import numpy as np
+import pandas as pd
+import pytest
+
+from aeraudioviz.audio import Audio
+from aeraudioviz.image import AnimatedBase, BaseImage, ImageModifiers, ImageSequence
+from aeraudioviz.video import (VideoGenerator, BandExecutor, CallbackSink, FrameBuffers, FrameCache, FrameSink,
+                               LiveRenderer, ModifierChain, ModifierMapping, OutAdapter, ParameterTable, PipeSink,
+                               RenderReport, TemporalGhosts)
+from aeraudioviz.video.draft import PIXEL_KWARGS, register_pixel_kwargs
+
+
+class TestVideoGenerator:
+
+    IMAGE_FILE = 'tests/data/aero_head_lq.png'
+    WAV_FILE = 'tests/data/a_short_audio_sample.wav'
+    SIZE = (64, 64)
+    N_FRAMES = 12
+
+    @classmethod
+    def setup_class(cls):
+        cls.img = BaseImage(cls.IMAGE_FILE, size=cls.SIZE)
+        cls.features = pd.DataFrame(
+            {'RMS': np.linspace(0., 1., cls.N_FRAMES), 'Onset': np.linspace(1., 0., cls.N_FRAMES)},
+            index=pd.to_timedelta(np.arange(cls.N_FRAMES) / 24., unit='s')
+        )
+        cls.mappings = (
+            ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(0, 9)),
+            ModifierMapping(ImageModifiers.apply_saturation_multiplication, 'Onset', saturation_factor=(.5, 1.5)),
+        )
+
+    def _generator(self, **kwargs):
+        return VideoGenerator(self.img, self.features, self.mappings, **kwargs)
+
+    def test_iter_frames(self):
+        frames = list(self._generator().iter_frames())
+        assert len(frames) == self.N_FRAMES
+        assert all(frame.shape == (self.SIZE[1], self.SIZE[0], 3) for frame in frames)
+        assert all(frame.dtype == np.uint8 for frame in frames)
+
+    def test_parameter_table(self):
+        table = self._generator().parameter_table
+        assert isinstance(table, ParameterTable)
+        assert table.values.shape == (self.N_FRAMES, 2)
+        assert table.values.flags['C_CONTIGUOUS']
+        assert np.allclose(table.values[:, 0], 9. * self.features['RMS'])
+        assert np.allclose(table.values[:, 1], .5 + self.features['Onset'])
+        assert table.frame_kwargs(3) == [{'kernel_size': table.values[3, 0]},
+                                         {'saturation_factor': table.values[3, 1]}]
+        df = table.to_frame()
+        assert df.index.equals(self.features.index)
+        assert list(df.columns) == [(0, 'apply_gaussian_blur', 'kernel_size'),
+                                    (1, 'apply_saturation_multiplication', 'saturation_factor')]
+
+    def test_fps_from_feature_time_series(self):
+        features = self.features.copy()
+        features.attrs['fps'] = 30
+        assert self._generator().fps == 24
+        assert VideoGenerator(self.img, features, self.mappings).fps == 30
+        with pytest.raises(ValueError):
+            VideoGenerator(self.img, features, self.mappings, fps=24)
+
+    def test_temporal_ghosts(self):
+        frames = list(self._generator(seed=0).iter_frames())
+        ghosts = TemporalGhosts(number_of_frames=2, alpha=.5, decay=.5)
+        ghosted = list(self._generator(seed=0, temporal_ghosts=ghosts).iter_frames())
+        assert np.array_equal(ghosted[0], frames[0])
+        expected = np.clip(np.rint(frames[2] + .5 * frames[1].astype(np.float32) + .25 * frames[0]), 0, 255)
+        assert np.abs(ghosted[2].astype(int) - expected).max() <= 1
+        assert np.array_equal(list(self._generator(seed=0, temporal_ghosts=ghosts).iter_frames())[2], ghosted[2])
+
+    def test_draft(self, tmp_path):
+        mappings = self.mappings + (
+            ModifierMapping(ImageModifiers.apply_red_vlines, 'Onset', no_lines=(1, 3)),
+            ModifierMapping(ImageModifiers.apply_ghost_images, 'RMS', max_shift=(0, 20)),
+        )
+        draft = VideoGenerator(self.img, self.features, mappings, seed=0).draft(scale=.25, frame_step=2)
+        assert draft.fps == 12 and len(draft.parameter_table) == self.N_FRAMES // 2
+        assert draft.base_image.rgb_image.shape == (16, 16, 3)
+        assert draft.modifier_mappings[0].kwarg_ranges == {'kernel_size': (0, 9 * .25)}
+        assert draft.modifier_mappings[2].kwarg_ranges == {'no_lines': (1, 3), 'min_thickness': (1, 1),
+                                                           'max_thickness': (2, 2)}
+        assert draft.modifier_mappings[3].kwarg_ranges == {'max_shift': (0, 5)}
+        report = draft.generate(str(tmp_path / 'draft.mp4'), preset='ultrafast')
+        assert report.frames == self.N_FRAMES // 2
+        assert VideoFileClip(report.output_path).size == [16, 16]
+        thick_lines = ModifierMapping(
+            ImageModifiers.apply_red_vlines, 'RMS', min_thickness=(7, 7), max_thickness=(8, 8)
+        )
+        draft = VideoGenerator(self.img, self.features, (thick_lines,), seed=0).draft(scale=.3)
+        assert draft.modifier_mappings[0].kwarg_ranges['max_thickness'] == (3, 3)
+        assert len(list(draft.iter_frames())) == self.N_FRAMES // 2
+
+    def test_parallel_render_matches_serial(self):
+        mappings = self.mappings + (
+            ModifierMapping(ImageModifiers.apply_gaussian_noise, 'RMS', standard_deviation=(0, 20)),
+            ModifierMapping(ImageModifiers.apply_ghost_images, 'Onset', max_shift=(1, 10)),
+            ModifierMapping(ImageModifiers.apply_red_vlines, 'RMS', no_lines=(1, 5)),
+            ModifierMapping(ImageModifiers.apply_salt_and_pepper_noise, 'Onset', noise_ratio=(0., .1)),
+        )
+        generator = VideoGenerator(self.img, self.features, mappings, seed=7)
+        serial_frames = list(generator.iter_frames())
+        parallel_frames = list(generator.iter_frames(workers=3))
+        assert len(parallel_frames) == self.N_FRAMES
+        assert all(np.array_equal(s, p) for s, p in zip(serial_frames, parallel_frames))
+        assert not all(np.array_equal(s, p) for s, p in zip(
+            serial_frames, VideoGenerator(self.img, self.features, mappings, seed=8).iter_frames()
+        ))
+
+    def test_animated_base(self, tmp_path):
+        paths = [self.IMAGE_FILE, str(tmp_path / 'flipped.png')]
+        cv2.imwrite(paths[1], cv2.flip(cv2.imread(self.IMAGE_FILE), 1))
+        base = AnimatedBase(ImageSequence(paths, size=self.SIZE, cache_dir=str(tmp_path / 'cache')), column='Onset')
+        generator = VideoGenerator(base, self.features, self.mappings, frame_cache_bytes=2 ** 20, seed=3)
+        frames = list(generator.iter_frames())
+        assert not np.array_equal(frames[0], frames[-1])
+        # the last frame is rendered from the first image and the first frame from the flipped image
+        assert np.array_equal(frames[-1], generator.modifier_chain(
+            base.source.frame(0), generator.parameter_table.frame_kwargs(self.N_FRAMES - 1), None
+        ))
+        assert np.array_equal(frames[0], generator.modifier_chain(
+            base.source.frame(1), generator.parameter_table.frame_kwargs(0), None
+        ))
+        assert all(np.array_equal(s, p) for s, p in zip(frames, generator.iter_frames(workers=2)))
+        assert generator.draft(scale=.5).iter_frames().__next__().shape == (32, 32, 3)
+
+    def test_animated_base_with_blur_cache(self, tmp_path):
+        paths = []
+        for i in range(4):
+            paths.append(str(tmp_path / f'frame_{i}.png'))
+            cv2.imwrite(paths[-1], np.roll(cv2.imread(self.IMAGE_FILE), 40 * i, axis=1))
+        base = AnimatedBase(ImageSequence(paths, size=self.SIZE), column='RMS')
+        features = pd.DataFrame({'RMS': [.5, 0., .125, .3, .9, .5]})
+        mappings = (ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(3, 15)),)
+        cached = VideoGenerator(base, features, mappings, normalise_feature_values=False, blur_cache_levels=32)
+        uncached = VideoGenerator(base, features, mappings, normalise_feature_values=False)
+        for workers in (1, 2):
+            assert all(np.array_equal(c, u) for c, u in zip(
+                cached.iter_frames(workers=workers), uncached.iter_frames(workers=workers)
+            ))
+
+    def test_modifier_mapping_uses_rng(self):
+        assert ModifierMapping(ImageModifiers.apply_gaussian_noise, 'RMS').uses_rng
+        assert not ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS').uses_rng
+
+    def test_modifier_chain_fuses_colour_ops(self):
+        mappings = (
+            ModifierMapping(ImageModifiers.apply_hue_multiplication, 'RMS', hue_factor=(1., 1.2)),
+            ModifierMapping(ImageModifiers.apply_saturation_multiplication, 'RMS', saturation_factor=(.5, 1.5)),
+            ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(0, 9)),
+            ModifierMapping(ImageModifiers.apply_red_scaling, 'RMS', scale_factor=(-.5, .5)),
+            ModifierMapping(ImageModifiers.apply_rgb_multiplication, 'RMS', green_factor=(.5, 1.5)),
+            ModifierMapping(ImageModifiers.apply_blue_scaling, 'RMS', scale_factor=(.5, -.5)),
+        )
+        fused = ModifierChain(mappings)
+        unfused = ModifierChain(mappings, fuse_colour_ops=False)
+        assert [(domain, indices) for domain, indices, _ in fused.stages] == [
+            ('hsv', [0, 1]), ('single', [2]), ('rgb_channels', [3, 4, 5])
+        ]
+        assert len(unfused.stages) == len(mappings)
+        table = ParameterTable(self.features, mappings)
+        for frame_index in range(self.N_FRAMES):
+            mapping_kwargs = table.frame_kwargs(frame_index)
+            expected = self.img.rgb_image.copy()
+            for mod_mapping, kwargs in zip(mappings, mapping_kwargs):
+                expected = mod_mapping.modifier_function(expected, **kwargs)
+            assert np.array_equal(unfused(self.img.rgb_image, mapping_kwargs, None), expected)
+            fused_frame = fused(self.img.rgb_image, mapping_kwargs, None)
+            assert np.abs(fused_frame.astype(int) - expected).mean() < 2.
+
+    def test_modifier_chain_renders_into_frame_buffers(self):
+        def invert_in_place(image, amount=1.):
+            image[:] = 255 - image
+            return image
+
+        mappings = (
+            ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(0, 9)),
+            ModifierMapping(invert_in_place, 'RMS'),
+            ModifierMapping(ImageModifiers.apply_red_vlines, 'Onset', no_lines=(1, 5)),
+            ModifierMapping(ImageModifiers.apply_saturation_multiplication, 'Onset', saturation_factor=(.5, 1.5)),
+        )
+        chain = ModifierChain(mappings)
+        assert isinstance(chain.stages[1][2][0], OutAdapter) and not mappings[1].writes_out
+        base_rgb_image = self.img.rgb_image.copy()
+        buffers = FrameBuffers(base_rgb_image.shape, n_outputs=2)
+        table = ParameterTable(self.features, mappings)
+        frames = [
+            chain(base_rgb_image, table.frame_kwargs(i), np.random.default_rng(i), buffers=buffers) for i in range(3)
+        ]
+        assert frames[0] is buffers.outputs[0] and frames[1] is buffers.outputs[1] and frames[2] is frames[0]
+        assert np.array_equal(base_rgb_image, self.img.rgb_image)
+        expected = chain(base_rgb_image, table.frame_kwargs(2), np.random.default_rng(2))
+        assert np.array_equal(frames[2], expected)
+
+    @pytest.mark.parametrize('fuse_colour_ops', [False, True])
+    def test_band_executor_matches_whole_frames(self, fuse_colour_ops):
+        mappings = (
+            ModifierMapping(ImageModifiers.apply_gaussian_blur, 'RMS', kernel_size=(0, 15)),
+            ModifierMapping(ImageModifiers.apply_median_blur, 'Onset', kernel_size=(3, 7)),
+            ModifierMapping(ImageModifiers.apply_saturation_multiplication, 'Onset', saturation_factor=(.5, 1.5)),
+            ModifierMapping(ImageModifiers.apply_hue_multiplication, 'RMS', hue_factor=(.5, 1.5)),
+            ModifierMapping(ImageModifiers.apply_red_scaling, 'RMS', scale_factor=(-.5, .5)),
+            ModifierMapping(ImageModifiers.apply_green_scaling, 'Onset', scale_factor=(-.5, .5)),
+            ModifierMapping(ImageModifiers.apply_ghost_images, 'RMS', max_shift=(1, 30)),
+            ModifierMapping(ImageModifiers.apply_blue_vlines, 'Onset', no_lines=(1, 9)),
+            ModifierMapping(ImageModifiers.apply_random_coloured_hlines, 'RMS', no_lines=(1, 9)),
+            ModifierMapping(ImageModifiers.apply_salt_and_pepper_noise, 'Onset', noise_ratio=(0., .1)),
+        )
+        chain = ModifierChain(mappings, fuse_colour_ops=fuse_colour_ops)
+        assert chain.band_rules[-1] is None
+        table = ParameterTable(self.features, mappings)
+        with BandExecutor(threads=4, min_band_rows=8) as band_executor:
+            assert band_executor.bands(64) == [(0, 16), (16, 32), (32, 48), (48, 64)]
+            for i in range(0, self.N_FRAMES, 3):
+                whole = chain(self.img.rgb_image, table.frame_kwargs(i), np.random.default_rng(i))
+                banded = chain(
+                    self.img.rgb_image, table.frame_kwargs(i), np.random.default_rng(i), band_executor=band_executor
+                )
+                assert np.array_equal(whole, banded)
+        frames = zip(self._generator(seed=2).iter_frames(), self._generator(seed=2, band_threads=2).iter_frames())
+        assert all(np.array_equal(whole, banded) for whole, banded in frames)
+        with pytest.raises(ValueError):
+            ModifierMapping(ImageModifiers.apply_gaussian_noise, 'RMS', band_halo=0)
+
+    def test_draft_keeps_band_halo(self):
+        def box_blur(image, size: int = 9, out=None):
+            return cv2.blur(image, (int(size) | 1, int(size) | 1), dst=out, borderType=cv2.BORDER_REFLECT_101)
+
+        register_pixel_kwargs(box_blur, size=1)
+        try:
+            mapping = ModifierMapping(box_blur, 'RMS', band_halo=10, size=(1, 21))
+            draft = VideoGenerator(self.img, self.features, (mapping,), band_threads=2).draft(scale=.25)
+            assert draft.modifier_mappings[0].band_halo == 3 and draft.modifier_chain.band_rules[0] is not None
+            assert draft.modifier_mappings[0].kwarg_ranges == {'size': (1, 21 * .25)}
+        finally:
+            PIXEL_KWARGS.pop(box_blur)
+
+    def test_frame_cache_reuses_repeated_frames(self):
+        features = pd.DataFrame({'RMS': [0., .5, .5, .5, .52, 1., 1., .5]})
+        mappings = (ModifierMapping(
+            ImageModifiers.apply_gaussian_blur, 'RMS', quantisation_steps={'kernel_size': 2}, kernel_size=(0, 10)
+        ),)
+        uncached = list(VideoGenerator(self.img, features, mappings).iter_frames())
+        generator = VideoGenerator(self.img, features, mappings, frame_cache_bytes=10 ** 6)
+        assert all(np.array_equal(c, u) for c, u in zip(generator.iter_frames(), uncached))
+        assert (generator.frame_cache.hits, generator.frame_cache.misses) == (4, 4)
+        parallel_generator = VideoGenerator(self.img, features, mappings, frame_cache_bytes=10 ** 6)
+        assert all(np.array_equal(c, u) for c, u in zip(parallel_generator.iter_frames(workers=2), uncached))
+        assert parallel_generator.frame_cache.hits == 4
+
+    def test_frame_cache_is_bounded(self):
+        cache = FrameCache(max_bytes=250)
+        for key in range(4):
+            cache.put(key, np.zeros(100, dtype=np.uint8))
+        assert len(cache) == 2 and cache.n_bytes == 200
+        assert cache.get(0) is None and cache.get(3) is not None
+
+    def test_blur_cache_matches_direct_blur(self):
+        uncached = VideoGenerator(self.img, self.features, self.mappings, seed=1)
+        cached = VideoGenerator(self.img, self.features, self.mappings, seed=1, blur_cache_levels=16)
+        assert all(np.array_equal(c, u) for c, u in zip(cached.iter_frames(), uncached.iter_frames()))
+        assert cached.modifier_chain.blur_pyramid.kernel_sizes == [1, 3, 5, 7, 9]
+        other_image = np.zeros_like(self.img.rgb_image)
+        kwargs = cached.parameter_table.frame_kwargs(self.N_FRAMES - 1)
+        assert np.array_equal(
+            cached.modifier_chain(other_image, kwargs, None), uncached.modifier_chain(other_image, kwargs, None)
+        )
+
+    def test_generate_streaming(self, tmp_path):
+        output_path = str(tmp_path / 'streamed.mp4')
+        report = self._generator(frame_cache_bytes=10 ** 6).generate(output_path, queue_size=2)
+        assert isinstance(report, RenderReport)
+        assert report.frames == self.N_FRAMES and report.cache_misses == self.N_FRAMES
+        n_frames, _ = imageio_ffmpeg.count_frames_and_secs(output_path)
+        assert n_frames == self.N_FRAMES
+
+    def test_generate_reports_profile(self, tmp_path):
+        metrics = []
+        report = self._generator().generate(
+            str(tmp_path / 'profiled.mp4'), workers=2, on_metrics=metrics.append, metrics_interval=0.
+        )
+        assert [timing['stage'] for timing in report.stage_timings] == [
+            'apply_gaussian_blur', 'apply_saturation_multiplication', 'total'
+        ]
+        assert all(timing['frames'] == self.N_FRAMES for timing in report.stage_timings)
+        assert report.frames_encoded == self.N_FRAMES and report.encoder_frames_per_second > 0
+        assert report.max_queue_depth is not None and report.bottleneck in ('rendering', 'encoding')
+        assert len(metrics) == self.N_FRAMES and metrics[-1]['frames'] == self.N_FRAMES
+        assert json.loads(report.to_json())['stage_timings'] == report.stage_timings
+        metrics = []
+        report = VideoGenerator(self.img, self.features, (), seed=1).generate(
+            str(tmp_path / 'unmodified.mp4'), on_metrics=metrics.append, metrics_interval=0.
+        )
+        assert report.frames_encoded == self.N_FRAMES and report.stage_timings == []
+        assert metrics[-1]['stage_mean_seconds'] == {}
+
+    def test_generate_segmented(self, tmp_path):
+        generator = self._generator(seed=0)
+        cache_dir = tmp_path / 'segments'
+        report = generator.generate_segmented(str(tmp_path / 'first.mp4'), str(cache_dir), segment_seconds=.25)
+        assert (report.frames, report.segments_rendered, report.segments_reused) == (self.N_FRAMES, 2, 0)
+        assert len(list(VideoFileClip(report.output_path).iter_frames())) == self.N_FRAMES
+        features = self.features.copy()
+        features.iloc[-1] = 0.
+        changed = VideoGenerator(self.img, features, self.mappings, seed=0, normalise_feature_values=False)
+        report = changed.generate_segmented(str(tmp_path / 'second.mp4'), str(cache_dir), segment_seconds=.25,
+                                            workers=2)
+        assert (report.segments_rendered, report.segments_reused) == (1, 1)
+        assert len(list(VideoFileClip(report.output_path).iter_frames())) == self.N_FRAMES
+
+    def test_generate_streaming_with_audio(self, tmp_path):
+        output_path = str(tmp_path / 'streamed_audio.mp4')
+        self._generator(audio=Audio(self.WAV_FILE)).generate(output_path)
+        clip = VideoFileClip(output_path)
+        assert clip.audio is not None
+        assert clip.duration < 1.
+        clip.close()
+        assert [p.name for p in tmp_path.iterdir()] == ['streamed_audio.mp4']
+
+    def test_live_renderer(self):
+        audio = Audio(self.WAV_FILE)
+        mappings = self.mappings[:1] + (
+            ModifierMapping(ImageModifiers.apply_red_vlines, 'Onset', no_lines=(1, 5)),
+        )
+        frames = []
+        renderer = LiveRenderer(
+            self.img, mappings, CallbackSink(lambda frame: frames.append(frame.copy())), sample_rate=audio.sample_rate,
+            deadline=10., seed=3
+        )
+        report = renderer.play(audio, block_size=1024, realtime=False)
+        n_frames = int(np.ceil(len(audio.audio) * 24. / audio.sample_rate))
+        assert report.frames == report.frames_emitted == len(frames) == n_frames
+        assert len(report.latencies) == n_frames and report.max_latency_seconds < 10.
+        assert all(frame.shape == (self.SIZE[1], self.SIZE[0], 3) for frame in frames)
+        assert len({frame.tobytes() for frame in frames}) > n_frames // 2
+        stream = io.BytesIO()
+        report = LiveRenderer(
+            self.img, mappings, PipeSink(stream), sample_rate=audio.sample_rate, deadline=1e-9, degrade=False
+        ).play(audio, realtime=False)
+        assert report.frames == n_frames and report.frames_dropped == n_frames and not stream.getvalue()
+        # a full render estimate far over the deadline degrades frames until it decays below it
+        frames = []
+        thick_lines = ModifierMapping(
+            ImageModifiers.apply_red_vlines, 'Onset', min_thickness=(7, 7), max_thickness=(8, 8)
+        )
+        renderer = LiveRenderer(
+            self.img, self.mappings[:1] + (thick_lines,), CallbackSink(lambda frame: frames.append(frame.copy())),
+            sample_rate=audio.sample_rate, deadline=10., draft_scale=.3, seed=3
+        )
+        renderer._expected_seconds['full'] = 10. / .8 ** 3.5
+        report = renderer.play(audio, realtime=False)
+        assert report.frames_degraded == 4 and report.frames_emitted == report.frames == len(frames) == n_frames
+        assert all(frame.shape == (self.SIZE[1], self.SIZE[0], 3) for frame in frames)
+        assert renderer._expected_seconds['full'] < 10.
+        with pytest.raises(ValueError):
+            LiveRenderer(self.img, (ModifierMapping(ImageModifiers.apply_gaussian_blur, 'Beats With Decay'),),
+                         CallbackSink(print))
+        with pytest.raises(TypeError):
+            FrameSink()
+